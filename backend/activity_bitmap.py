@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+按天的活跃用户位图
+
+每个user_id映射为一个稠密整数（t_user_dict.user_no），每天的活跃用户保存为一个位图（第user_no位为1表示当天活跃），
+压缩后写入t_daily_user_bitmap。N日留存和同期群（cohort）× 间隔天数的留存矩阵都只需要对位图做按位与再计数，
+不再把D0用户列表作为IN参数回查原始日志
+"""
+
+from typing import List, Dict, Optional, Iterable
+import zlib
+
+class UserBitmap:
+    """活跃用户位图（以Python整数保存任意长度的位集合）"""
+
+    __slots__ = ('bits',)
+
+    def __init__(self, bits: int = 0):
+        self.bits = bits
+
+    def add(self, user_no: int):
+        self.bits |= 1 << user_no
+
+    def add_many(self, user_nos: Iterable[int]):
+        for user_no in user_nos:
+            self.bits |= 1 << user_no
+
+    def __and__(self, other: 'UserBitmap') -> 'UserBitmap':
+        return UserBitmap(self.bits & other.bits)
+
+    def __or__(self, other: 'UserBitmap') -> 'UserBitmap':
+        return UserBitmap(self.bits | other.bits)
+
+    def __sub__(self, other: 'UserBitmap') -> 'UserBitmap':
+        return UserBitmap(self.bits & ~other.bits)
+
+    def max_user_no(self) -> int:
+        """位图中最大的用户编号，空位图为-1"""
+        return self.bits.bit_length() - 1
+
+    def count(self) -> int:
+        """活跃用户数（popcount；int.bit_count需要Python 3.10，这里兼容3.8）"""
+        return bin(self.bits).count('1')
+
+    def __contains__(self, user_no: int) -> bool:
+        return bool(self.bits >> user_no & 1)
+
+    def user_nos(self) -> List[int]:
+        """所有活跃用户的编号"""
+        result = []
+        bits = self.bits
+        while bits:
+            low = bits & -bits
+            result.append(low.bit_length() - 1)
+            bits ^= low
+        return result
+
+    def to_bytes(self) -> bytes:
+        """小端字节序后zlib压缩（稀疏的位图压缩率很高）"""
+        return zlib.compress(self.bits.to_bytes((self.bits.bit_length() + 7) // 8, 'little'))
+
+    @classmethod
+    def from_bytes(cls, data: Optional[bytes]) -> 'UserBitmap':
+        if not data:
+            return cls()
+        return cls(int.from_bytes(zlib.decompress(data), 'little'))
+
+class UserIndex:
+    """
+    user_id与稠密编号的映射（不区分大小写，与MySQL默认排序规则下的DISTINCT一致）
+    字典中没有的用户分配临时编号（大于所有已保存的编号），只在本次计算中有效
+    """
+
+    def __init__(self, rows: Iterable[Dict] = ()):
+        self.user_nos: Dict[str, int] = {}
+        self.user_ids: Dict[int, str] = {}
+        self.max_saved_no = -1
+        for row in rows:
+            self.add(row['user_id'], row['user_no'])
+        self._next_temp_no = self.max_saved_no + 1
+
+    def add(self, user_id: str, user_no: int):
+        """登记已保存的用户编号"""
+        self.user_nos[user_id.lower()] = user_no
+        self.user_ids[user_no] = user_id
+        self.max_saved_no = max(self.max_saved_no, user_no)
+
+    def reserve(self, max_user_no: int):
+        """临时编号从max_user_no之后开始（读取位图后字典可能已新增用户，避免与位图中的编号冲突）"""
+        self._next_temp_no = max(self._next_temp_no, max_user_no + 1)
+
+    def get(self, user_id: str) -> Optional[int]:
+        return self.user_nos.get(user_id.lower())
+
+    def lookup(self, user_id: str) -> int:
+        """返回用户编号，字典中没有的用户分配临时编号"""
+        key = user_id.lower()
+        user_no = self.user_nos.get(key)
+        if user_no is None:
+            user_no = self._next_temp_no
+            self._next_temp_no += 1
+            self.user_nos[key] = user_no
+            self.user_ids[user_no] = user_id
+        return user_no
+
+    def bitmap(self, user_ids: Iterable[Optional[str]]) -> UserBitmap:
+        """由user_id列表生成位图（跳过NULL）"""
+        bitmap = UserBitmap()
+        bitmap.add_many(self.lookup(user_id) for user_id in user_ids if user_id is not None)
+        return bitmap
+
+def retention_rate(retained: int, base: int) -> float:
+    """留存率（百分比，保留两位小数）"""
+    return round(retained * 100.0 / base, 2) if base > 0 else 0
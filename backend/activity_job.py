@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+用户活跃任务
+
+后台定期把新增日志中的活跃用户合并到当天的位图（t_daily_user_bitmap），新用户分配编号写入t_user_dict，
+同时按渠道、项目组成员/非项目组成员合并到当天的去重用户数草图（t_daily_user_sketch）。
+位图的并集和草图都可以重复合并，每次只读取上次位置之后的日志；日期结束且超过等待时间后，
+按整天重新生成一次（包含延迟写入的日志）并标记完成。
+
+同时把上次位置之后的日志按用户、渠道分组，累加到每个用户的活跃汇总（t_user_activity_summary），
+流失用户列表只需要按最近活跃时间做一次索引范围查询。也可以通过命令行回填历史或重建汇总：
+
+    python activity_job.py run
+    python activity_job.py backfill --start 2025-01-01 --end 2025-01-31 [--force]
+    python activity_job.py rebuild-summary
+"""
+
+from datetime import datetime, date, timedelta
+from typing import List
+from collections import Counter
+import argparse
+import asyncio
+import json
+import logging
+from database import DatabaseManager
+from db_session import get_db_session
+from activity_models import UserDict, DailyUserBitmap, DailyUserSketch, UserActivitySummary, ActivityWatermark
+from activity_bitmap import UserBitmap, UserIndex
+from hll_sketch import HyperLogLog, add_user_rows
+
+logger = logging.getLogger(__name__)
+
+class ActivityConfig:
+    """活跃用户位图任务配置类"""
+    def __init__(self):
+        # 是否在服务启动后运行后台任务
+        self.enabled = True
+        # 后台任务检查间隔（秒）
+        self.interval_seconds = 60
+        # 只合并create_time早于 now - lag_seconds 的日志
+        self.lag_seconds = 5
+        # 日期结束后等待多久再按整天重新生成并标记完成（分钟）
+        self.settle_minutes = 30
+        # 每次检查最近多少天
+        self.lookback_days = 30
+
+# 获取配置
+activity_config = ActivityConfig()
+
+# 用户活跃汇总在t_activity_watermark中的位置名称
+SUMMARY_WATERMARK = 'user_activity_summary'
+
+def load_user_index(session) -> UserIndex:
+    """读取全部用户编号"""
+    return UserIndex({'user_no': row.user_no, 'user_id': row.user_id} for row in session.query(UserDict).all())
+
+class ActivityJob:
+    """活跃用户位图任务"""
+
+    def __init__(self, config: ActivityConfig = activity_config):
+        self.config = config
+        self.db_manager = DatabaseManager()
+
+    def _assign_user_nos(self, session, index: UserIndex, user_ids: List[str]) -> List[int]:
+        """返回用户编号，新用户写入t_user_dict并分配编号"""
+        new_users = {}
+        for user_id in user_ids:
+            if index.get(user_id) is None and user_id.lower() not in new_users:
+                new_users[user_id.lower()] = UserDict(user_id=user_id, created_at=datetime.now())
+        if new_users:
+            session.add_all(new_users.values())
+            # flush后得到自增编号，与位图在同一事务中提交
+            session.flush()
+            for user in new_users.values():
+                index.add(user.user_id, user.user_no)
+        return [index.get(user_id) for user_id in user_ids]
+
+    def update_day(self, stat_date: date, force: bool = False) -> int:
+        """把指定日期上次位置之后的活跃用户合并到位图和草图，返回本次读取的用户数；force为True时按整天重新生成"""
+        now = datetime.now()
+        day_start = datetime.combine(stat_date, datetime.min.time())
+        day_end = day_start + timedelta(days=1)
+        upper = min(now - timedelta(seconds=self.config.lag_seconds), day_end)
+        if upper <= day_start:
+            return 0
+        completing = now >= day_end + timedelta(minutes=self.config.settle_minutes)
+
+        session = get_db_session()
+        try:
+            row = session.query(DailyUserBitmap).filter(DailyUserBitmap.stat_date == stat_date).first()
+            if row is not None and row.completed and not force:
+                return 0
+
+            sketch_rows = {
+                (sketch_row.channel, sketch_row.is_member): sketch_row
+                for sketch_row in session.query(DailyUserSketch).filter(DailyUserSketch.stat_date == stat_date)
+            }
+            # 标记完成前按整天重新生成，包含延迟写入（create_time早于上次位置）的日志
+            if row is None or row.watermark_time is None or force or completing:
+                lower = day_start
+                bitmap = UserBitmap()
+                sketches = {}
+            else:
+                lower = row.watermark_time
+                bitmap = UserBitmap.from_bytes(row.bitmap)
+                sketches = {key: HyperLogLog.from_bytes(sketch_row.sketch) for key, sketch_row in sketch_rows.items()}
+
+            rows = self.db_manager.execute_query("""
+                SELECT DISTINCT user_id, channel FROM t_handler_logs
+                WHERE create_time >= %s AND create_time < %s
+                AND user_id IS NOT NULL
+            """, (lower, upper))
+            user_ids = list({r['user_id'].lower(): r['user_id'] for r in rows}.values())
+            bitmap.add_many(self._assign_user_nos(session, load_user_index(session), user_ids))
+            add_user_rows(sketches, rows)
+            for key, sketch_row in sketch_rows.items():
+                if key not in sketches:
+                    session.delete(sketch_row)
+            for (channel, is_member), sketch in sketches.items():
+                sketch_row = sketch_rows.get((channel, is_member))
+                if sketch_row is None:
+                    sketch_row = DailyUserSketch(stat_date=stat_date, channel=channel, is_member=is_member)
+                    session.add(sketch_row)
+                sketch_row.sketch = sketch.to_bytes()
+                sketch_row.updated_at = datetime.now()
+
+            if row is None:
+                row = DailyUserBitmap(stat_date=stat_date)
+                session.add(row)
+            row.bitmap = bitmap.to_bytes()
+            row.user_count = bitmap.count()
+            row.watermark_time = upper
+            row.completed = completing
+            row.updated_at = datetime.now()
+            session.commit()
+            if completing:
+                logger.info(f"{stat_date}活跃用户位图完成，共{row.user_count}人")
+            return len(user_ids)
+        except Exception as e:
+            session.rollback()
+            logger.error(f"更新{stat_date}活跃用户位图失败: {e}")
+            raise e
+        finally:
+            session.close()
+
+    def backfill(self, start_date: date, end_date: date, force: bool = False) -> int:
+        """生成日期范围内的活跃用户位图，返回读取的用户数"""
+        end_date = min(end_date, date.today())
+        total = 0
+        current = start_date
+        while current <= end_date:
+            try:
+                total += self.update_day(current, force=force)
+            except Exception as e:
+                # 单日失败不影响其它日期，下次运行时重试
+                logger.error(f"{current}活跃用户位图失败: {e}")
+            current += timedelta(days=1)
+        return total
+
+    def update_summary(self, rebuild: bool = False) -> int:
+        """
+        把上次位置之后的日志累加到用户活跃汇总，返回本次更新的用户数
+        首次运行或rebuild为True时（清空汇总后）读取全部日志，可以修正延迟写入的日志
+        """
+        upper = datetime.now() - timedelta(seconds=self.config.lag_seconds)
+        session = get_db_session()
+        try:
+            if rebuild:
+                session.query(UserActivitySummary).delete(synchronize_session=False)
+                session.query(ActivityWatermark).filter(ActivityWatermark.name == SUMMARY_WATERMARK).delete(synchronize_session=False)
+            watermark = session.query(ActivityWatermark).filter(ActivityWatermark.name == SUMMARY_WATERMARK).first()
+
+            sql = """
+                SELECT user_id, channel, MIN(create_time) AS first_seen, MAX(create_time) AS last_seen, COUNT(1) AS count
+                FROM t_handler_logs
+                WHERE create_time < %s
+                AND user_id IS NOT NULL
+            """
+            params = [upper]
+            if watermark is not None:
+                sql += " AND create_time >= %s "
+                params.append(watermark.watermark_time)
+            sql += " GROUP BY user_id, channel"
+
+            # 同一用户（不区分大小写，与MySQL默认排序规则一致）各渠道的增量
+            deltas = {}
+            for row in self.db_manager.execute_query(sql, tuple(params)):
+                delta = deltas.setdefault(row['user_id'].lower(), {
+                    'user_id': row['user_id'],
+                    'first_seen': row['first_seen'],
+                    'last_seen': row['last_seen'],
+                    'count': 0,
+                    'channels': Counter()
+                })
+                delta['first_seen'] = min(delta['first_seen'], row['first_seen'])
+                delta['last_seen'] = max(delta['last_seen'], row['last_seen'])
+                delta['count'] += row['count']
+                delta['channels'][row['channel'] or '未知渠道'] += row['count']
+
+            existing = {}
+            user_ids = [delta['user_id'] for delta in deltas.values()]
+            for i in range(0, len(user_ids), 500):
+                for summary in session.query(UserActivitySummary).filter(UserActivitySummary.user_id.in_(user_ids[i:i + 500])):
+                    existing[summary.user_id.lower()] = summary
+
+            now = datetime.now()
+            for key, delta in deltas.items():
+                summary = existing.get(key)
+                if summary is None:
+                    session.add(UserActivitySummary(
+                        user_id=delta['user_id'],
+                        first_seen=delta['first_seen'],
+                        last_seen=delta['last_seen'],
+                        total_queries=delta['count'],
+                        channel_counts=json.dumps(dict(delta['channels']), ensure_ascii=False),
+                        updated_at=now
+                    ))
+                    continue
+                channel_counts = Counter(json.loads(summary.channel_counts or '{}'))
+                channel_counts.update(delta['channels'])
+                summary.first_seen = min(summary.first_seen, delta['first_seen'])
+                summary.last_seen = max(summary.last_seen, delta['last_seen'])
+                summary.total_queries += delta['count']
+                summary.channel_counts = json.dumps(dict(channel_counts), ensure_ascii=False)
+                summary.updated_at = now
+
+            # 汇总和位置在同一事务中提交，中途失败时下次从上次的位置重新累加
+            if watermark is None:
+                session.add(ActivityWatermark(name=SUMMARY_WATERMARK, watermark_time=upper, updated_at=now))
+            else:
+                watermark.watermark_time = upper
+                watermark.updated_at = now
+            session.commit()
+            return len(deltas)
+        except Exception as e:
+            session.rollback()
+            logger.error(f"更新用户活跃汇总失败: {e}")
+            raise e
+        finally:
+            session.close()
+
+    def run_pending(self) -> int:
+        """更新最近lookback_days天内（包括当天）未完成的位图，以及用户活跃汇总"""
+        end_date = date.today()
+        start_date = end_date - timedelta(days=self.config.lookback_days - 1)
+        total = self.backfill(start_date, end_date)
+        try:
+            self.update_summary()
+        except Exception as e:
+            # 汇总失败不影响位图，下次运行时从上次的位置重新累加
+            logger.error(f"用户活跃汇总失败: {e}")
+        return total
+
+async def run_activity_loop(config: ActivityConfig = activity_config):
+    """后台定期更新活跃用户位图和用户活跃汇总（在线程池中执行，不阻塞事件循环）"""
+    loop = asyncio.get_running_loop()
+    job = ActivityJob(config)
+    while True:
+        try:
+            await loop.run_in_executor(None, job.run_pending)
+        except Exception as e:
+            logger.error(f"后台活跃用户位图任务失败: {e}")
+        await asyncio.sleep(config.interval_seconds)
+
+def main():
+    parser = argparse.ArgumentParser(description='用户活跃任务')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('run', help='更新最近未完成的日期')
+    backfill_parser = subparsers.add_parser('backfill', help='回填指定日期范围的位图')
+    backfill_parser.add_argument('--start', required=True, help='开始日期，格式YYYY-MM-DD')
+    backfill_parser.add_argument('--end', required=True, help='结束日期，格式YYYY-MM-DD')
+    backfill_parser.add_argument('--force', action='store_true', help='按整天重新生成已完成的日期')
+    subparsers.add_parser('rebuild-summary', help='清空后从全部日志重新生成用户活跃汇总')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    from db_session import first_init_db
+    first_init_db()
+
+    job = ActivityJob()
+    if args.command == 'run':
+        total = job.run_pending()
+    elif args.command == 'rebuild-summary':
+        logger.info(f"用户活跃汇总共{job.update_summary(rebuild=True)}个用户")
+        return
+    else:
+        total = job.backfill(
+            datetime.strptime(args.start, '%Y-%m-%d').date(),
+            datetime.strptime(args.end, '%Y-%m-%d').date(),
+            force=args.force
+        )
+    logger.info(f"共读取{total}个活跃用户")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+用户活跃表模型
+
+user_id与稠密编号的映射、每天活跃用户的压缩位图（见activity_bitmap）、每天各渠道的去重用户数草图（见hll_sketch）
+和每个用户的累计活跃情况，由activity_job增量维护
+"""
+
+from sqlalchemy import Column, Integer, BigInteger, String, Date, DateTime, Boolean, LargeBinary, Text, Index
+from sqlalchemy.dialects.mysql import MEDIUMBLOB
+from db_session import Base
+
+
+class UserDict(Base):
+    """user_id与位图中稠密编号的映射，编号只增不减"""
+    __tablename__ = 't_user_dict'
+
+    user_no = Column(Integer, primary_key=True, autoincrement=True, comment='位图中的编号')
+    user_id = Column(String(64), nullable=False, unique=True, comment='用户ID')
+    created_at = Column(DateTime, nullable=False, comment='首次出现时间')
+
+
+class DailyUserBitmap(Base):
+    """每天活跃用户的位图"""
+    __tablename__ = 't_daily_user_bitmap'
+
+    stat_date = Column(Date, primary_key=True, comment='统计日期')
+    bitmap = Column(LargeBinary().with_variant(MEDIUMBLOB(), 'mysql'), nullable=False, comment='zlib压缩的活跃用户位图')
+    user_count = Column(BigInteger, nullable=False, default=0, comment='活跃用户数')
+    watermark_time = Column(DateTime, nullable=True, comment='已合并到位图的日志create_time上限')
+    completed = Column(Boolean, nullable=False, default=False, comment='该日期是否已结束且全部合并')
+    updated_at = Column(DateTime, nullable=False, comment='更新时间')
+
+
+class DailyUserSketch(Base):
+    """每天各渠道、项目组成员/非项目组成员的去重用户数草图，与同一天的位图一起更新"""
+    __tablename__ = 't_daily_user_sketch'
+
+    stat_date = Column(Date, primary_key=True, comment='统计日期')
+    channel = Column(String(64), primary_key=True, comment='渠道（NULL记为未知渠道）')
+    is_member = Column(Boolean, primary_key=True, comment='是否项目组成员')
+    sketch = Column(LargeBinary, nullable=False, comment='HyperLogLog寄存器（首字节为精度，其后zlib压缩）')
+    updated_at = Column(DateTime, nullable=False, comment='更新时间')
+
+
+class UserActivitySummary(Base):
+    """每个用户的累计活跃情况（首次/最近活跃时间、累计请求数、各渠道请求数），由activity_job增量更新"""
+    __tablename__ = 't_user_activity_summary'
+
+    user_id = Column(String(64), primary_key=True, comment='用户ID')
+    first_seen = Column(DateTime, nullable=False, comment='首次请求时间')
+    last_seen = Column(DateTime, nullable=False, comment='最近请求时间')
+    total_queries = Column(BigInteger, nullable=False, default=0, comment='累计请求数')
+    channel_counts = Column(Text, nullable=False, default='{}', comment='各渠道请求数JSON')
+    updated_at = Column(DateTime, nullable=False, comment='更新时间')
+
+    __table_args__ = (
+        Index('idx_user_activity_last_seen', 'last_seen'),
+    )
+
+
+class ActivityWatermark(Base):
+    """增量任务已处理到的位置"""
+    __tablename__ = 't_activity_watermark'
+
+    name = Column(String(32), primary_key=True, comment='任务名称')
+    watermark_time = Column(DateTime, nullable=False, comment='已处理的日志create_time上限（不含）')
+    updated_at = Column(DateTime, nullable=False, comment='更新时间')
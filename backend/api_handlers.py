@@ -3,35 +3,68 @@
 
 from aiohttp import web
 import logging
-import json
-from decimal import Decimal
 from data_service import DataService
+from query_executor import QueryExecutor, executor_config
+from cost_summary import normalize_percentiles
+from serializer import dumps, compress
 
 logger = logging.getLogger(__name__)
 
-def convert_decimals(obj):
-    """递归转换所有Decimal类型为float"""
-    if isinstance(obj, Decimal):
-        return float(obj)
-    elif isinstance(obj, dict):
-        return {key: convert_decimals(value) for key, value in obj.items()}
-    elif isinstance(obj, list):
-        return [convert_decimals(item) for item in obj]
-    else:
-        return obj
-
-class DecimalEncoder(json.JSONEncoder):
-    """自定义JSON编码器，处理Decimal类型"""
-    def default(self, obj):
-        if isinstance(obj, Decimal):
-            return float(obj)
-        return super(DecimalEncoder, self).default(obj)
+# 性能接口topK参数的上限
+MAX_TOP_K = 100
+
+def json_response(data, status: int = 200, request: web.Request = None) -> web.Response:
+    """使用统一的序列化器生成JSON响应，传入request时按客户端的Accept-Encoding压缩较大的响应体"""
+    body = dumps(data)
+    encoding = None
+    if request is not None:
+        body, encoding = compress(body, request.headers.get('Accept-Encoding', ''))
+    response = web.Response(body=body, status=status, content_type='application/json', charset='utf-8')
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+    return response
 
 class ApiHandlers:
     """API处理器类，包含所有HTTP请求的处理逻辑"""
     
     def __init__(self):
+        # 数据服务的同步方法在有界线程池中执行，见QueryExecutor
         self.data_service = DataService()
+        self.query_executor = QueryExecutor(executor_config)
+    
+    async def _dispatch(self, route: str, method_name: str, *args):
+        """在接口并发限制内调用数据服务方法，不阻塞事件循环"""
+        return await self.query_executor.run(
+            route, getattr(self.data_service, method_name), *args
+        )
+    
+    @staticmethod
+    def _parse_percentiles(data: dict):
+        """解析请求中的percentiles参数（百分位数组，如[50, 90, 99]），返回(百分位列表, 错误响应)"""
+        percentiles = data.get('percentiles')
+        if percentiles is None:
+            return None, None
+        try:
+            if not isinstance(percentiles, list):
+                raise ValueError("percentiles参数必须是数组")
+            return normalize_percentiles(percentiles), None
+        except (TypeError, ValueError) as e:
+            return None, json_response(
+                {"error": str(e), "code": 400},
+                status=400
+            )
+    
+    @staticmethod
+    def _parse_top_k(data: dict):
+        """解析请求中的topK参数（每个类别返回最慢请求的个数，0表示不返回），返回(top_k, 错误响应)"""
+        top_k = data.get('topK', 0)
+        if isinstance(top_k, int) and not isinstance(top_k, bool) and 0 <= top_k <= MAX_TOP_K:
+            return top_k, None
+        return None, json_response(
+            {"error": f"topK参数必须是0到{MAX_TOP_K}之间的整数", "code": 400},
+            status=400
+        )
     
     async def template_query_stats_handler(self, request: web.Request):
         """获取模板查询统计数据"""
@@ -39,18 +72,16 @@ class ApiHandlers:
             data = await request.json()
             queryDate = data.get('queryDate')
             if not queryDate:
-                return web.json_response(
+                return json_response(
                     {"error": "缺少queryDate参数", "code": 400},
                     status=400
                 )
 
-            stats = self.data_service.get_template_query_stats(queryDate)
-            # 转换Decimal类型
-            stats = convert_decimals(stats)
-            return web.json_response({"data": stats, "code": 200})
+            stats = await self._dispatch('template-query/stats', 'get_template_query_stats', queryDate)
+            return json_response({"data": stats, "code": 200}, request=request)
         except Exception as e:
             logger.error(f"获取模板查询统计数据失败: {e}")
-            return web.json_response(
+            return json_response(
                 {"error": str(e), "code": 500}, 
                 status=500
             )
@@ -61,18 +92,16 @@ class ApiHandlers:
             data = await request.json()
             queryDate = data.get('queryDate')
             if not queryDate:
-                return web.json_response(
+                return json_response(
                     {"error": "缺少queryDate参数", "code": 400},
                     status=400
                 )
 
-            stats = self.data_service.get_non_template_query_stats(queryDate)
-            # 转换Decimal类型
-            stats = convert_decimals(stats)
-            return web.json_response({"data": stats, "code": 200})
+            stats = await self._dispatch('non-template-query/stats', 'get_non_template_query_stats', queryDate)
+            return json_response({"data": stats, "code": 200}, request=request)
         except Exception as e:
             logger.error(f"获取非模板查询统计数据失败: {e}")
-            return web.json_response(
+            return json_response(
                 {"error": str(e), "code": 500}, 
                 status=500
             )
@@ -83,18 +112,23 @@ class ApiHandlers:
             data = await request.json()
             queryDate = data.get('queryDate')
             if not queryDate:
-                return web.json_response(
+                return json_response(
                     {"error": "缺少queryDate参数", "code": 400},
                     status=400
                 )
-
-            performance = self.data_service.get_template_query_performance(queryDate)
-            # 转换Decimal类型
-            performance = convert_decimals(performance)
-            return web.json_response({"data": performance, "code": 200})
+            
+            percentiles, error_response = self._parse_percentiles(data)
+            if error_response is not None:
+                return error_response
+            top_k, error_response = self._parse_top_k(data)
+            if error_response is not None:
+                return error_response
+
+            performance = await self._dispatch('template-query/performance', 'get_template_query_performance', queryDate, percentiles, top_k)
+            return json_response({"data": performance, "code": 200}, request=request)
         except Exception as e:
             logger.error(f"获取模板查询性能统计失败: {e}")
-            return web.json_response(
+            return json_response(
                 {"error": str(e), "code": 500}, 
                 status=500
             )
@@ -105,18 +139,23 @@ class ApiHandlers:
             data = await request.json()
             queryDate = data.get('queryDate')
             if not queryDate:
-                return web.json_response(
+                return json_response(
                     {"error": "缺少queryDate参数", "code": 400},
                     status=400
                 )
-
-            performance = self.data_service.get_non_template_query_performance(queryDate)
-            # 转换Decimal类型
-            performance = convert_decimals(performance)
-            return web.json_response({"data": performance, "code": 200})
+            
+            percentiles, error_response = self._parse_percentiles(data)
+            if error_response is not None:
+                return error_response
+            top_k, error_response = self._parse_top_k(data)
+            if error_response is not None:
+                return error_response
+
+            performance = await self._dispatch('non-template-query/performance', 'get_non_template_query_performance', queryDate, percentiles, top_k)
+            return json_response({"data": performance, "code": 200}, request=request)
         except Exception as e:
             logger.error(f"获取非模板查询性能统计失败: {e}")
-            return web.json_response(
+            return json_response(
                 {"error": str(e), "code": 500}, 
                 status=500
             )
@@ -127,18 +166,20 @@ class ApiHandlers:
             data = await request.json()
             queryDate = data.get('queryDate')
             if not queryDate:
-                return web.json_response(
+                return json_response(
                     {"error": "缺少queryDate参数", "code": 400},
                     status=400
                 )
+            
+            percentiles, error_response = self._parse_percentiles(data)
+            if error_response is not None:
+                return error_response
 
-            steps = self.data_service.get_step_performance(queryDate)
-            # 确保转换所有Decimal类型
-            steps = convert_decimals(steps)
-            return web.json_response({"data": steps, "code": 200})
+            steps = await self._dispatch('step-performance', 'get_step_performance', queryDate, percentiles)
+            return json_response({"data": steps, "code": 200}, request=request)
         except Exception as e:
             logger.error(f"获取步骤性能统计失败: {e}")
-            return web.json_response(
+            return json_response(
                 {"error": str(e), "code": 500}, 
                 status=500
             )
@@ -149,16 +190,16 @@ class ApiHandlers:
             data = await request.json()
             queryDate = data.get('queryDate')
             if not queryDate:
-                return web.json_response(
+                return json_response(
                     {"error": "缺少queryDate参数", "code": 400},
                     status=400
                 )
 
-            channels = self.data_service.get_channel_stats(queryDate)
-            return web.json_response({"data": channels, "code": 200})
+            channels = await self._dispatch('channel-stats', 'get_channel_stats', queryDate)
+            return json_response({"data": channels, "code": 200}, request=request)
         except Exception as e:
             logger.error(f"获取渠道统计失败: {e}")
-            return web.json_response(
+            return json_response(
                 {"error": str(e), "code": 500}, 
                 status=500
             )
@@ -169,16 +210,16 @@ class ApiHandlers:
             data = await request.json()
             queryDate = data.get('queryDate')
             if not queryDate:
-                return web.json_response(
+                return json_response(
                     {"error": "缺少queryDate参数", "code": 400},
                     status=400
                 )
 
-            stats = self.data_service.get_no_ticket_stats(queryDate)
-            return web.json_response({"data": stats, "code": 200})
+            stats = await self._dispatch('no-ticket-stats', 'get_no_ticket_stats', queryDate)
+            return json_response({"data": stats, "code": 200}, request=request)
         except Exception as e:
             logger.error(f"获取免提单统计失败: {e}")
-            return web.json_response(
+            return json_response(
                 {"error": str(e), "code": 500}, 
                 status=500
             )
@@ -189,16 +230,16 @@ class ApiHandlers:
             data = await request.json()
             queryDate = data.get('queryDate')
             if not queryDate:
-                return web.json_response(
+                return json_response(
                     {"error": "缺少queryDate参数", "code": 400},
                     status=400
                 )
 
-            scenarios = self.data_service.get_scenario_stats(queryDate)
-            return web.json_response({"data": scenarios, "code": 200})
+            scenarios = await self._dispatch('scenario-stats', 'get_scenario_stats', queryDate)
+            return json_response({"data": scenarios, "code": 200}, request=request)
         except Exception as e:
             logger.error(f"获取场景统计失败: {e}")
-            return web.json_response(
+            return json_response(
                 {"error": str(e), "code": 500}, 
                 status=500
             )
@@ -209,16 +250,16 @@ class ApiHandlers:
             data = await request.json()
             queryDate = data.get('queryDate')
             if not queryDate:
-                return web.json_response(
+                return json_response(
                     {"error": "缺少queryDate参数", "code": 400},
                     status=400
                 )
 
-            users = self.data_service.get_user_stats(queryDate)
-            return web.json_response({"data": users, "code": 200})
+            users = await self._dispatch('user-stats', 'get_user_stats', queryDate)
+            return json_response({"data": users, "code": 200}, request=request)
         except Exception as e:
             logger.error(f"获取用户统计失败: {e}")
-            return web.json_response(
+            return json_response(
                 {"error": str(e), "code": 500}, 
                 status=500
             )
@@ -229,16 +270,16 @@ class ApiHandlers:
             data = await request.json()
             bizSeq = data.get('bizSeq')
             if not bizSeq:
-                return web.json_response(
+                return json_response(
                     {"error": "缺少bizSeq参数", "code": 400},
                     status=400
                 )
 
-            detail = self.data_service.get_performance_detail(bizSeq)
-            return web.json_response({"data": detail, "code": 200})
+            detail = await self._dispatch('performance-detail', 'get_performance_detail', bizSeq)
+            return json_response({"data": detail, "code": 200}, request=request)
         except Exception as e:
             logger.error(f"获取性能详细分析失败: {e}")
-            return web.json_response(
+            return json_response(
                 {"error": str(e), "code": 500}, 
                 status=500
             )
@@ -250,11 +291,11 @@ class ApiHandlers:
             startDate = data.get('startDate')
             endDate = data.get('endDate')
 
-            trend = self.data_service.get_date_range_query_trend(startDate, endDate)
-            return web.json_response({"data": trend, "code": 200})
+            trend = await self._dispatch('weekly-query-trend', 'get_date_range_query_trend', startDate, endDate)
+            return json_response({"data": trend, "code": 200}, request=request)
         except Exception as e:
             logger.error(f"获取查询趋势失败: {e}")
-            return web.json_response(
+            return json_response(
                 {"error": str(e), "code": 500}, 
                 status=500
             )
@@ -266,11 +307,11 @@ class ApiHandlers:
             startDate = data.get('startDate')
             endDate = data.get('endDate')
 
-            trend = self.data_service.get_date_range_step_trend(startDate, endDate)
-            return web.json_response({"data": trend, "code": 200})
+            trend = await self._dispatch('weekly-step-trend', 'get_date_range_step_trend', startDate, endDate)
+            return json_response({"data": trend, "code": 200}, request=request)
         except Exception as e:
             logger.error(f"获取步骤趋势失败: {e}")
-            return web.json_response(
+            return json_response(
                 {"error": str(e), "code": 500}, 
                 status=500
             )
@@ -282,31 +323,82 @@ class ApiHandlers:
             startDate = data.get('startDate')
             endDate = data.get('endDate')
 
-            trend = self.data_service.get_date_range_channel_trend(startDate, endDate)
-            return web.json_response({"data": trend, "code": 200})
+            trend = await self._dispatch('weekly-channel-trend', 'get_date_range_channel_trend', startDate, endDate)
+            return json_response({"data": trend, "code": 200}, request=request)
         except Exception as e:
             logger.error(f"获取渠道趋势失败: {e}")
-            return web.json_response(
+            return json_response(
                 {"error": str(e), "code": 500}, 
                 status=500
             )
     
+    async def latency_percentiles_handler(self, request: web.Request):
+        """获取指定日期范围的耗时分位数（合并每日耗时草图）"""
+        try:
+            data = await request.json()
+            startDate = data.get('startDate')
+            endDate = data.get('endDate')
+            kind = data.get('kind', 'step')
+            percentiles, error_response = self._parse_percentiles(data)
+            if error_response is not None:
+                return error_response
+
+            result = await self._dispatch('latency-percentiles', 'get_latency_percentiles', startDate, endDate, kind, percentiles)
+            return json_response({"data": result, "code": 200}, request=request)
+        except ValueError as e:
+            return json_response(
+                {"error": str(e), "code": 400},
+                status=400
+            )
+        except Exception as e:
+            logger.error(f"获取耗时分位数失败: {e}")
+            return json_response(
+                {"error": str(e), "code": 500}, 
+                status=500
+            )
+
+    async def slow_requests_handler(self, request: web.Request):
+        """获取指定日期范围各查询类别（或各环节）耗时最长的请求"""
+        try:
+            data = await request.json()
+            startDate = data.get('startDate')
+            endDate = data.get('endDate')
+            kind = data.get('kind', 'template')
+            name = data.get('name')
+            limit = data.get('limit', 50)
+            if not isinstance(limit, int) or isinstance(limit, bool):
+                raise ValueError("limit参数必须是整数")
+
+            result = await self._dispatch('slow-requests', 'get_slow_requests', startDate, endDate, kind, name, limit)
+            return json_response({"data": result, "code": 200}, request=request)
+        except ValueError as e:
+            return json_response(
+                {"error": str(e), "code": 400},
+                status=400
+            )
+        except Exception as e:
+            logger.error(f"获取最慢请求失败: {e}")
+            return json_response(
+                {"error": str(e), "code": 500}, 
+                status=500
+            )
+
     async def agent_error_details_handler(self, request: web.Request):
         """获取Agent子系统错误明细数据"""
         try:
             data = await request.json()
             queryDate = data.get('queryDate')
             if not queryDate:
-                return web.json_response(
+                return json_response(
                     {"error": "缺少queryDate参数", "code": 400},
                     status=400
                 )
 
-            details = self.data_service.get_agent_error_details(queryDate)
-            return web.json_response({"data": details, "code": 200})
+            details = await self._dispatch('agent-error-details', 'get_agent_error_details', queryDate)
+            return json_response({"data": details, "code": 200}, request=request)
         except Exception as e:
             logger.error(f"获取Agent错误明细失败: {e}")
-            return web.json_response(
+            return json_response(
                 {"error": str(e), "code": 500}, 
                 status=500
             )
@@ -317,16 +409,109 @@ class ApiHandlers:
             data = await request.json()
             queryDate = data.get('queryDate')
             if not queryDate:
-                return web.json_response(
+                return json_response(
                     {"error": "缺少queryDate参数", "code": 400},
                     status=400
                 )
 
-            details = self.data_service.get_ds_error_details(queryDate)
-            return web.json_response({"data": details, "code": 200})
+            details = await self._dispatch('ds-error-details', 'get_ds_error_details', queryDate)
+            return json_response({"data": details, "code": 200}, request=request)
         except Exception as e:
             logger.error(f"获取DS错误明细失败: {e}")
-            return web.json_response(
+            return json_response(
+                {"error": str(e), "code": 500}, 
+                status=500
+            )
+    
+    async def error_detail_page_handler(self, request: web.Request):
+        """分页获取一个错误码分组的请求明细（截断预览）"""
+        try:
+            data = await request.json()
+            queryDate = data.get('queryDate')
+            if not queryDate:
+                return json_response(
+                    {"error": "缺少queryDate参数", "code": 400},
+                    status=400
+                )
+            subsystem = data.get('subsystem')
+            code = data.get('code')
+            errorType = data.get('errorType')
+            cursor = data.get('cursor')
+            limit = data.get('limit')
+
+            page = await self._dispatch('error-details/page', 'get_error_detail_page',
+                                        queryDate, subsystem, code, errorType, cursor, limit)
+            return json_response({"data": page, "code": 200}, request=request)
+        except ValueError as e:
+            return json_response(
+                {"error": str(e), "code": 400},
+                status=400
+            )
+        except Exception as e:
+            logger.error(f"获取错误明细分页失败: {e}")
+            return json_response(
+                {"error": str(e), "code": 500}, 
+                status=500
+            )
+    
+    async def error_signatures_handler(self, request: web.Request):
+        """获取错误消息签名（相似的错误消息归为一个签名，返回计数和示例）"""
+        try:
+            data = await request.json()
+            queryDate = data.get('queryDate')
+            if not queryDate:
+                return json_response(
+                    {"error": "缺少queryDate参数", "code": 400},
+                    status=400
+                )
+            subsystem = data.get('subsystem')
+            code = data.get('code')
+            errorType = data.get('errorType')
+            limit = data.get('limit')
+
+            signatures = await self._dispatch('error-signatures', 'get_error_signatures',
+                                              queryDate, subsystem, code, errorType, limit)
+            return json_response({"data": signatures, "code": 200}, request=request)
+        except ValueError as e:
+            return json_response(
+                {"error": str(e), "code": 400},
+                status=400
+            )
+        except Exception as e:
+            logger.error(f"获取错误签名失败: {e}")
+            return json_response(
+                {"error": str(e), "code": 500}, 
+                status=500
+            )
+    
+    async def error_detail_full_handler(self, request: web.Request):
+        """按id（分页明细中的id）或biz_seq获取错误请求的完整req_info/rsp_info"""
+        try:
+            data = await request.json()
+            logId = data.get('id')
+            bizSeq = data.get('bizSeq')
+            subsystem = data.get('subsystem')
+            if logId is None and not bizSeq:
+                return json_response(
+                    {"error": "缺少id或bizSeq参数", "code": 400},
+                    status=400
+                )
+            if logId is not None and (not isinstance(logId, int) or isinstance(logId, bool)):
+                return json_response(
+                    {"error": "id参数必须是整数", "code": 400},
+                    status=400
+                )
+
+            detail = await self._dispatch('error-details/full', 'get_error_detail', bizSeq, logId, subsystem)
+            return json_response({"data": detail, "code": 200}, request=request)
+        except ValueError as e:
+            return json_response(
+                {"error": str(e), "code": 400},
+                status=400
+            )
+        except Exception as e:
+            logger.error(f"获取错误请求详情失败: {e}")
+            return json_response(
                 {"error": str(e), "code": 500}, 
                 status=500
             )
@@ -337,16 +522,87 @@ class ApiHandlers:
             data = await request.json()
             queryDate = data.get('queryDate')
             if not queryDate:
-                return web.json_response(
+                return json_response(
                     {"error": "缺少queryDate参数", "code": 400},
                     status=400
                 )
 
-            stats = self.data_service.get_user_retention_stats(queryDate)
-            return web.json_response({"data": stats, "code": 200})
+            stats = await self._dispatch('user-retention-stats', 'get_user_retention_stats', queryDate)
+            return json_response({"data": stats, "code": 200}, request=request)
         except Exception as e:
             logger.error(f"获取用户留存率统计失败: {e}")
-            return web.json_response(
+            return json_response(
+                {"error": str(e), "code": 500}, 
+                status=500
+            )
+    
+    async def n_day_retention_handler(self, request: web.Request):
+        """获取N日留存率"""
+        try:
+            data = await request.json()
+            queryDate = data.get('queryDate')
+            if not queryDate:
+                return json_response(
+                    {"error": "缺少queryDate参数", "code": 400},
+                    status=400
+                )
+            days = data.get('days')
+            if days is not None and not isinstance(days, list):
+                raise ValueError("days参数必须是数组")
+
+            result = await self._dispatch('n-day-retention', 'get_n_day_retention', queryDate, days)
+            return json_response({"data": result, "code": 200}, request=request)
+        except ValueError as e:
+            return json_response(
+                {"error": str(e), "code": 400},
+                status=400
+            )
+        except Exception as e:
+            logger.error(f"获取N日留存率失败: {e}")
+            return json_response(
+                {"error": str(e), "code": 500}, 
+                status=500
+            )
+
+    async def retention_matrix_handler(self, request: web.Request):
+        """获取同期群留存矩阵"""
+        try:
+            data = await request.json()
+            startDate = data.get('startDate')
+            endDate = data.get('endDate')
+            maxOffset = data.get('maxOffset', 30)
+
+            result = await self._dispatch('retention-matrix', 'get_retention_matrix', startDate, endDate, maxOffset)
+            return json_response({"data": result, "code": 200}, request=request)
+        except ValueError as e:
+            return json_response(
+                {"error": str(e), "code": 400},
+                status=400
+            )
+        except Exception as e:
+            logger.error(f"获取留存矩阵失败: {e}")
+            return json_response(
+                {"error": str(e), "code": 500}, 
+                status=500
+            )
+    
+    async def distinct_users_handler(self, request: web.Request):
+        """获取日期范围内的去重用户数（合并每日去重用户数草图）"""
+        try:
+            data = await request.json()
+            startDate = data.get('startDate')
+            endDate = data.get('endDate')
+
+            result = await self._dispatch('distinct-users', 'get_distinct_users', startDate, endDate)
+            return json_response({"data": result, "code": 200}, request=request)
+        except ValueError as e:
+            return json_response(
+                {"error": str(e), "code": 400},
+                status=400
+            )
+        except Exception as e:
+            logger.error(f"获取去重用户数失败: {e}")
+            return json_response(
                 {"error": str(e), "code": 500}, 
                 status=500
             )
@@ -357,16 +613,42 @@ class ApiHandlers:
             data = await request.json()
             queryDate = data.get('queryDate')
             if not queryDate:
-                return web.json_response(
+                return json_response(
                     {"error": "缺少queryDate参数", "code": 400},
                     status=400
                 )
 
-            users = self.data_service.get_churned_users(queryDate)
-            return web.json_response({"data": users, "code": 200})
+            days = data.get('days')
+            if days is not None and not isinstance(days, list):
+                raise ValueError("days参数必须是数组")
+
+            users = await self._dispatch('churned-users', 'get_churned_users', queryDate, days)
+            return json_response({"data": users, "code": 200}, request=request)
+        except ValueError as e:
+            return json_response(
+                {"error": str(e), "code": 400},
+                status=400
+            )
         except Exception as e:
             logger.error(f"获取流失用户列表失败: {e}")
-            return web.json_response(
+            return json_response(
                 {"error": str(e), "code": 500}, 
                 status=500
-            )
\ No newline at end of file
+            )
+    
+    async def db_stats_handler(self, request: web.Request):
+        """获取数据库访问监控统计"""
+        try:
+            stats = self.data_service.get_db_stats()
+            stats['executor'] = self.query_executor.get_stats()
+            return json_response({"data": stats, "code": 200}, request=request)
+        except Exception as e:
+            logger.error(f"获取数据库访问统计失败: {e}")
+            return json_response(
+                {"error": str(e), "code": 500}, 
+                status=500
+            )
+    
+    async def close(self):
+        """释放处理器持有的查询线程池"""
+        self.query_executor.shutdown()
@@ -2,10 +2,14 @@
 # -*- coding: utf-8 -*-
 
 from aiohttp import web
-import json
 import logging
-from api_handlers import ApiHandlers
+from api_handlers import ApiHandlers, json_response
 from db_session import first_init_db
+from rollup_job import run_rollup_loop, rollup_config
+from label_job import run_label_loop, label_config
+from activity_job import run_activity_loop, activity_config
+from today_aggregator import run_today_aggregator_loop, today_aggregator_config
+import asyncio
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
@@ -24,7 +28,7 @@ async def log_middleware(request, handler):
         return response
     except Exception as e:
         logger.error(f"请求处理失败: {e}")
-        return web.json_response(
+        return json_response(
             {"error": str(e), "code": 500}, 
             status=500
         )
@@ -47,6 +51,42 @@ async def init_app_on_startup(app):
     except Exception as e:
         logger.error(f"数据库初始化失败: {e}")
 
+async def start_rollup_task(app):
+    """启动每日汇总后台任务"""
+    if rollup_config.enabled:
+        app['rollup_task'] = asyncio.create_task(run_rollup_loop())
+        logger.info("每日汇总后台任务已启动")
+
+async def start_label_task(app):
+    """启动请求标签后台任务"""
+    if label_config.enabled:
+        app['label_task'] = asyncio.create_task(run_label_loop())
+        logger.info("请求标签后台任务已启动")
+
+async def start_activity_task(app):
+    """启动活跃用户位图后台任务"""
+    if activity_config.enabled:
+        app['activity_task'] = asyncio.create_task(run_activity_loop())
+        logger.info("活跃用户位图后台任务已启动")
+
+async def start_today_aggregator_task(app):
+    """启动当天增量聚合的后台完整聚合任务"""
+    if today_aggregator_config.enabled:
+        app['today_aggregator_task'] = asyncio.create_task(run_today_aggregator_loop())
+        logger.info("当天增量聚合后台任务已启动")
+
+async def cleanup_app_on_shutdown(app):
+    """应用关闭时停止后台任务并关闭查询线程池"""
+    for task_name in ('rollup_task', 'label_task', 'activity_task', 'today_aggregator_task'):
+        task = app.get(task_name)
+        if task is not None:
+            task.cancel()
+    try:
+        await api_handlers.close()
+        logger.info("查询线程池已释放")
+    except Exception as e:
+        logger.error(f"释放查询线程池失败: {e}")
+
 # 创建应用
 app = web.Application(client_max_size=2000 * 1024 * 1024)
 
@@ -70,13 +110,27 @@ app.router.add_post("/api/weekly-step-trend", api_handlers.step_trend_handler)
 app.router.add_post("/api/weekly-channel-trend", api_handlers.channel_trend_handler)
 app.router.add_post("/api/agent-error-details", api_handlers.agent_error_details_handler)
 app.router.add_post("/api/ds-error-details", api_handlers.ds_error_details_handler)
+app.router.add_post("/api/error-details/page", api_handlers.error_detail_page_handler)
+app.router.add_post("/api/error-details/full", api_handlers.error_detail_full_handler)
+app.router.add_post("/api/error-signatures", api_handlers.error_signatures_handler)
 app.router.add_post("/api/user-retention-stats", api_handlers.user_retention_stats_handler)
 app.router.add_post("/api/churned-users", api_handlers.churned_users_handler)
+app.router.add_post("/api/n-day-retention", api_handlers.n_day_retention_handler)
+app.router.add_post("/api/retention-matrix", api_handlers.retention_matrix_handler)
+app.router.add_post("/api/distinct-users", api_handlers.distinct_users_handler)
+app.router.add_post("/api/latency-percentiles", api_handlers.latency_percentiles_handler)
+app.router.add_post("/api/slow-requests", api_handlers.slow_requests_handler)
+app.router.add_post("/api/monitor/db-stats", api_handlers.db_stats_handler)
 
 def run():
     """运行应用"""
     # 注册启动钩子
     app.on_startup.append(init_app_on_startup)
+    app.on_startup.append(start_rollup_task)
+    app.on_startup.append(start_label_task)
+    app.on_startup.append(start_activity_task)
+    app.on_startup.append(start_today_aggregator_task)
+    app.on_cleanup.append(cleanup_app_on_shutdown)
     
     # 启动应用
     web.run_app(app, port=8000, host='0.0.0.0')
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+场景分类器吞吐量测试（在backend目录下运行）：
+
+    python benchmarks/scenario_benchmark.py --rows 200000
+"""
+
+from typing import Dict
+from collections import Counter
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scenario_rules import classify_scenarios
+
+# 吞吐量测试使用的样例日志 (req_info, rsp_info)
+BENCHMARK_SAMPLES = [
+    ('{"question": "EXPLAIN SELECT * FROM t_order WHERE id = 1", "dbType": "TDSQL"}', '{"answer": "执行计划如下"}'),
+    ('{"question": "SELECT IF(COUNT(1) > 0, \'Y\', \'N\') FROM t_user", "dbType": "TIDB"}', '{"answer": "Y"}'),
+    ('{"question": "SELECT COUNT(1) FROM t_order WHERE status = 2", "dbType": "TDSQL"}', '{"answer": "128"}'),
+    ('{"question": "DESC t_order", "dbType": "TIDB"}', '{"answer": "id bigint, status int ..."}'),
+    ('{"question": "SELECT DISTINCT status FROM t_order", "dbType": "HIVE"}', '{"answer": "1, 2, 3"}'),
+    ('{"question": "SELECT create_time FROM t_order ORDER BY id DESC LIMIT 1", "dbType": "TDSQL"}', '{"answer": "2025-01-01"}'),
+    ('{"question": "查询系统参数", "dbType": "TDSQL"}', '{"SQL_TITLE": "系统配置查询", "answer": "..."}'),
+    ('{"question": "SELECT LENGTH(name) FROM t_user", "dbType": "TIDB"}', '{"answer": "32"}'),
+    ('{"question": "帮我提单，确认同意", "dbType": "TDSQL"}', '{"answer": "很荣幸能够为您服务，请阅读用户协议"}'),
+    ('{"question": "SELECT * FROM t_order WHERE id = 1 ###template###", "dbType": "TDSQL"}' + ' ' * 2000, None),
+]
+
+
+def benchmark(rows: int = 200000) -> Dict[str, float]:
+    """分类器吞吐量测试：对样例日志循环分类rows次，返回耗时和每秒处理行数"""
+    samples = BENCHMARK_SAMPLES
+    started = time.perf_counter()
+    counts = Counter()
+    for i in range(rows):
+        req_info, rsp_info = samples[i % len(samples)]
+        for scenario in classify_scenarios(req_info, rsp_info):
+            counts[scenario] += 1
+    elapsed = time.perf_counter() - started
+    return {
+        'rows': rows,
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(rows / elapsed) if elapsed > 0 else float('inf')
+    }
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='场景分类器吞吐量测试')
+    parser.add_argument('--rows', type=int, default=200000, help='分类的日志条数')
+    args = parser.parse_args()
+    result = benchmark(args.rows)
+    print(f"{result['rows']}条日志，耗时{result['seconds']}秒，{result['rows_per_second']}条/秒")
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+响应序列化耗时和大小测试（在backend目录下运行），样例数据为错误明细和趋势接口的响应：
+
+    python benchmarks/serializer_benchmark.py --rows 20000
+"""
+
+from typing import Any
+from datetime import datetime, timedelta
+from decimal import Decimal
+import gzip
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from serializer import dumps, serializer_config, orjson, brotli
+
+
+def legacy_dumps(obj: Any) -> bytes:
+    """原来的响应路径：递归复制转换Decimal后用标准库json（ensure_ascii）序列化"""
+    def convert_decimals(value):
+        if isinstance(value, Decimal):
+            return float(value)
+        if isinstance(value, dict):
+            return {key: convert_decimals(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [convert_decimals(item) for item in value]
+        return value
+    return json.dumps(convert_decimals(obj)).encode('utf-8')
+
+def sample_payloads(rows: int):
+    """生成错误明细（分页前的完整明细、只含计数的分组树）和90天渠道/环节趋势的样例响应"""
+    now = datetime(2025, 1, 1, 12, 0, 0)
+    details = []
+    for i in range(rows):
+        details.append({
+            'biz_seq': f'B2DU2025010112{i:08d}',
+            'result_code': 'B2DU0' + '1349'[i % 4] + f'{i % 7:04d}'[-4:],
+            'req_info': json.dumps({
+                'query': f'查询订单表t_order_{i % 50}中状态为{i % 5}的记录数量',
+                'dbType': 'TDSQL',
+                'sysNameList': ['订单系统', '支付系统'],
+                'context': 'x' * 800
+            }, ensure_ascii=False),
+            'rsp_info': json.dumps({
+                'queryRsp': f"表't_order_{i % 50}'不存在，请确认库名，流水号{i}",
+                'trace': 'y' * 400
+            }, ensure_ascii=False),
+            'create_time': (now - timedelta(seconds=i)).strftime('%Y-%m-%d %H:%M:%S')
+        })
+    full_tree = {'queryDate': '2025-01-01', 'business_errors': [], 'system_errors': []}
+    groups = {}
+    for detail in details:
+        groups.setdefault(detail['result_code'], []).append(detail)
+    for code, items in groups.items():
+        full_tree['system_errors'].append({
+            'error_type': code[6], 'type_name': '服务调用错误', 'count': len(items),
+            'code_groups': [{'code': code[-4:], 'count': len(items), 'details': items}]
+        })
+    count_tree = {
+        'queryDate': '2025-01-01',
+        'business_errors': [],
+        'system_errors': [
+            dict(error, code_groups=[{'code': g['code'], 'count': g['count']} for g in error['code_groups']])
+            for error in full_tree['system_errors']
+        ]
+    }
+    days = [(now - timedelta(days=i)).strftime('%Y-%m-%d') for i in range(90)]
+    trend = {
+        'dates': days,
+        'channels': [
+            {
+                'channel': f'channel_{c}',
+                'channel_name': f'渠道{c}',
+                'data': [{'date': day, 'count': 1000 + c * 10 + d, 'member_count': 100 + d,
+                          'non_member_count': 900 + c * 10, 'avg_cost': Decimal('1234.56')}
+                         for d, day in enumerate(days)]
+            }
+            for c in range(10)
+        ]
+    }
+    return {
+        'error-details（完整明细）': {'data': full_tree, 'code': 200},
+        'error-details（只含计数）': {'data': count_tree, 'code': 200},
+        'channel-trend（90天）': {'data': trend, 'code': 200}
+    }
+
+def benchmark(rows: int = 20000, repeat: int = 5):
+    """比较原响应路径与dumps的序列化耗时（毫秒，取最快一次）和响应字节数（原始、gzip、brotli）"""
+    results = []
+    for name, payload in sample_payloads(rows).items():
+        timings = {}
+        bodies = {}
+        for label, encode in (('legacy', legacy_dumps), ('dumps', dumps)):
+            best = None
+            for _ in range(repeat):
+                started = time.perf_counter()
+                body = encode(payload)
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            timings[label] = round(best * 1000, 2)
+            bodies[label] = body
+        body = bodies['dumps']
+        results.append({
+            'payload': name,
+            'legacy_ms': timings['legacy'],
+            'dumps_ms': timings['dumps'],
+            'legacy_bytes': len(bodies['legacy']),
+            'bytes': len(body),
+            'gzip_bytes': len(gzip.compress(body, compresslevel=serializer_config.gzip_level)),
+            'brotli_bytes': len(brotli.compress(body, quality=serializer_config.brotli_quality)) if brotli is not None else None
+        })
+    return results
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='响应序列化耗时和大小测试')
+    parser.add_argument('--rows', type=int, default=20000, help='错误明细样例的请求条数')
+    args = parser.parse_args()
+    print(f"序列化: {'orjson' if orjson is not None and serializer_config.use_orjson else '标准库json'}，"
+          f"brotli: {'可用' if brotli is not None else '未安装'}")
+    for result in benchmark(args.rows):
+        print(f"{result['payload']}: 原路径{result['legacy_ms']}ms/{result['legacy_bytes']}字节，"
+              f"dumps {result['dumps_ms']}ms/{result['bytes']}字节，gzip {result['gzip_bytes']}字节，"
+              f"brotli {result['brotli_bytes'] if result['brotli_bytes'] is not None else '-'}字节")
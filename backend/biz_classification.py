@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+按天的biz_seq分类
+
+模板/非模板查询性能和环节耗时都要判断biz_seq属于哪类查询：
+- 数据库类型：req_info包含TDSQL / TIDB / HIVE（可同时包含多个）
+- 模板查询：req_info包含###；非模板查询：req_info不包含###（与数据库类型在同一条请求日志上判断）
+- 环境：biz_seq出现在当天的req_aomp_log中为生产环境，否则为准生产环境
+- HIVE查询：req_info包含HIVE（环节耗时中QUERY_SCHEMA和SUB_QUERY需要排除）
+
+每天的分类只用两次查询构建一次并缓存，所有性能卡片和环节耗时卡片在应用中与t_step_time_record的结果关联；
+每个biz_seq的总耗时同样每天只查询一次，模板/非模板查询性能的所有指标都由这一结果推导
+"""
+
+from datetime import datetime, date, timedelta
+from typing import List, Dict, Any, Optional, Tuple
+from collections import OrderedDict, namedtuple
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# 数据库类型
+DB_TYPES = ['TDSQL', 'TIDB', 'HIVE']
+# 数据库类型在请求标签（t_request_label.db_type_mask）中对应的位
+DB_TYPE_BITS = {db_type: 1 << i for i, db_type in enumerate(DB_TYPES)}
+
+# 查询类型对应的req_info条件（模板查询包含###，非模板查询不包含###）
+QUERY_KIND_CONDITIONS = {
+    'template': 'req_info LIKE %s',
+    'non_template': 'req_info NOT LIKE %s'
+}
+
+# 模板/非模板查询性能的统计类别（顺序即返回顺序）
+# production为None表示不区分环境（HIVE只有生产环境，不判断req_aomp_log）
+PERFORMANCE_CATEGORIES = [
+    {'category': 'TDSQL-准生产环境', 'db_type': 'TDSQL', 'environment': '准生产环境', 'production': False},
+    {'category': 'TDSQL-生产环境', 'db_type': 'TDSQL', 'environment': '生产环境', 'production': True},
+    {'category': 'TIDB-准生产环境', 'db_type': 'TIDB', 'environment': '准生产环境', 'production': False},
+    {'category': 'TIDB-生产环境', 'db_type': 'TIDB', 'environment': '生产环境', 'production': True},
+    {'category': 'HIVE-生产环境', 'db_type': 'HIVE', 'environment': '生产环境', 'production': None}
+]
+
+# 单个biz_seq的分类：各查询类型命中的数据库类型、是否生产环境、是否HIVE查询
+BizSeqClass = namedtuple('BizSeqClass', ['db_types', 'is_production', 'is_hive'])
+
+# 按天缓存：(名称, queryDate) -> (过期时间, 结果)，分类和每个biz_seq的总耗时共用
+# 当天的请求仍在增长，只缓存很短时间；历史日期数据不再变化，缓存时间更长
+DAY_CACHE_TODAY_TTL = 30
+DAY_CACHE_HISTORY_TTL = 600
+DAY_CACHE_SIZE = 16
+_day_cache = OrderedDict()
+_day_cache_lock = threading.Lock()
+
+def _get_cached(name: str, queryDate: str) -> Optional[Any]:
+    """读取未过期的缓存"""
+    key = (name, queryDate)
+    with _day_cache_lock:
+        cached = _day_cache.get(key)
+        if cached is None:
+            return None
+        expires_at, value = cached
+        if expires_at < time.monotonic():
+            del _day_cache[key]
+            return None
+        return value
+
+def _set_cached(name: str, queryDate: str, date_obj: date, value: Any):
+    """写入缓存"""
+    key = (name, queryDate)
+    ttl = DAY_CACHE_HISTORY_TTL if date_obj < date.today() else DAY_CACHE_TODAY_TTL
+    with _day_cache_lock:
+        _day_cache[key] = (time.monotonic() + ttl, value)
+        _day_cache.move_to_end(key)
+        while len(_day_cache) > DAY_CACHE_SIZE:
+            _day_cache.popitem(last=False)
+
+def _build_classification_sql() -> str:
+    """生成按biz_seq分组的分类SQL：每个 查询类型 × 数据库类型 一列，任一条请求日志命中即为1"""
+    columns = []
+    for kind, condition in QUERY_KIND_CONDITIONS.items():
+        for db_type in DB_TYPES:
+            columns.append(f"MAX({condition} AND req_info LIKE %s) AS {kind}_{db_type.lower()}")
+    columns.append("MAX(req_info LIKE %s) AS is_hive")
+    return f"""
+            SELECT biz_seq, {', '.join(columns)}
+            FROM t_handler_logs
+            WHERE create_time >= %s AND create_time < %s
+            AND biz_seq IS NOT NULL
+            GROUP BY biz_seq
+        """
+
+CLASSIFICATION_SQL = _build_classification_sql()
+
+def _classification_params(start: str, end: str) -> tuple:
+    params = []
+    for _ in QUERY_KIND_CONDITIONS:
+        for db_type in DB_TYPES:
+            params += ['%###%', f'%{db_type}%']
+    params.append('%HIVE%')
+    return tuple(params) + (start, end)
+
+# 已完成请求标签的日期，分类直接对标签表的整数列分组
+LABEL_CLASSIFICATION_SQL = """
+            SELECT biz_seq,
+                BIT_OR(CASE WHEN is_template = 1 THEN db_type_mask ELSE 0 END) AS template_mask,
+                BIT_OR(CASE WHEN is_template = 0 THEN db_type_mask ELSE 0 END) AS non_template_mask,
+                BIT_OR(db_type_mask) AS db_type_mask
+            FROM t_request_label
+            WHERE stat_date = %s
+            AND biz_seq IS NOT NULL
+            GROUP BY biz_seq
+        """
+
+def decode_db_types(db_type_mask: int) -> frozenset:
+    """数据库类型位掩码转换为数据库类型集合"""
+    return frozenset(db_type for db_type, bit in DB_TYPE_BITS.items() if db_type_mask & bit)
+
+def get_day_classification(db_manager, queryDate: str) -> Dict[str, BizSeqClass]:
+    """获取指定日期所有biz_seq的分类（带缓存；已完成请求标签的日期读取标签表）"""
+    cached = _get_cached('classification', queryDate)
+    if cached is not None:
+        return cached
+
+    date_obj = datetime.strptime(queryDate, '%Y-%m-%d').date()
+    start = date_obj.strftime('%Y-%m-%d')
+    end = (date_obj + timedelta(days=1)).strftime('%Y-%m-%d')
+
+    production_biz_seqs = set(db_manager.execute_query_columns("""
+        SELECT DISTINCT biz_seq FROM req_aomp_log
+        WHERE create_time >= %s AND create_time < %s
+        AND biz_seq IS NOT NULL
+    """, (start, end)).get('biz_seq', []))
+
+    classification = {}
+    if db_manager.is_labelled(queryDate):
+        for rows in db_manager.execute_query_stream(LABEL_CLASSIFICATION_SQL, (start,), 5000):
+            for row in rows:
+                classification[row['biz_seq']] = BizSeqClass(
+                    db_types={
+                        'template': decode_db_types(int(row['template_mask'])),
+                        'non_template': decode_db_types(int(row['non_template_mask']))
+                    },
+                    is_production=row['biz_seq'] in production_biz_seqs,
+                    is_hive=bool(int(row['db_type_mask']) & DB_TYPE_BITS['HIVE'])
+                )
+        _set_cached('classification', queryDate, date_obj, classification)
+        return classification
+
+    for rows in db_manager.execute_query_stream(CLASSIFICATION_SQL, _classification_params(start, end), 5000):
+        for row in rows:
+            classification[row['biz_seq']] = BizSeqClass(
+                db_types={
+                    kind: frozenset(db_type for db_type in DB_TYPES if row[f"{kind}_{db_type.lower()}"])
+                    for kind in QUERY_KIND_CONDITIONS
+                },
+                is_production=row['biz_seq'] in production_biz_seqs,
+                is_hive=bool(row['is_hive'])
+            )
+
+    _set_cached('classification', queryDate, date_obj, classification)
+    return classification
+
+def get_day_biz_costs(db_manager, queryDate: str) -> Tuple[List[str], Any]:
+    """
+    获取指定日期每个biz_seq的总耗时（不含REQ_DS子环节，带缓存）
+    返回 (biz_seq列表, 总耗时列表)，模板和非模板查询性能共用同一份结果
+    """
+    cached = _get_cached('biz_costs', queryDate)
+    if cached is not None:
+        return cached
+
+    date_obj = datetime.strptime(queryDate, '%Y-%m-%d').date()
+    columns = db_manager.execute_query_columns("""
+        SELECT biz_seq, SUM(cost) as cost FROM t_step_time_record 
+        WHERE create_time >= %s AND create_time < %s 
+        AND sub_step_name != 'REQ_DS' 
+        AND biz_seq IS NOT NULL 
+        GROUP BY biz_seq
+    """, (date_obj.strftime('%Y-%m-%d'), (date_obj + timedelta(days=1)).strftime('%Y-%m-%d')))
+    biz_costs = (columns.get('biz_seq', []), columns.get('cost', []))
+
+    _set_cached('biz_costs', queryDate, date_obj, biz_costs)
+    return biz_costs
+
+def match_categories(biz_class: Optional[BizSeqClass], query_kind: str) -> List[Dict[str, Any]]:
+    """返回biz_seq在指定查询类型下所属的性能统计类别（可能属于多个类别）"""
+    if biz_class is None:
+        return []
+    db_types = biz_class.db_types[query_kind]
+    if not db_types:
+        return []
+    return [
+        category for category in PERFORMANCE_CATEGORIES
+        if category['db_type'] in db_types
+        and (category['production'] is None or category['production'] == biz_class.is_production)
+    ]
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+耗时汇总统计
+
+对一组耗时一次计算 count/avg/min/max 和任意百分位。百分位与原_calculate_p90一致，
+位置为 q * (n - 1)，非整数位置在相邻两个值之间线性插值；
+通过np.partition只选出需要的位置，不对整个数组排序
+"""
+
+from typing import List, Dict, Any, Iterable
+import math
+import numpy as np
+
+# 默认计算的百分位
+DEFAULT_PERCENTILES = [50, 90, 99]
+
+def percentile_key(percentile: float) -> str:
+    """百分位对应的结果键，如 90 -> 'p90'，99.9 -> 'p99.9'"""
+    return f"p{float(percentile):g}"
+
+def normalize_percentiles(percentiles: Iterable[float] = None) -> List[float]:
+    """校验百分位参数（0~100），为空时返回默认百分位"""
+    if not percentiles:
+        return list(DEFAULT_PERCENTILES)
+    normalized = []
+    for percentile in percentiles:
+        value = float(percentile)
+        if math.isnan(value) or not 0 <= value <= 100:
+            raise ValueError(f"百分位必须在0到100之间: {percentile}")
+        if value not in normalized:
+            normalized.append(value)
+    return normalized
+
+def _as_float_array(costs) -> np.ndarray:
+    """array('d')直接共享内存，其它序列转换为float64数组并去掉None"""
+    if isinstance(costs, np.ndarray):
+        return costs.astype(np.float64, copy=False)
+    try:
+        return np.frombuffer(costs, dtype=np.float64)
+    except (TypeError, ValueError):
+        return np.fromiter((cost for cost in costs if cost is not None), dtype=np.float64)
+
+def summarize_costs(costs, percentiles: Iterable[float] = None) -> Dict[str, Any]:
+    """
+    计算耗时的汇总统计
+    返回 {'count', 'avg', 'min', 'max', 'percentiles': {'p50': ..., 'p90': ..., 'p99': ...}}，
+    耗时为空时除count外均为None
+    """
+    percentiles = normalize_percentiles(percentiles)
+    values = _as_float_array(costs)
+    count = int(values.size)
+    if count == 0:
+        return {
+            'count': 0,
+            'avg': None,
+            'min': None,
+            'max': None,
+            'percentiles': {percentile_key(p): None for p in percentiles}
+        }
+
+    positions = np.asarray(percentiles, dtype=np.float64) / 100.0 * (count - 1)
+    lower = np.floor(positions).astype(np.int64)
+    upper = np.minimum(lower + 1, count - 1)
+    weights = positions - lower
+    # 只把需要的位置（以及最小、最大值）放到正确位置上
+    kth = np.unique(np.concatenate((lower, upper, [0, count - 1])))
+    partitioned = np.partition(values, kth)
+    results = partitioned[lower] * (1 - weights) + partitioned[upper] * weights
+
+    return {
+        'count': count,
+        'avg': float(values.mean()),
+        'min': float(partitioned[0]),
+        'max': float(partitioned[count - 1]),
+        'percentiles': {percentile_key(p): float(v) for p, v in zip(percentiles, results)}
+    }
+
+def round_percentiles(summary_percentiles: Dict[str, Any], digits: int = 2) -> Dict[str, Any]:
+    """百分位结果保留指定位小数"""
+    return {key: round(value, digits) if value is not None else None for key, value in summary_percentiles.items()}
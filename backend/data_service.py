@@ -12,12 +12,14 @@ class DataService:
     """数据服务类，处理所有数据相关的业务逻辑"""
     
     def __init__(self):
+        # 每个方法都在一个工作单元中执行，同一次调用内的所有SQL复用一个连接
         self.db_manager = DatabaseManager()
     
     def get_template_query_stats(self, queryDate: str) -> Dict[str, Any]:
         """获取模板查询统计数据"""
         try:
-            return self.db_manager.get_template_query_stats(queryDate)
+            with self.db_manager.unit_of_work():
+                return self.db_manager.get_template_query_stats(queryDate)
         except Exception as e:
             logger.error(f"获取模板查询统计数据失败: {e}")
             raise e
@@ -25,31 +27,37 @@ class DataService:
     def get_non_template_query_stats(self, queryDate: str) -> Dict[str, Any]:
         """获取非模板查询统计数据"""
         try:
-            return self.db_manager.get_non_template_query_stats(queryDate)
+            with self.db_manager.unit_of_work():
+                return self.db_manager.get_non_template_query_stats(queryDate)
         except Exception as e:
             logger.error(f"获取非模板查询统计数据失败: {e}")
             raise e
     
-    def get_template_query_performance(self, queryDate: str) -> List[Dict[str, Any]]:
+    def get_template_query_performance(self, queryDate: str, percentiles: List[float] = None,
+            top_k: int = 0) -> List[Dict[str, Any]]:
         """获取模板查询性能统计"""
         try:
-            return self.db_manager.get_template_query_performance(queryDate)
+            with self.db_manager.unit_of_work():
+                return self.db_manager.get_template_query_performance(queryDate, percentiles, top_k)
         except Exception as e:
             logger.error(f"获取模板查询性能统计失败: {e}")
             raise e
     
-    def get_non_template_query_performance(self, queryDate: str) -> List[Dict[str, Any]]:
+    def get_non_template_query_performance(self, queryDate: str, percentiles: List[float] = None,
+            top_k: int = 0) -> List[Dict[str, Any]]:
         """获取非模板查询性能统计"""
         try:
-            return self.db_manager.get_non_template_query_performance(queryDate)
+            with self.db_manager.unit_of_work():
+                return self.db_manager.get_non_template_query_performance(queryDate, percentiles, top_k)
         except Exception as e:
             logger.error(f"获取非模板查询性能统计失败: {e}")
             raise e
     
-    def get_step_performance(self, queryDate: str) -> List[Dict[str, Any]]:
+    def get_step_performance(self, queryDate: str, percentiles: List[float] = None) -> List[Dict[str, Any]]:
         """获取各个环节的耗时统计"""
         try:
-            return self.db_manager.get_step_performance(queryDate)
+            with self.db_manager.unit_of_work():
+                return self.db_manager.get_step_performance(queryDate, percentiles)
         except Exception as e:
             logger.error(f"获取步骤性能统计失败: {e}")
             raise e
@@ -57,7 +65,8 @@ class DataService:
     def get_channel_stats(self, queryDate: str) -> List[Dict[str, Any]]:
         """获取各个渠道的查询数量统计"""
         try:
-            return self.db_manager.get_channel_stats(queryDate)
+            with self.db_manager.unit_of_work():
+                return self.db_manager.get_channel_stats(queryDate)
         except Exception as e:
             logger.error(f"获取渠道统计失败: {e}")
             raise e
@@ -65,7 +74,8 @@ class DataService:
     def get_no_ticket_stats(self, queryDate: str) -> Dict[str, Any]:
         """获取免提单数量统计"""
         try:
-            return self.db_manager.get_no_ticket_stats(queryDate)
+            with self.db_manager.unit_of_work():
+                return self.db_manager.get_no_ticket_stats(queryDate)
         except Exception as e:
             logger.error(f"获取免提单统计失败: {e}")
             raise e
@@ -73,7 +83,8 @@ class DataService:
     def get_scenario_stats(self, queryDate: str) -> List[Dict[str, Any]]:
         """获取各个场景的查询数量统计"""
         try:
-            return self.db_manager.get_scenario_stats(queryDate)
+            with self.db_manager.unit_of_work():
+                return self.db_manager.get_scenario_stats(queryDate)
         except Exception as e:
             logger.error(f"获取场景统计失败: {e}")
             raise e
@@ -81,7 +92,8 @@ class DataService:
     def get_user_stats(self, queryDate: str) -> List[Dict[str, Any]]:
         """获取使用人员统计"""
         try:
-            return self.db_manager.get_user_stats(queryDate)
+            with self.db_manager.unit_of_work():
+                return self.db_manager.get_user_stats(queryDate)
         except Exception as e:
             logger.error(f"获取用户统计失败: {e}")
             raise e
@@ -89,7 +101,8 @@ class DataService:
     def get_performance_detail(self, biz_seq: str) -> Dict[str, Any]:
         """获取性能详细分析"""
         try:
-            return self.db_manager.get_performance_detail(biz_seq)
+            with self.db_manager.unit_of_work():
+                return self.db_manager.get_performance_detail(biz_seq)
         except Exception as e:
             logger.error(f"获取性能详细分析失败: {e}")
             raise e
@@ -97,7 +110,8 @@ class DataService:
     def get_date_range_query_trend(self, start_date: str = None, end_date: str = None) -> List[Dict[str, Any]]:
         """获取指定日期范围的查询趋势"""
         try:
-            return self.db_manager.get_date_range_query_trend(start_date, end_date)
+            with self.db_manager.unit_of_work():
+                return self.db_manager.get_date_range_query_trend(start_date, end_date)
         except Exception as e:
             logger.error(f"获取日期范围查询趋势失败: {e}")
             raise e
@@ -105,7 +119,8 @@ class DataService:
     def get_date_range_step_trend(self, start_date: str = None, end_date: str = None) -> List[Dict[str, Any]]:
         """获取指定日期范围的各环节耗时趋势"""
         try:
-            return self.db_manager.get_date_range_step_trend(start_date, end_date)
+            with self.db_manager.unit_of_work():
+                return self.db_manager.get_date_range_step_trend(start_date, end_date)
         except Exception as e:
             logger.error(f"获取日期范围步骤趋势失败: {e}")
             raise e
@@ -113,15 +128,37 @@ class DataService:
     def get_date_range_channel_trend(self, start_date: str = None, end_date: str = None) -> List[Dict[str, Any]]:
         """获取指定日期范围的各渠道查询趋势"""
         try:
-            return self.db_manager.get_date_range_channel_trend(start_date, end_date)
+            with self.db_manager.unit_of_work():
+                return self.db_manager.get_date_range_channel_trend(start_date, end_date)
         except Exception as e:
             logger.error(f"获取日期范围渠道趋势失败: {e}")
             raise e
     
+    def get_latency_percentiles(self, start_date: str = None, end_date: str = None,
+                                kind: str = 'step', percentiles: List[float] = None) -> Dict[str, Any]:
+        """获取指定日期范围的耗时分位数"""
+        try:
+            with self.db_manager.unit_of_work():
+                return self.db_manager.get_latency_percentiles(start_date, end_date, kind, percentiles)
+        except Exception as e:
+            logger.error(f"获取耗时分位数失败: {e}")
+            raise e
+    
+    def get_slow_requests(self, start_date: str = None, end_date: str = None, kind: str = 'template',
+                          name: str = None, limit: int = 50) -> Dict[str, Any]:
+        """获取指定日期范围耗时最长的请求"""
+        try:
+            with self.db_manager.unit_of_work():
+                return self.db_manager.get_slow_requests(start_date, end_date, kind, name, limit)
+        except Exception as e:
+            logger.error(f"获取最慢请求失败: {e}")
+            raise e
+    
     def get_agent_error_details(self, queryDate: str) -> Dict[str, Any]:
         """获取Agent子系统错误明细数据"""
         try:
-            return self.db_manager.get_agent_error_details(queryDate)
+            with self.db_manager.unit_of_work():
+                return self.db_manager.get_agent_error_details(queryDate)
         except Exception as e:
             logger.error(f"获取Agent错误明细失败: {e}")
             raise e
@@ -129,23 +166,90 @@ class DataService:
     def get_ds_error_details(self, queryDate: str) -> Dict[str, Any]:
         """获取DS子系统错误明细数据"""
         try:
-            return self.db_manager.get_ds_error_details(queryDate)
+            with self.db_manager.unit_of_work():
+                return self.db_manager.get_ds_error_details(queryDate)
         except Exception as e:
             logger.error(f"获取DS错误明细失败: {e}")
             raise e
     
+    def get_error_detail_page(self, queryDate: str, subsystem: str, code: str, error_type: str = None,
+                              cursor: str = None, limit: int = None) -> Dict[str, Any]:
+        """分页获取错误码分组的请求明细"""
+        try:
+            with self.db_manager.unit_of_work():
+                return self.db_manager.get_error_detail_page(queryDate, subsystem, code, error_type, cursor, limit)
+        except Exception as e:
+            logger.error(f"获取错误明细分页失败: {e}")
+            raise e
+    
+    def get_error_signatures(self, queryDate: str, subsystem: str, code: str = None, error_type: str = None,
+                             limit: int = None) -> Dict[str, Any]:
+        """获取错误消息签名"""
+        try:
+            with self.db_manager.unit_of_work():
+                return self.db_manager.get_error_signatures(queryDate, subsystem, code, error_type, limit)
+        except Exception as e:
+            logger.error(f"获取错误签名失败: {e}")
+            raise e
+    
+    def get_error_detail(self, biz_seq: str = None, log_id: int = None, subsystem: str = None) -> Dict[str, Any]:
+        """按id（或biz_seq）获取错误请求的完整内容"""
+        try:
+            with self.db_manager.unit_of_work():
+                return self.db_manager.get_error_detail(biz_seq, log_id, subsystem)
+        except Exception as e:
+            logger.error(f"获取错误请求详情失败: {e}")
+            raise e
+    
+    def get_n_day_retention(self, queryDate: str, days: List[int] = None) -> Dict[str, Any]:
+        """获取N日留存率"""
+        try:
+            with self.db_manager.unit_of_work():
+                return self.db_manager.get_n_day_retention(queryDate, days)
+        except Exception as e:
+            logger.error(f"获取N日留存率失败: {e}")
+            raise e
+    
+    def get_retention_matrix(self, start_date: str = None, end_date: str = None, max_offset: int = 30) -> Dict[str, Any]:
+        """获取同期群留存矩阵"""
+        try:
+            with self.db_manager.unit_of_work():
+                return self.db_manager.get_retention_matrix(start_date, end_date, max_offset)
+        except Exception as e:
+            logger.error(f"获取留存矩阵失败: {e}")
+            raise e
+    
     def get_user_retention_stats(self, queryDate: str) -> Dict[str, Any]:
         """获取用户留存率统计"""
         try:
-            return self.db_manager.get_user_retention_stats(queryDate)
+            with self.db_manager.unit_of_work():
+                return self.db_manager.get_user_retention_stats(queryDate)
         except Exception as e:
             logger.error(f"获取用户留存率统计失败: {e}")
             raise e
     
-    def get_churned_users(self, queryDate: str) -> Dict[str, Any]:
+    def get_distinct_users(self, start_date: str = None, end_date: str = None) -> Dict[str, Any]:
+        """获取日期范围内的去重用户数"""
+        try:
+            with self.db_manager.unit_of_work():
+                return self.db_manager.get_distinct_users(start_date, end_date)
+        except Exception as e:
+            logger.error(f"获取去重用户数失败: {e}")
+            raise e
+    
+    def get_churned_users(self, queryDate: str, days: List[int] = None) -> Dict[str, Any]:
         """获取流失用户列表"""
         try:
-            return self.db_manager.get_churned_users(queryDate)
+            with self.db_manager.unit_of_work():
+                return self.db_manager.get_churned_users(queryDate, days)
         except Exception as e:
             logger.error(f"获取流失用户列表失败: {e}")
             raise e
+    
+    def get_db_stats(self) -> Dict[str, Any]:
+        """获取数据库访问统计（SQL执行次数、连接检出次数、语句缓存命中）"""
+        try:
+            return self.db_manager.get_query_stats()
+        except Exception as e:
+            logger.error(f"获取数据库访问统计失败: {e}")
+            raise e
@@ -2,18 +2,148 @@
 # -*- coding: utf-8 -*-
 
 from datetime import datetime, date, timedelta
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Iterator
+from decimal import Decimal
+from contextlib import contextmanager
+from collections import OrderedDict, namedtuple, Counter
+from array import array
+import json
 import logging
+import threading
+import time
 from sqlalchemy import text
-from db_session import get_db_session
+from db_session import engine, get_db_session, get_pool_stats
+from error_rules import classify_error_code, build_class_counts_sql
+from today_aggregator import today_aggregator, HIVE_EXCLUDED_STEPS
+from range_engine import RangeEngine, resolve_date_range, iter_days
+from latency_sketch import DDSketch
+from scenario_rules import classify_scenarios, build_scenario_stats
+from request_labels import decode_scenarios
+from project_members import PROJECT_MEMBERS, member_dimension
+from activity_bitmap import UserBitmap, UserIndex, retention_rate
+from hll_sketch import HyperLogLog, add_user_rows
+from biz_classification import PERFORMANCE_CATEGORIES, get_day_classification, get_day_biz_costs, match_categories
+from slow_requests import TopK, slow_request_config
+from error_details import (
+    AGENT_BUSINESS_ERROR_TYPES, AGENT_SYSTEM_ERROR_TYPES, DS_BUSINESS_ERROR_CODES, DS_OTHER_ERROR_CODE,
+    SUBSYSTEM_CONDITIONS, error_detail_config, group_condition, in_group, encode_cursor, decode_cursor, preview
+)
+from error_signatures import SignatureCounter, group_by_result_code
+from cost_summary import DEFAULT_PERCENTILES, normalize_percentiles, percentile_key, summarize_costs, round_percentiles
 
 # 配置日志
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# SQL执行统计（所有DatabaseManager实例共享），与db_session.pool_stats对比可得出连接复用效果
+_query_stats_lock = threading.Lock()
+query_stats = {
+    'statements': 0,
+    'units_of_work': 0
+}
+
+def _increase_query_stat(key: str, value: int = 1):
+    """累加SQL执行统计"""
+    with _query_stats_lock:
+        query_stats[key] += value
+
+# 编译后的语句缓存：原始SQL -> (TextClause, 命名参数列表)，按LRU淘汰
+STATEMENT_CACHE_SIZE = 512
+_statement_cache = OrderedDict()
+_statement_cache_lock = threading.Lock()
+statement_cache_stats = {
+    'hits': 0,
+    'misses': 0,
+    'evictions': 0
+}
+
+def get_statement_cache_stats() -> Dict[str, Any]:
+    """获取语句缓存统计信息"""
+    with _statement_cache_lock:
+        stats = dict(statement_cache_stats)
+        stats['size'] = len(_statement_cache)
+    stats['max_size'] = STATEMENT_CACHE_SIZE
+    total = stats['hits'] + stats['misses']
+    stats['hit_rate'] = round(stats['hits'] * 100.0 / total, 2) if total > 0 else 0
+    return stats
+
+# MySQL列类型码（PyMySQL FIELD_TYPE）：DECIMAL/NEWDECIMAL需要转换为float，其余整数和浮点类型可直接转为数组
+DECIMAL_TYPE_CODES = {0, 246}
+NUMERIC_TYPE_CODES = {0, 1, 2, 3, 4, 5, 8, 9, 246}
+
+def _extend_column(column, values, numeric: bool):
+    """把一批列值追加到列数据中，数值列整批转换为float"""
+    if not numeric:
+        column.extend(values)
+        return column
+    if isinstance(column, array):
+        try:
+            column.extend(array('d', map(float, values)))
+            return column
+        except TypeError:
+            # 出现NULL，退化为float/None列表
+            column = column.tolist()
+    column.extend(float(v) if v is not None else None for v in values)
+    return column
+
+# 按错误分类维度分组计数的SQL（CASE表达式由error_rules中的规则生成）
+ERROR_CLASS_COUNTS_SQL = build_class_counts_sql(['outcome', 'error_class', 'subsystem_class'])
+
+# 每日错误分类统计缓存：queryDate -> (过期时间, [分类计数行])
+# 当天数据仍在增长，只缓存很短时间；历史日期数据不再变化，缓存时间更长
+ERROR_CLASS_CACHE_TODAY_TTL = 30
+ERROR_CLASS_CACHE_HISTORY_TTL = 600
+ERROR_CLASS_CACHE_SIZE = 64
+_error_class_cache = OrderedDict()
+_error_class_cache_lock = threading.Lock()
+
+def _get_cached_error_class_counts(queryDate: str) -> Optional[List[Dict[str, Any]]]:
+    """读取未过期的错误分类统计缓存"""
+    with _error_class_cache_lock:
+        cached = _error_class_cache.get(queryDate)
+        if cached is None:
+            return None
+        expires_at, class_counts = cached
+        if expires_at < time.monotonic():
+            del _error_class_cache[queryDate]
+            return None
+        return class_counts
+
+def _set_cached_error_class_counts(queryDate: str, date_obj: date, class_counts: List[Dict[str, Any]]):
+    """写入错误分类统计缓存"""
+    ttl = ERROR_CLASS_CACHE_HISTORY_TTL if date_obj < date.today() else ERROR_CLASS_CACHE_TODAY_TTL
+    with _error_class_cache_lock:
+        _error_class_cache[queryDate] = (time.monotonic() + ttl, class_counts)
+        _error_class_cache.move_to_end(queryDate)
+        while len(_error_class_cache) > ERROR_CLASS_CACHE_SIZE:
+            _error_class_cache.popitem(last=False)
+
+# 耗时草图的类型：环节 / 模板查询类别 / 非模板查询类别
+LATENCY_SKETCH_KINDS = ('step', 'template', 'non_template')
+
+# 已生成每日汇总的日期（汇总只会新增或覆盖，不会删除，因此只缓存命中结果）
+_rolled_up_dates = set()
+
+# 留存天数、同期群范围的上限
+MAX_RETENTION_DAYS = 90
+
+# 去重用户数日期范围的上限
+MAX_DISTINCT_USER_DAYS = 366
+
+# 最慢请求日期范围的上限
+MAX_SLOW_REQUEST_DAYS = 90
+
+# 已完成请求标签的日期：queryDate -> 过期时间
+# label_job.py backfill --force会先删除该日期的标签和完成状态再重新生成，缓存时间较短，
+# 过期后重新读取完成状态，重新生成期间改为统计原始日志
+LABELLED_CACHE_TTL = 60
+_labelled_dates = {}
+
 class DatabaseManager:
     def __init__(self):
         # 使用SQLAlchemy session，不再需要连接参数
+        # 工作单元中绑定的连接按线程保存，同一实例可被线程池中的多个线程同时使用
+        self._local = threading.local()
         
         # 错误码映射
         self.agent_error_codes = {
@@ -38,6 +168,8 @@ class DatabaseManager:
             '3001': 'AOMP返回结果为空！'
         }
         
+        self.project_members = PROJECT_MEMBERS
+        
         self.step_name_mapping = {
             'INFO_EXTRACTION_LLM': '信息提取',
             'SQL_EXTRACTION_LLM': '字段提取',
@@ -55,74 +187,331 @@ class DatabaseManager:
             'XQ_DIFY': 'XQ_DIFY渠道'
         }
 
+    def _compile_statement(self, sql: str, param_count: int):
+        """将SQL中前param_count个%s占位符改写为:param_i命名参数，并构建text()语句"""
+        parts = sql.split('%s', param_count)
+        param_names = tuple(f'param_{i}' for i in range(len(parts) - 1))
+        modified_sql = parts[0]
+        for name, part in zip(param_names, parts[1:]):
+            modified_sql += f':{name}' + part
+        return text(modified_sql), param_names
+
+    def _prepare_statement(self, sql: str, params: tuple = ()):
+        """将%s占位符的SQL转换为SQLAlchemy的text()语句和命名参数字典（带编译缓存）"""
+        # 在SQLAlchemy 2.0.40中，需要将位置参数转换为字典形式
+        cache_key = (sql, len(params))
+        with _statement_cache_lock:
+            cached = _statement_cache.get(cache_key)
+            if cached is not None:
+                _statement_cache.move_to_end(cache_key)
+                statement_cache_stats['hits'] += 1
+        if cached is None:
+            cached = self._compile_statement(sql, len(params))
+            with _statement_cache_lock:
+                statement_cache_stats['misses'] += 1
+                _statement_cache[cache_key] = cached
+                if len(_statement_cache) > STATEMENT_CACHE_SIZE:
+                    _statement_cache.popitem(last=False)
+                    statement_cache_stats['evictions'] += 1
+        statement, param_names = cached
+        return statement, dict(zip(param_names, params))
+
+    def _format_row(self, columns, row) -> Dict[str, Any]:
+        """将一行结果转换为字典，并把Decimal类型转换为float"""
+        formatted_row = {}
+        for col, val in zip(columns, row):
+            if isinstance(val, Decimal):
+                formatted_row[col] = float(val)
+            else:
+                formatted_row[col] = val
+        return formatted_row
+
+    def _format_rows(self, result) -> List[Dict[str, Any]]:
+        """将查询结果转换为字典列表，并把Decimal类型转换为float"""
+        columns = result.keys()
+        rows = result.fetchall()
+        return [self._format_row(columns, row) for row in rows]
+
+    def _get_bound_connection(self):
+        """获取当前线程工作单元中绑定的连接"""
+        return getattr(self._local, 'connection', None)
+
+    @contextmanager
+    def unit_of_work(self):
+        """
+        工作单元：在with块内执行的所有语句复用同一个数据库连接
+
+        整个工作单元只从连接池检出一次连接（只有一次pre_ping往返），
+        结束后归还连接；嵌套使用时复用外层已绑定的连接
+        """
+        if self._get_bound_connection() is not None:
+            yield self
+            return
+
+        connection = engine.connect()
+        self._local.connection = connection
+        self._local.statements = 0
+        _increase_query_stat('units_of_work')
+        try:
+            yield self
+        finally:
+            statements = self._local.statements
+            self._local.connection = None
+            connection.close()
+            logger.debug(f"工作单元结束：执行SQL {statements} 条，连接检出 1 次")
+
+    def get_query_stats(self) -> Dict[str, Any]:
+        """获取SQL执行次数与连接检出次数统计"""
+        with _query_stats_lock:
+            stats = dict(query_stats)
+        pool_stats = get_pool_stats()
+        stats['connection_checkouts'] = pool_stats['checkouts']
+        stats['pool_status'] = pool_stats['pool_status']
+        # 每次检出连接平均执行的SQL条数，越大说明连接复用越充分
+        stats['statements_per_checkout'] = round(
+            stats['statements'] / stats['connection_checkouts'], 2
+        ) if stats['connection_checkouts'] > 0 else 0
+        stats['statement_cache'] = get_statement_cache_stats()
+        return stats
+
+    def _count_statement(self):
+        """累加SQL执行次数（全局统计和当前工作单元统计）"""
+        _increase_query_stat('statements')
+        if getattr(self._local, 'connection', None) is not None:
+            self._local.statements += 1
+
     def execute_query(self, sql: str, params: tuple = ()) -> List[Dict[str, Any]]:
         """执行查询"""
+        statement, param_dict = self._prepare_statement(sql, params)
+        self._count_statement()
+        # 已绑定连接时直接在该连接上执行，不再为每条语句创建session和检出连接
+        connection = self._get_bound_connection()
+        if connection is not None:
+            try:
+                result = connection.execute(statement, param_dict)
+                return self._format_rows(result)
+            except Exception as e:
+                logger.error(f"查询执行失败: {e}")
+                raise e
+
         session = get_db_session()
         try:
             # 使用SQLAlchemy的text()函数执行原生SQL
-            # 在SQLAlchemy 2.0.40中，需要将位置参数转换为字典形式
-            if params:
-                # 将位置参数转换为字典形式，使用参数索引作为键
-                param_dict = {f'param_{i}': param for i, param in enumerate(params)}
-                # 将SQL中的%s替换为命名参数
-                modified_sql = sql
-                for i in range(len(params)):
-                    modified_sql = modified_sql.replace('%s', f':param_{i}', 1)
-                result = session.execute(text(modified_sql), param_dict)
-            else:
-                result = session.execute(text(sql))
-            # 将结果转换为字典列表
-            columns = result.keys()
-            rows = result.fetchall()
-            # 处理Decimal类型的数据转换为float
-            from decimal import Decimal
-            formatted_rows = []
-            for row in rows:
-                formatted_row = {}
-                for col, val in zip(columns, row):
-                    if isinstance(val, Decimal):
-                        formatted_row[col] = float(val)
-                    else:
-                        formatted_row[col] = val
-                formatted_rows.append(formatted_row)
-            return formatted_rows
+            result = session.execute(statement, param_dict)
+            return self._format_rows(result)
         except Exception as e:
             logger.error(f"查询执行失败: {e}")
             raise e
         finally:
             session.close()
 
+    def _iter_partitions(self, sql: str, params: tuple = (), batch_size: int = 1000):
+        """使用服务端游标逐批读取原始结果行，返回(列名, 列类型码, 行批次)"""
+        statement, param_dict = self._prepare_statement(sql, params)
+        self._count_statement()
+        connection = self._get_bound_connection()
+        own_connection = connection is None
+        if own_connection:
+            connection = engine.connect()
+        result = None
+        try:
+            result = connection.execute(
+                statement,
+                param_dict,
+                execution_options={'stream_results': True, 'yield_per': batch_size}
+            )
+            columns = list(result.keys())
+            type_codes = [desc[1] for desc in result.cursor.description]
+            for rows in result.partitions(batch_size):
+                yield columns, type_codes, rows
+        finally:
+            # 提前结束迭代时也要关闭游标，避免连接上残留未读取的结果
+            if result is not None:
+                result.close()
+            if own_connection:
+                connection.close()
+
+    def execute_query_stream(self, sql: str, params: tuple = (), batch_size: int = 1000) -> Iterator[List[Dict[str, Any]]]:
+        """
+        流式执行查询，按批返回字典行
+
+        使用服务端游标（PyMySQL的SSCursor）逐批读取结果，内存中只保留当前批次的数据，
+        适用于明细、耗时等结果集很大的查询。
+        注意：在结果读取完之前，同一连接上不能执行其他语句
+        """
+        try:
+            for columns, _, rows in self._iter_partitions(sql, params, batch_size):
+                yield [self._format_row(columns, row) for row in rows]
+        except Exception as e:
+            logger.error(f"流式查询执行失败: {e}")
+            raise e
+
+    def execute_query_rows(self, sql: str, params: tuple = ()) -> List[Any]:
+        """
+        执行查询，返回轻量的命名元组行（支持row.列名访问）
+
+        不为每行创建字典；只有DECIMAL列需要转换时才逐行重建，且只转换这些列
+        """
+        try:
+            rows = []
+            decimal_indexes = None
+            record_type = None
+            for columns, type_codes, batch in self._iter_partitions(sql, params, 5000):
+                if decimal_indexes is None:
+                    decimal_indexes = [i for i, code in enumerate(type_codes) if code in DECIMAL_TYPE_CODES]
+                    if decimal_indexes:
+                        record_type = namedtuple('Record', columns, rename=True)
+                if not decimal_indexes:
+                    rows.extend(batch)
+                    continue
+                for row in batch:
+                    values = list(row)
+                    for i in decimal_indexes:
+                        if values[i] is not None:
+                            values[i] = float(values[i])
+                    rows.append(record_type(*values))
+            return rows
+        except Exception as e:
+            logger.error(f"查询执行失败: {e}")
+            raise e
+
+    def execute_query_columns(self, sql: str, params: tuple = (), batch_size: int = 5000) -> Dict[str, Any]:
+        """
+        列式执行查询，返回 {列名: 列数据}
+
+        按列类型一次性转换：数值列为array('d')（列中含NULL时为float/None列表），其他列为list。
+        结果通过服务端游标分批读取，内存中只保留紧凑的列数据
+        """
+        try:
+            columns = []
+            numeric_flags = []
+            data = []
+            for batch_columns, type_codes, rows in self._iter_partitions(sql, params, batch_size):
+                if not columns:
+                    columns = batch_columns
+                    numeric_flags = [code in NUMERIC_TYPE_CODES for code in type_codes]
+                    data = [array('d') if numeric else [] for numeric in numeric_flags]
+                for i, values in enumerate(zip(*rows)):
+                    data[i] = _extend_column(data[i], values, numeric_flags[i])
+            return {col: data[i] for i, col in enumerate(columns)}
+        except Exception as e:
+            logger.error(f"列式查询执行失败: {e}")
+            raise e
+
     def _classify_error_code(self, result_code: str) -> str:
         """
-        分类错误码为业务错误或系统错误
-        返回: 'business' 或 'system'
+        分类错误码为业务错误或系统错误（规则定义见error_rules.ERROR_CODE_RULES）
+        返回: 'success'、'business' 或 'system'
+        """
+        return classify_error_code('error_class', result_code)
+
+    def get_error_class_counts(self, queryDate: str) -> List[Dict[str, Any]]:
+        """
+        获取指定日期按错误分类分组的请求数
+
+        综合统计卡片的所有指标都由这一结果推导：当天使用增量聚合结果，已汇总的历史日期读取汇总表，
+        否则扫描一次原始日志。结果按日期短暂缓存，模板/非模板统计等接口在缓存有效期内共享
+        """
+        today_counts = self._get_today_stats(queryDate, 'error_class_counts')
+        if today_counts is not None:
+            return today_counts
+        cached = _get_cached_error_class_counts(queryDate)
+        if cached is not None:
+            return cached
+        
+        if self.is_rolled_up(queryDate):
+            class_counts = self.execute_query("""
+                SELECT outcome, error_class, subsystem_class, count 
+                FROM t_daily_error_class_rollup 
+                WHERE stat_date = %s
+            """, (queryDate,))
+        else:
+            class_counts = self.compute_error_class_counts(queryDate)
+        date_obj = datetime.strptime(queryDate, '%Y-%m-%d').date()
+        _set_cached_error_class_counts(queryDate, date_obj, class_counts)
+        return class_counts
+
+    def compute_error_class_counts(self, queryDate: str) -> List[Dict[str, Any]]:
+        """
+        扫描原始日志，获取指定日期按错误分类分组的请求数（一次扫描）
+        分类在数据库中通过error_rules生成的CASE表达式完成，只返回各分类组合的计数
         """
-        if not result_code or result_code == '0000':
-            return 'success'
+        date_obj = datetime.strptime(queryDate, '%Y-%m-%d').date()
+        next_date = date_obj + timedelta(days=1)
+        return self.execute_query(
+            ERROR_CLASS_COUNTS_SQL, (queryDate, next_date.strftime('%Y-%m-%d'))
+        )
+
+    def _build_daily_query_stats(self, queryDate: str, class_counts: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        根据各错误分类的请求数计算综合统计的全部指标
+        判断规则与原逐项SQL一致：
+        - 成功：result_code LIKE '%0000%'
+        - 错误：result_code NOT LIKE '%0000%'（result_code为NULL时只计入总数和失败数）
+        - agent子系统错误：错误中result_code LIKE 'B2DU%'，其余为ds子系统错误
+        """
+        total_count = 0
+        success_count = 0
+        error_counts = {
+            'business': 0,
+            'system': 0,
+            'agent_business': 0,
+            'agent_system': 0,
+            'ds_business': 0,
+            'ds_system': 0
+        }
         
-        # 2.2.1 检查code是否为8位
-        if len(result_code) != 8:
-            return 'system'
+        for row in class_counts:
+            count = row['count']
+            total_count += count
+            if row['outcome'] == 'success':
+                success_count += count
+            if row['outcome'] != 'error':
+                continue
+            # 业务错误和系统错误（error_class为success的空码不计入）
+            if row['error_class'] in error_counts:
+                error_counts[row['error_class']] += count
+            # agent/ds子系统的业务错误和系统错误
+            error_counts[row['subsystem_class']] += count
         
-        # 2.2.2 如果code前4位为B2DU
-        if result_code[:4] == 'B2DU':
-            # 读取第7位（索引6）
-            if len(result_code) >= 7:
-                seventh_char = result_code[6]
-                if seventh_char in ['1', '2']:
-                    return 'business'
-            return 'system'
+        business_error_count = error_counts['business']
+        system_error_count = error_counts['system']
+        agent_business_error_count = error_counts['agent_business']
+        agent_system_error_count = error_counts['agent_system']
+        ds_business_error_count = error_counts['ds_business']
+        ds_system_error_count = error_counts['ds_system']
         
-        # 2.2.3 如果code前4位为2030
-        if result_code[:4] == '2030':
-            # 读取后四位
-            last_four = result_code[4:8]
-            if last_four in ['1002', '1003', '1004', '1006', '1007', '1008', '1009']:
-                return 'business'
-            return 'system'
+        def success_rate(error_count: int) -> float:
+            return round((1 - error_count / total_count) * 100, 2) if total_count > 0 else 0
         
-        # 2.2.4 其他情况归为系统错误
-        return 'system'
+        return {
+            # 1. 总体统计
+            'total_count': total_count,
+            'success_count': success_count,
+            'failure_count': total_count - success_count,
+            'success_rate': round(success_count / total_count * 100, 2) if total_count > 0 else 0,
+            # 2. 业务/系统错误统计
+            'business_error_count': business_error_count,
+            'business_success_rate': success_rate(business_error_count),
+            'system_error_count': system_error_count,
+            'system_success_rate': success_rate(system_error_count),
+            # 3. agent子系统统计
+            'agent_business_error_count': agent_business_error_count,
+            'agent_business_success_rate': success_rate(agent_business_error_count),
+            'agent_system_error_count': agent_system_error_count,
+            'agent_system_success_rate': success_rate(agent_system_error_count),
+            # 4. ds子系统统计
+            'ds_business_error_count': ds_business_error_count,
+            'ds_business_success_rate': success_rate(ds_business_error_count),
+            'ds_system_error_count': ds_system_error_count,
+            'ds_system_success_rate': success_rate(ds_system_error_count),
+            'queryDate': queryDate
+        }
+
+    def _get_daily_query_stats_fields(self, queryDate: str, fields: List[str]) -> Dict[str, Any]:
+        """从综合统计中取出指定字段"""
+        stats = self._build_daily_query_stats(queryDate, self.get_error_class_counts(queryDate))
+        return {field: stats[field] for field in fields + ['queryDate']}
 
     def get_overall_query_stats(self, queryDate: str) -> Dict[str, Any]:
         """
@@ -130,38 +519,9 @@ class DatabaseManager:
         包括：总查询数、总成功数、总失败数、成功率
         """
         try:
-            date_obj = datetime.strptime(queryDate, '%Y-%m-%d').date()
-            next_date = date_obj + timedelta(days=1)
-            
-            # 1.1 总查询数
-            total_sql = """
-                SELECT COUNT(1) as count FROM t_handler_logs 
-                WHERE create_time >= %s AND create_time < %s
-            """
-            total_result = self.execute_query(total_sql, (queryDate, next_date.strftime('%Y-%m-%d')))
-            total_count = total_result[0]['count'] if total_result else 0
-            
-            # 1.2 总成功数
-            success_sql = """
-                SELECT COUNT(1) as count FROM t_handler_logs 
-                WHERE create_time >= %s AND create_time < %s AND result_code LIKE %s
-            """
-            success_result = self.execute_query(success_sql, (queryDate, next_date.strftime('%Y-%m-%d'), '%0000%'))
-            success_count = success_result[0]['count'] if success_result else 0
-            
-            # 1.3 总失败数
-            failure_count = total_count - success_count
-            
-            # 成功率
-            success_rate = (success_count / total_count * 100) if total_count > 0 else 0
-            
-            return {
-                'total_count': total_count,
-                'success_count': success_count,
-                'failure_count': failure_count,
-                'success_rate': round(success_rate, 2),
-                'queryDate': queryDate
-            }
+            return self._get_daily_query_stats_fields(
+                queryDate, ['total_count', 'success_count', 'failure_count', 'success_rate']
+            )
         except Exception as e:
             logger.error(f"获取总体查询统计数据失败: {e}")
             raise e
@@ -172,50 +532,10 @@ class DatabaseManager:
         包括：业务错误数量、业务成功率、系统错误数量、系统成功率
         """
         try:
-            date_obj = datetime.strptime(queryDate, '%Y-%m-%d').date()
-            next_date = date_obj + timedelta(days=1)
-            
-            # 获取总查询数
-            total_sql = """
-                SELECT COUNT(1) as count FROM t_handler_logs 
-                WHERE create_time >= %s AND create_time < %s
-            """
-            total_result = self.execute_query(total_sql, (queryDate, next_date.strftime('%Y-%m-%d')))
-            total_count = total_result[0]['count'] if total_result else 0
-            
-            # 2.1 查出所有错误的code
-            error_codes_sql = """
-                SELECT result_code FROM t_handler_logs 
-                WHERE create_time >= %s AND create_time < %s AND result_code NOT LIKE %s
-            """
-            error_codes_result = self.execute_query(error_codes_sql, (queryDate, next_date.strftime('%Y-%m-%d'), '%0000%'))
-            
-            # 2.2 分类统计业务错误和系统错误
-            business_error_count = 0
-            system_error_count = 0
-            
-            for row in error_codes_result:
-                result_code = row['result_code']
-                error_type = self._classify_error_code(result_code)
-                if error_type == 'business':
-                    business_error_count += 1
-                elif error_type == 'system':
-                    system_error_count += 1
-            
-            # 2.3 计算业务成功率
-            business_success_rate = (1 - business_error_count / total_count) * 100 if total_count > 0 else 0
-            
-            # 2.4 计算系统成功率
-            system_success_rate = (1 - system_error_count / total_count) * 100 if total_count > 0 else 0
-            
-            return {
-                'business_error_count': business_error_count,
-                'business_success_rate': round(business_success_rate, 2),
-                'system_error_count': system_error_count,
-                'system_success_rate': round(system_success_rate, 2),
-                'total_count': total_count,
-                'queryDate': queryDate
-            }
+            return self._get_daily_query_stats_fields(
+                queryDate, ['business_error_count', 'business_success_rate',
+                            'system_error_count', 'system_success_rate', 'total_count']
+            )
         except Exception as e:
             logger.error(f"获取业务系统错误统计失败: {e}")
             raise e
@@ -226,58 +546,10 @@ class DatabaseManager:
         包括：agent业务错误数量、业务成功率、系统错误数量、系统成功率
         """
         try:
-            date_obj = datetime.strptime(queryDate, '%Y-%m-%d').date()
-            next_date = date_obj + timedelta(days=1)
-            
-            # 获取总查询数
-            total_sql = """
-                SELECT COUNT(1) as count FROM t_handler_logs 
-                WHERE create_time >= %s AND create_time < %s
-            """
-            total_result = self.execute_query(total_sql, (queryDate, next_date.strftime('%Y-%m-%d')))
-            total_count = total_result[0]['count'] if total_result else 0
-            
-            # 3.1 查找agent子系统所有错误的code
-            agent_error_codes_sql = """
-                SELECT result_code FROM t_handler_logs 
-                WHERE create_time >= %s AND create_time < %s 
-                AND result_code NOT LIKE %s AND result_code LIKE %s
-            """
-            agent_error_codes_result = self.execute_query(
-                agent_error_codes_sql, 
-                (queryDate, next_date.strftime('%Y-%m-%d'), '%0000%', 'B2DU%')
+            return self._get_daily_query_stats_fields(
+                queryDate, ['agent_business_error_count', 'agent_business_success_rate',
+                            'agent_system_error_count', 'agent_system_success_rate', 'total_count']
             )
-            
-            # 3.2 分类统计agent子系统的业务错误和系统错误
-            agent_business_error_count = 0
-            agent_system_error_count = 0
-            
-            for row in agent_error_codes_result:
-                result_code = row['result_code']
-                # 读取第7位（索引6）
-                if len(result_code) >= 7:
-                    seventh_char = result_code[6]
-                    if seventh_char in ['1', '2']:
-                        agent_business_error_count += 1
-                    else:
-                        agent_system_error_count += 1
-                else:
-                    agent_system_error_count += 1
-            
-            # 3.3 计算agent子系统业务成功率
-            agent_business_success_rate = (1 - agent_business_error_count / total_count) * 100 if total_count > 0 else 0
-            
-            # 3.4 计算agent子系统系统成功率
-            agent_system_success_rate = (1 - agent_system_error_count / total_count) * 100 if total_count > 0 else 0
-            
-            return {
-                'agent_business_error_count': agent_business_error_count,
-                'agent_business_success_rate': round(agent_business_success_rate, 2),
-                'agent_system_error_count': agent_system_error_count,
-                'agent_system_success_rate': round(agent_system_success_rate, 2),
-                'total_count': total_count,
-                'queryDate': queryDate
-            }
         except Exception as e:
             logger.error(f"获取agent子系统错误统计失败: {e}")
             raise e
@@ -288,59 +560,10 @@ class DatabaseManager:
         包括：ds业务错误数量、业务成功率、系统错误数量、系统成功率
         """
         try:
-            date_obj = datetime.strptime(queryDate, '%Y-%m-%d').date()
-            next_date = date_obj + timedelta(days=1)
-            
-            # 获取总查询数
-            total_sql = """
-                SELECT COUNT(1) as count FROM t_handler_logs 
-                WHERE create_time >= %s AND create_time < %s
-            """
-            total_result = self.execute_query(total_sql, (queryDate, next_date.strftime('%Y-%m-%d')))
-            total_count = total_result[0]['count'] if total_result else 0
-            
-            # 4.1 查找ds子系统所有错误的code
-            ds_error_codes_sql = """
-                SELECT result_code FROM t_handler_logs 
-                WHERE create_time >= %s AND create_time < %s 
-                AND result_code NOT LIKE %s AND result_code NOT LIKE %s
-            """
-            ds_error_codes_result = self.execute_query(
-                ds_error_codes_sql, 
-                (queryDate, next_date.strftime('%Y-%m-%d'), '%0000%', 'B2DU%')
+            return self._get_daily_query_stats_fields(
+                queryDate, ['ds_business_error_count', 'ds_business_success_rate',
+                            'ds_system_error_count', 'ds_system_success_rate', 'total_count']
             )
-            
-            # 4.2 分类统计ds子系统的业务错误和系统错误
-            ds_business_error_count = 0
-            ds_system_error_count = 0
-            
-            for row in ds_error_codes_result:
-                result_code = row['result_code']
-                # 4.2 如果code前4位为2030
-                if len(result_code) >= 8 and result_code[:4] == '2030':
-                    last_four = result_code[4:8]
-                    if last_four in ['1002', '1003', '1004', '1006', '1007', '1008', '1009']:
-                        ds_business_error_count += 1
-                    else:
-                        ds_system_error_count += 1
-                else:
-                    # 4.3 如果code前4位不为2030，统一认为系统错误
-                    ds_system_error_count += 1
-            
-            # 4.4 计算ds子系统业务成功率
-            ds_business_success_rate = (1 - ds_business_error_count / total_count) * 100 if total_count > 0 else 0
-            
-            # 4.5 计算ds子系统系统成功率
-            ds_system_success_rate = (1 - ds_system_error_count / total_count) * 100 if total_count > 0 else 0
-            
-            return {
-                'ds_business_error_count': ds_business_error_count,
-                'ds_business_success_rate': round(ds_business_success_rate, 2),
-                'ds_system_error_count': ds_system_error_count,
-                'ds_system_success_rate': round(ds_system_success_rate, 2),
-                'total_count': total_count,
-                'queryDate': queryDate
-            }
         except Exception as e:
             logger.error(f"获取ds子系统错误统计失败: {e}")
             raise e
@@ -348,28 +571,10 @@ class DatabaseManager:
     def get_template_query_stats(self, queryDate: str) -> Dict[str, Any]:
         """
         获取综合查询统计数据（替换原来的模板查询统计）
-        整合所有维度的统计数据
+        整合所有维度的统计数据，所有指标来自同一次按错误分类分组的扫描
         """
         try:
-            # 1. 总体统计
-            overall_stats = self.get_overall_query_stats(queryDate)
-            
-            # 2. 业务/系统错误统计
-            business_system_stats = self.get_business_system_error_stats(queryDate)
-            
-            # 3. agent子系统统计
-            agent_stats = self.get_agent_subsystem_error_stats(queryDate)
-            
-            # 4. ds子系统统计
-            ds_stats = self.get_ds_subsystem_error_stats(queryDate)
-            
-            # 整合所有统计数据
-            return {
-                **overall_stats,
-                **business_system_stats,
-                **agent_stats,
-                **ds_stats
-            }
+            return self._build_daily_query_stats(queryDate, self.get_error_class_counts(queryDate))
         except Exception as e:
             logger.error(f"获取综合查询统计数据失败: {e}")
             raise e
@@ -377,489 +582,376 @@ class DatabaseManager:
     def get_non_template_query_stats(self, queryDate: str) -> Dict[str, Any]:
         """
         保留此方法以兼容现有API，返回与template_query_stats相同的数据
+        （与template_query_stats共享按日期缓存的错误分类统计）
         """
         return self.get_template_query_stats(queryDate)
 
-    def _calculate_p90(self, costs: List[float]) -> float:
-        """计算P90值 - 使用线性插值方法"""
-        if not costs:
-            return 0
-        if len(costs) == 1:
-            return costs[0]
-        
-        sorted_costs = sorted(costs)
-        n = len(sorted_costs)
-        
-        # P90的位置：0.9 * (n - 1)，这样P100就是最后一个元素
-        position = 0.9 * (n - 1)
-        lower_index = int(position)
-        upper_index = min(lower_index + 1, n - 1)
-        
-        # 如果position是整数，直接返回该位置的值
-        if position == lower_index:
-            return sorted_costs[lower_index]
-        
-        # 否则进行线性插值
-        weight = position - lower_index
-        return sorted_costs[lower_index] * (1 - weight) + sorted_costs[upper_index] * weight
-    
-    def get_template_query_performance(self, queryDate: str) -> List[Dict[str, Any]]:
-        """获取模板查询性能统计"""
+    def is_rolled_up(self, queryDate: str) -> bool:
+        """判断日期是否已生成每日汇总（只有已结束的日期才会汇总）"""
+        if queryDate in _rolled_up_dates:
+            return True
+        date_obj = datetime.strptime(queryDate, '%Y-%m-%d').date()
+        if date_obj >= date.today():
+            return False
         try:
-            date_obj = datetime.strptime(queryDate, '%Y-%m-%d').date()
-            next_date = date_obj.replace(day=date_obj.day + 1) if date_obj.day < 28 else date_obj.replace(month=date_obj.month + 1, day=1)
-            
-            performance_queries = [
-                {
-                    'category': 'TDSQL-准生产环境',
-                    'db_type': 'TDSQL',
-                    'environment': '准生产环境',
-                    'sql': """
-                        SELECT AVG(cost) as avg_cost, MAX(cost) as max_cost FROM (
-                            SELECT biz_seq, SUM(cost) as cost FROM t_step_time_record 
-                            WHERE create_time >= %s AND create_time < %s 
-                            AND sub_step_name != 'REQ_DS' 
-                            AND biz_seq IN (
-                                SELECT biz_seq FROM t_handler_logs 
-                                WHERE create_time >= %s AND create_time < %s 
-                                AND req_info LIKE %s AND req_info LIKE %s
-                            ) 
-                            AND biz_seq NOT IN (
-                                SELECT DISTINCT biz_seq FROM req_aomp_log 
-                                WHERE create_time >= %s AND create_time < %s 
-                                AND biz_seq IS NOT NULL
-                            ) 
-                            GROUP BY biz_seq
-                        ) temp
-                    """,
-                    'params': (queryDate, next_date.strftime('%Y-%m-%d'), queryDate, next_date.strftime('%Y-%m-%d'), '%TDSQL%', '%###%', queryDate, next_date.strftime('%Y-%m-%d'))
-                },
-                {
-                    'category': 'TDSQL-生产环境',
-                    'db_type': 'TDSQL',
-                    'environment': '生产环境',
-                    'sql': """
-                        SELECT AVG(cost) as avg_cost, MAX(cost) as max_cost FROM (
-                            SELECT biz_seq, SUM(cost) as cost FROM t_step_time_record 
-                            WHERE create_time >= %s AND create_time < %s 
-                            AND sub_step_name != 'REQ_DS' 
-                            AND biz_seq IN (
-                                SELECT biz_seq FROM t_handler_logs 
-                                WHERE create_time >= %s AND create_time < %s 
-                                AND req_info LIKE %s AND req_info LIKE %s
-                            ) 
-                            AND biz_seq IN (
-                                SELECT DISTINCT biz_seq FROM req_aomp_log 
-                                WHERE create_time >= %s AND create_time < %s 
-                                AND biz_seq IS NOT NULL
-                            ) 
-                            GROUP BY biz_seq
-                        ) temp
-                    """,
-                    'params': (queryDate, next_date.strftime('%Y-%m-%d'), queryDate, next_date.strftime('%Y-%m-%d'), '%TDSQL%', '%###%', queryDate, next_date.strftime('%Y-%m-%d'))
-                },
-                {
-                    'category': 'TIDB-准生产环境',
-                    'db_type': 'TIDB',
-                    'environment': '准生产环境',
-                    'sql': """
-                        SELECT AVG(cost) as avg_cost, MAX(cost) as max_cost FROM (
-                            SELECT biz_seq, SUM(cost) as cost FROM t_step_time_record 
-                            WHERE create_time >= %s AND create_time < %s 
-                            AND sub_step_name != 'REQ_DS' 
-                            AND biz_seq IN (
-                                SELECT biz_seq FROM t_handler_logs 
-                                WHERE create_time >= %s AND create_time < %s 
-                                AND req_info LIKE %s AND req_info LIKE %s
-                            ) 
-                            AND biz_seq NOT IN (
-                                SELECT DISTINCT biz_seq FROM req_aomp_log 
-                                WHERE create_time >= %s AND create_time < %s 
-                                AND biz_seq IS NOT NULL
-                            ) 
-                            GROUP BY biz_seq
-                        ) temp
-                    """,
-                    'params': (queryDate, next_date.strftime('%Y-%m-%d'), queryDate, next_date.strftime('%Y-%m-%d'), '%TIDB%', '%###%', queryDate, next_date.strftime('%Y-%m-%d'))
-                },
-                {
-                    'category': 'TIDB-生产环境',
-                    'db_type': 'TIDB',
-                    'environment': '生产环境',
-                    'sql': """
-                        SELECT AVG(cost) as avg_cost, MAX(cost) as max_cost FROM (
-                            SELECT biz_seq, SUM(cost) as cost FROM t_step_time_record 
-                            WHERE create_time >= %s AND create_time < %s 
-                            AND sub_step_name != 'REQ_DS' 
-                            AND biz_seq IN (
-                                SELECT biz_seq FROM t_handler_logs 
-                                WHERE create_time >= %s AND create_time < %s 
-                                AND req_info LIKE %s AND req_info LIKE %s
-                            ) 
-                            AND biz_seq IN (
-                                SELECT DISTINCT biz_seq FROM req_aomp_log 
-                                WHERE create_time >= %s AND create_time < %s 
-                                AND biz_seq IS NOT NULL
-                            ) 
-                            GROUP BY biz_seq
-                        ) temp
-                    """,
-                    'params': (queryDate, next_date.strftime('%Y-%m-%d'), queryDate, next_date.strftime('%Y-%m-%d'), '%TIDB%', '%###%', queryDate, next_date.strftime('%Y-%m-%d'))
-                },
-                {
-                    'category': 'HIVE-生产环境',
-                    'db_type': 'HIVE',
-                    'environment': '生产环境',
-                    'sql': """
-                        SELECT AVG(cost) as avg_cost, MAX(cost) as max_cost FROM (
-                            SELECT biz_seq, SUM(cost) as cost FROM t_step_time_record 
-                            WHERE create_time >= %s AND create_time < %s 
-                            AND sub_step_name != 'REQ_DS' 
-                            AND biz_seq IN (
-                                SELECT biz_seq FROM t_handler_logs 
-                                WHERE create_time >= %s AND create_time < %s 
-                                AND req_info LIKE %s AND req_info LIKE %s
-                            ) 
-                            GROUP BY biz_seq
-                        ) temp
-                    """,
-                    'params': (queryDate, next_date.strftime('%Y-%m-%d'), queryDate, next_date.strftime('%Y-%m-%d'), '%HIVE%', '%###%')
-                }
-            ]
-            
-            results = []
-            for query_info in performance_queries:
-                # 先获取平均值和最大值
-                result = self.execute_query(query_info['sql'], query_info['params'])
-                if result and result[0]['avg_cost'] is not None:
-                    # 获取所有cost值用于计算P90
-                    all_costs_sql = query_info['sql'].replace(
-                        'SELECT AVG(cost) as avg_cost, MAX(cost) as max_cost',
-                        'SELECT cost'
-                    )
-                    all_costs_result = self.execute_query(all_costs_sql, query_info['params'])
-                    costs = [float(row['cost']) for row in all_costs_result if row.get('cost')]
-                    p90_cost = self._calculate_p90(costs) if costs else 0
-                    
-                    # 获取最大耗时对应的biz_seq
-                    max_cost = result[0]['max_cost']
-                    max_biz_seq_sql = """
-                        SELECT biz_seq FROM (
-                            SELECT biz_seq, SUM(cost) as cost FROM t_step_time_record 
-                            WHERE create_time >= %s AND create_time < %s 
-                            AND sub_step_name != 'REQ_DS' 
-                            GROUP BY biz_seq 
-                            HAVING cost = %s
-                        ) temp LIMIT 1
-                    """
-                    max_biz_seq_result = self.execute_query(max_biz_seq_sql, (queryDate, next_date.strftime('%Y-%m-%d'), max_cost))
-                    max_cost_biz_seq = max_biz_seq_result[0]['biz_seq'] if max_biz_seq_result else None
-                    
-                    results.append({
-                        'category': query_info['category'],
-                        'db_type': query_info['db_type'],
-                        'environment': query_info['environment'],
-                        'avg_cost': round(float(result[0]['avg_cost']), 2),
-                        'max_cost': result[0]['max_cost'],
-                        'p90_cost': round(p90_cost, 2),
-                        'max_cost_biz_seq': max_cost_biz_seq
-                    })
-            
-            return results
+            rows = self.execute_query(
+                "SELECT 1 AS flag FROM t_daily_rollup_status WHERE stat_date = %s", (queryDate,)
+            )
+        except Exception as e:
+            logger.warning(f"读取每日汇总状态失败，使用原始日志统计: {e}")
+            return False
+        if rows:
+            _rolled_up_dates.add(queryDate)
+        return bool(rows)
+
+    def is_labelled(self, queryDate: str) -> bool:
+        """判断日期是否已全部生成请求标签（label_job，只有已结束的日期才会完成）"""
+        expires_at = _labelled_dates.get(queryDate)
+        if expires_at is not None and expires_at >= time.monotonic():
+            return True
+        date_obj = datetime.strptime(queryDate, '%Y-%m-%d').date()
+        if date_obj >= date.today():
+            return False
+        try:
+            rows = self.execute_query(
+                "SELECT 1 AS flag FROM t_request_label_status WHERE stat_date = %s AND completed = 1", (queryDate,)
+            )
+        except Exception as e:
+            logger.warning(f"读取请求标签状态失败，使用原始日志统计: {e}")
+            return False
+        if rows:
+            _labelled_dates[queryDate] = time.monotonic() + LABELLED_CACHE_TTL
+        else:
+            _labelled_dates.pop(queryDate, None)
+        return bool(rows)
+
+    def _get_today_stats(self, queryDate: str, name: str) -> Optional[Any]:
+        """当天的统计使用增量聚合结果，其它日期或聚合结果不可用时返回None"""
+        if not today_aggregator.config.enabled or queryDate != date.today().strftime('%Y-%m-%d'):
+            return None
+        return today_aggregator.get(self, name)
+
+    @staticmethod
+    def _is_default_percentiles(percentiles: Optional[List[float]]) -> bool:
+        """请求的百分位是否都在默认百分位内（增量聚合和每日汇总只保存默认百分位）"""
+        return set(normalize_percentiles(percentiles)) <= set(DEFAULT_PERCENTILES)
+
+    @staticmethod
+    def _select_percentiles(items: List[Dict[str, Any]], percentiles: Optional[List[float]]) -> Optional[List[Dict[str, Any]]]:
+        """只保留请求的百分位；预先计算的结果缺少某个百分位时返回None，由调用方重新计算"""
+        keys = [percentile_key(p) for p in normalize_percentiles(percentiles)]
+        selected = []
+        for item in items:
+            item_percentiles = item.get('percentiles') or {}
+            if any(key not in item_percentiles for key in keys):
+                return None
+            selected.append(dict(item, percentiles={key: item_percentiles[key] for key in keys}))
+        return selected
+
+    def get_template_query_performance(self, queryDate: str, percentiles: List[float] = None,
+            top_k: int = 0) -> List[Dict[str, Any]]:
+        """
+        获取模板查询性能统计（历史日期读取每日汇总）
+        percentiles: 需要的百分位，默认[50, 90, 99]；p90_cost始终返回
+        top_k: 大于0时每个类别额外返回耗时最长的top_k个请求
+        """
+        return self._get_query_performance(queryDate, 'template', percentiles, top_k)
+
+    def get_non_template_query_performance(self, queryDate: str, percentiles: List[float] = None,
+            top_k: int = 0) -> List[Dict[str, Any]]:
+        """
+        获取非模板查询性能统计（历史日期读取每日汇总）
+        percentiles: 需要的百分位，默认[50, 90, 99]；p90_cost始终返回
+        top_k: 大于0时每个类别额外返回耗时最长的top_k个请求
+        """
+        return self._get_query_performance(queryDate, 'non_template', percentiles, top_k)
+
+    def _get_query_performance(self, queryDate: str, query_kind: str, percentiles: Optional[List[float]],
+            top_k: int = 0) -> List[Dict[str, Any]]:
+        # 汇总表不保存最慢请求列表，需要top_k时从按天缓存的biz_seq总耗时计算
+        if not top_k and self._is_default_percentiles(percentiles) and self.is_rolled_up(queryDate):
+            rows = self.execute_query("""
+                SELECT category, db_type, environment, avg_cost, max_cost, p90_cost, max_cost_biz_seq, percentiles 
+                FROM t_daily_performance_rollup 
+                WHERE stat_date = %s AND query_kind = %s 
+                ORDER BY sort_order
+            """, (queryDate, query_kind))
+            for row in rows:
+                row['percentiles'] = json.loads(row['percentiles']) if row['percentiles'] else {}
+            selected = self._select_percentiles(rows, percentiles)
+            if selected is not None:
+                return selected
+        if query_kind == 'template':
+            return self.compute_template_query_performance(queryDate, percentiles=percentiles, top_k=top_k)
+        return self.compute_non_template_query_performance(queryDate, percentiles=percentiles, top_k=top_k)
+
+    def get_step_performance(self, queryDate: str, percentiles: List[float] = None) -> List[Dict[str, Any]]:
+        """
+        获取各个环节的耗时统计（当天使用增量聚合结果，历史日期读取每日汇总）
+        percentiles: 需要的百分位，默认[50, 90, 99]；p90_cost始终返回
+        """
+        if not self._is_default_percentiles(percentiles):
+            return self.compute_step_performance(queryDate, percentiles=percentiles)
+        today_stats = self._get_today_stats(queryDate, 'step_performance')
+        if today_stats is not None:
+            return self._select_percentiles(today_stats, percentiles)
+        if not self.is_rolled_up(queryDate):
+            return self.compute_step_performance(queryDate, percentiles=percentiles)
+        rows = self.execute_query("""
+            SELECT step_name, avg_cost, p90_cost, max_cost, percentiles 
+            FROM t_daily_step_rollup 
+            WHERE stat_date = %s
+        """, (queryDate,))
+        rows_by_step = {row['step_name']: row for row in rows}
+        # 按环节定义的顺序返回
+        results = [
+            {
+                'step_name': step_name,
+                'step_name_cn': step_name_cn,
+                'avg_cost': rows_by_step[step_name]['avg_cost'],
+                'p90_cost': rows_by_step[step_name]['p90_cost'],
+                'max_cost': rows_by_step[step_name]['max_cost'],
+                'percentiles': json.loads(rows_by_step[step_name]['percentiles'] or '{}')
+            }
+            for step_name, step_name_cn in self.step_name_mapping.items()
+            if step_name in rows_by_step
+        ]
+        selected = self._select_percentiles(results, percentiles)
+        if selected is None:
+            return self.compute_step_performance(queryDate, percentiles=percentiles)
+        return selected
+
+    def get_channel_stats(self, queryDate: str) -> Dict[str, Any]:
+        """获取各个渠道的查询数量统计（当天使用增量聚合结果，历史日期读取每日汇总）"""
+        today_stats = self._get_today_stats(queryDate, 'channel_stats')
+        if today_stats is not None:
+            return today_stats
+        if not self.is_rolled_up(queryDate):
+            return self.compute_channel_stats(queryDate)
+        rows = self.execute_query("""
+            SELECT channel, is_member, count 
+            FROM t_daily_channel_rollup 
+            WHERE stat_date = %s
+        """, (queryDate,))
+        member_stats = []
+        non_member_stats = []
+        for row in rows:
+            stats = member_stats if row['is_member'] else non_member_stats
+            stats.append({
+                'channel': row['channel'],
+                'channel_name': self.channel_name_mapping.get(row['channel'], row['channel']),
+                'count': row['count']
+            })
+        return {
+            'member_stats': sorted(member_stats, key=lambda x: x['count'], reverse=True),
+            'non_member_stats': sorted(non_member_stats, key=lambda x: x['count'], reverse=True)
+        }
+
+    def get_scenario_stats(self, queryDate: str) -> List[Dict[str, Any]]:
+        """获取各个场景的查询数量统计（当天使用增量聚合结果，历史日期读取每日汇总）"""
+        today_stats = self._get_today_stats(queryDate, 'scenario_stats')
+        if today_stats is not None:
+            return today_stats
+        if not self.is_rolled_up(queryDate):
+            return self.compute_scenario_stats(queryDate)
+        return self.execute_query("""
+            SELECT scenario, scenario_name, count, member_count, non_member_count 
+            FROM t_daily_scenario_rollup 
+            WHERE stat_date = %s 
+            ORDER BY count DESC
+        """, (queryDate,))
+
+    @staticmethod
+    def _summarize_costs(costs, percentiles: Optional[List[float]]) -> Dict[str, Any]:
+        """计算耗时汇总；P90始终计算（用于p90_cost字段），percentiles中只保留请求的百分位"""
+        requested = normalize_percentiles(percentiles)
+        summary = summarize_costs(costs, requested + ([] if 90 in requested else [90]))
+        p90 = summary['percentiles'][percentile_key(90)]
+        summary['p90'] = p90 if p90 is not None else 0
+        summary['percentiles'] = round_percentiles(
+            {percentile_key(p): summary['percentiles'][percentile_key(p)] for p in requested}
+        )
+        return summary
+
+    def compute_template_query_performance(self, queryDate: str, cost_sink: Optional[Dict[str, Any]] = None,
+            percentiles: List[float] = None, top_k: int = 0,
+            slow_sink: Optional[Dict[str, TopK]] = None) -> List[Dict[str, Any]]:
+        """
+        获取模板查询性能统计
+        cost_sink: 可选，传入时写入各类别的耗时数组（每日汇总用于生成分位数草图）
+        percentiles: 需要的百分位，默认[50, 90, 99]
+        top_k: 大于0时每个类别额外返回耗时最长的top_k个请求（slowest字段）
+        slow_sink: 可选，传入时写入各类别最慢请求的TopK（每日汇总用于生成最慢请求索引）
+        """
+        try:
+            return self._compute_query_performance(queryDate, 'template', cost_sink, percentiles, top_k, slow_sink)
         except Exception as e:
             logger.error(f"获取模板查询性能统计失败: {e}")
             raise e
 
-    def get_non_template_query_performance(self, queryDate: str) -> List[Dict[str, Any]]:
-        """获取非模板查询性能统计"""
+    def compute_non_template_query_performance(self, queryDate: str, cost_sink: Optional[Dict[str, Any]] = None,
+            percentiles: List[float] = None, top_k: int = 0,
+            slow_sink: Optional[Dict[str, TopK]] = None) -> List[Dict[str, Any]]:
+        """
+        获取非模板查询性能统计
+        cost_sink: 可选，传入时写入各类别的耗时数组（每日汇总用于生成分位数草图）
+        percentiles: 需要的百分位，默认[50, 90, 99]
+        top_k: 大于0时每个类别额外返回耗时最长的top_k个请求（slowest字段）
+        slow_sink: 可选，传入时写入各类别最慢请求的TopK（每日汇总用于生成最慢请求索引）
+        """
         try:
-            date_obj = datetime.strptime(queryDate, '%Y-%m-%d').date()
-            next_date = date_obj.replace(day=date_obj.day + 1) if date_obj.day < 28 else date_obj.replace(month=date_obj.month + 1, day=1)
-            
-            performance_queries = [
-                {
-                    'category': 'TDSQL-准生产环境',
-                    'db_type': 'TDSQL',
-                    'environment': '准生产环境',
-                    'sql': """
-                        SELECT AVG(cost) as avg_cost, MAX(cost) as max_cost FROM (
-                            SELECT biz_seq, SUM(cost) as cost FROM t_step_time_record 
-                            WHERE create_time >= %s AND create_time < %s 
-                            AND sub_step_name != 'REQ_DS' 
-                            AND biz_seq IN (
-                                SELECT biz_seq FROM t_handler_logs 
-                                WHERE create_time >= %s AND create_time < %s 
-                                AND req_info LIKE %s AND req_info NOT LIKE %s
-                            ) 
-                            AND biz_seq NOT IN (
-                                SELECT DISTINCT biz_seq FROM req_aomp_log 
-                                WHERE create_time >= %s AND create_time < %s 
-                                AND biz_seq IS NOT NULL
-                            ) 
-                            GROUP BY biz_seq
-                        ) temp
-                    """,
-                    'params': (queryDate, next_date.strftime('%Y-%m-%d'), queryDate, next_date.strftime('%Y-%m-%d'), '%TDSQL%', '%###%', queryDate, next_date.strftime('%Y-%m-%d'))
-                },
-                {
-                    'category': 'TDSQL-生产环境',
-                    'db_type': 'TDSQL',
-                    'environment': '生产环境',
-                    'sql': """
-                        SELECT AVG(cost) as avg_cost, MAX(cost) as max_cost FROM (
-                            SELECT biz_seq, SUM(cost) as cost FROM t_step_time_record 
-                            WHERE create_time >= %s AND create_time < %s 
-                            AND sub_step_name != 'REQ_DS' 
-                            AND biz_seq IN (
-                                SELECT biz_seq FROM t_handler_logs 
-                                WHERE create_time >= %s AND create_time < %s 
-                                AND req_info LIKE %s AND req_info NOT LIKE %s
-                            ) 
-                            AND biz_seq IN (
-                                SELECT DISTINCT biz_seq FROM req_aomp_log 
-                                WHERE create_time >= %s AND create_time < %s 
-                                AND biz_seq IS NOT NULL
-                            ) 
-                            GROUP BY biz_seq
-                        ) temp
-                    """,
-                    'params': (queryDate, next_date.strftime('%Y-%m-%d'), queryDate, next_date.strftime('%Y-%m-%d'), '%TDSQL%', '%###%', queryDate, next_date.strftime('%Y-%m-%d'))
-                },
-                {
-                    'category': 'TIDB-准生产环境',
-                    'db_type': 'TIDB',
-                    'environment': '准生产环境',
-                    'sql': """
-                        SELECT AVG(cost) as avg_cost, MAX(cost) as max_cost FROM (
-                            SELECT biz_seq, SUM(cost) as cost FROM t_step_time_record 
-                            WHERE create_time >= %s AND create_time < %s 
-                            AND sub_step_name != 'REQ_DS' 
-                            AND biz_seq IN (
-                                SELECT biz_seq FROM t_handler_logs 
-                                WHERE create_time >= %s AND create_time < %s 
-                                AND req_info LIKE %s AND req_info NOT LIKE %s
-                            ) 
-                            AND biz_seq NOT IN (
-                                SELECT DISTINCT biz_seq FROM req_aomp_log 
-                                WHERE create_time >= %s AND create_time < %s 
-                                AND biz_seq IS NOT NULL
-                            ) 
-                            GROUP BY biz_seq
-                        ) temp
-                    """,
-                    'params': (queryDate, next_date.strftime('%Y-%m-%d'), queryDate, next_date.strftime('%Y-%m-%d'), '%TIDB%', '%###%', queryDate, next_date.strftime('%Y-%m-%d'))
-                },
-                {
-                    'category': 'TIDB-生产环境',
-                    'db_type': 'TIDB',
-                    'environment': '生产环境',
-                    'sql': """
-                        SELECT AVG(cost) as avg_cost, MAX(cost) as max_cost FROM (
-                            SELECT biz_seq, SUM(cost) as cost FROM t_step_time_record 
-                            WHERE create_time >= %s AND create_time < %s 
-                            AND sub_step_name != 'REQ_DS' 
-                            AND biz_seq IN (
-                                SELECT biz_seq FROM t_handler_logs 
-                                WHERE create_time >= %s AND create_time < %s 
-                                AND req_info LIKE %s AND req_info NOT LIKE %s
-                            ) 
-                            AND biz_seq IN (
-                                SELECT DISTINCT biz_seq FROM req_aomp_log 
-                                WHERE create_time >= %s AND create_time < %s 
-                                AND biz_seq IS NOT NULL
-                            ) 
-                            GROUP BY biz_seq
-                        ) temp
-                    """,
-                    'params': (queryDate, next_date.strftime('%Y-%m-%d'), queryDate, next_date.strftime('%Y-%m-%d'), '%TIDB%', '%###%', queryDate, next_date.strftime('%Y-%m-%d'))
-                },
-                {
-                    'category': 'HIVE-生产环境',
-                    'db_type': 'HIVE',
-                    'environment': '生产环境',
-                    'sql': """
-                        SELECT AVG(cost) as avg_cost, MAX(cost) as max_cost FROM (
-                            SELECT biz_seq, SUM(cost) as cost FROM t_step_time_record 
-                            WHERE create_time >= %s AND create_time < %s 
-                            AND sub_step_name != 'REQ_DS' 
-                            AND biz_seq IN (
-                                SELECT biz_seq FROM t_handler_logs 
-                                WHERE create_time >= %s AND create_time < %s 
-                                AND req_info LIKE %s AND req_info NOT LIKE %s
-                            ) 
-                            GROUP BY biz_seq
-                        ) temp
-                    """,
-                    'params': (queryDate, next_date.strftime('%Y-%m-%d'), queryDate, next_date.strftime('%Y-%m-%d'), '%HIVE%', '%###%')
-                }
-            ]
-            
-            results = []
-            for query_info in performance_queries:
-                # 先获取平均值和最大值
-                result = self.execute_query(query_info['sql'], query_info['params'])
-                if result and result[0]['avg_cost'] is not None:
-                    # 获取所有cost值用于计算P90
-                    all_costs_sql = query_info['sql'].replace(
-                        'SELECT AVG(cost) as avg_cost, MAX(cost) as max_cost',
-                        'SELECT cost'
-                    )
-                    all_costs_result = self.execute_query(all_costs_sql, query_info['params'])
-                    costs = [float(row['cost']) for row in all_costs_result if row.get('cost')]
-                    p90_cost = self._calculate_p90(costs) if costs else 0
-                    
-                    # 获取最大耗时对应的biz_seq
-                    max_cost = result[0]['max_cost']
-                    max_biz_seq_sql = """
-                        SELECT biz_seq FROM (
-                            SELECT biz_seq, SUM(cost) as cost FROM t_step_time_record 
-                            WHERE create_time >= %s AND create_time < %s 
-                            AND sub_step_name != 'REQ_DS' 
-                            GROUP BY biz_seq 
-                            HAVING cost = %s
-                        ) temp LIMIT 1
-                    """
-                    max_biz_seq_result = self.execute_query(max_biz_seq_sql, (queryDate, next_date.strftime('%Y-%m-%d'), max_cost))
-                    max_cost_biz_seq = max_biz_seq_result[0]['biz_seq'] if max_biz_seq_result else None
-                    
-                    results.append({
-                        'category': query_info['category'],
-                        'db_type': query_info['db_type'],
-                        'environment': query_info['environment'],
-                        'avg_cost': round(float(result[0]['avg_cost']), 2),
-                        'max_cost': result[0]['max_cost'],
-                        'p90_cost': round(p90_cost, 2),
-                        'max_cost_biz_seq': max_cost_biz_seq
-                    })
-            
-            return results
+            return self._compute_query_performance(queryDate, 'non_template', cost_sink, percentiles, top_k, slow_sink)
         except Exception as e:
             logger.error(f"获取非模板查询性能统计失败: {e}")
             raise e
 
-    def get_step_performance(self, queryDate: str) -> List[Dict[str, Any]]:
-        """获取各个环节的耗时统计"""
+    def _compute_query_performance(self, queryDate: str, query_kind: str, cost_sink: Optional[Dict[str, Any]],
+            percentiles: Optional[List[float]], top_k: int = 0,
+            slow_sink: Optional[Dict[str, TopK]] = None) -> List[Dict[str, Any]]:
+        """
+        按类别计算查询性能：当天每个biz_seq的总耗时只查询一次（与分类一样按天缓存），
+        与biz_seq分类关联后，平均值、最大值、百分位、最大耗时的biz_seq和最慢的top_k个请求都由同一结果推导
+        """
+        classification = get_day_classification(self, queryDate)
+        biz_seqs, biz_costs = get_day_biz_costs(self, queryDate)
+        
+        # 各类别的 (biz_seq, 总耗时) 列表
+        category_costs = {category['category']: [] for category in PERFORMANCE_CATEGORIES}
+        for biz_seq, cost in zip(biz_seqs, biz_costs):
+            if cost is None:
+                continue
+            for category in match_categories(classification.get(biz_seq), query_kind):
+                category_costs[category['category']].append((biz_seq, cost))
+        
+        results = []
+        for category in PERFORMANCE_CATEGORIES:
+            items = category_costs[category['category']]
+            if not items:
+                continue
+            max_cost_biz_seq, max_cost = max(items, key=lambda item: item[1])
+            # 百分位不计入总耗时为0的请求（与原统计一致）
+            costs = array('d', (cost for _, cost in items if cost))
+            summary = self._summarize_costs(costs, percentiles)
+            if cost_sink is not None and costs:
+                cost_sink[category['category']] = costs
+            if slow_sink is not None:
+                slowest = TopK(slow_request_config.top_k)
+                slowest.push_many((cost, biz_seq) for biz_seq, cost in items)
+                slow_sink[category['category']] = slowest
+            
+            result = {
+                'category': category['category'],
+                'db_type': category['db_type'],
+                'environment': category['environment'],
+                'avg_cost': round(sum(cost for _, cost in items) / len(items), 2),
+                'max_cost': max_cost,
+                'p90_cost': round(summary['p90'], 2),
+                'max_cost_biz_seq': max_cost_biz_seq,
+                'percentiles': summary['percentiles']
+            }
+            if top_k > 0:
+                slowest = TopK(top_k)
+                slowest.push_many((cost, biz_seq) for biz_seq, cost in items)
+                result['slowest'] = [{'biz_seq': biz_seq, 'cost': cost} for cost, biz_seq in slowest.items()]
+            results.append(result)
+        
+        return results
+
+    def compute_step_performance(self, queryDate: str, cost_sink: Optional[Dict[str, Any]] = None,
+            percentiles: List[float] = None, slow_sink: Optional[Dict[str, TopK]] = None) -> List[Dict[str, Any]]:
+        """
+        获取各个环节的耗时统计
+        一次读取当天各环节的耗时，HIVE查询的排除通过当天的biz_seq分类判断
+        cost_sink: 可选，传入时写入各环节的耗时数组（每日汇总用于生成分位数草图）
+        percentiles: 需要的百分位，默认[50, 90, 99]
+        slow_sink: 可选，传入时写入各环节最慢请求的TopK（每日汇总用于生成最慢请求索引）
+        """
         try:
             date_obj = datetime.strptime(queryDate, '%Y-%m-%d').date()
-            next_date = date_obj.replace(day=date_obj.day + 1) if date_obj.day < 28 else date_obj.replace(month=date_obj.month + 1, day=1)
+            next_date = date_obj + timedelta(days=1)
+            classification = get_day_classification(self, queryDate)
+            
+            step_names = list(self.step_name_mapping)
+            columns = self.execute_query_columns("""
+                SELECT biz_seq, step_name, cost 
+                FROM t_step_time_record 
+                WHERE create_time >= %s AND create_time < %s 
+                AND step_name IN ({})
+            """.format(','.join(['%s'] * len(step_names))), (queryDate, next_date.strftime('%Y-%m-%d')) + tuple(step_names))
+            
+            # 列式读取，只保留紧凑的耗时数组不保留整行
+            step_costs = {step_name: array('d') for step_name in step_names}
+            for biz_seq, step_name, cost in zip(columns.get('biz_seq', []), columns.get('step_name', []), columns.get('cost', [])):
+                if cost is None:
+                    continue
+                if step_name in HIVE_EXCLUDED_STEPS:
+                    # QUERY_SCHEMA和SUB_QUERY排除HIVE查询，QUERY_SCHEMA只统计耗时大于1000的记录
+                    biz_class = classification.get(biz_seq)
+                    if biz_seq is None or (biz_class is not None and biz_class.is_hive):
+                        continue
+                    min_cost = HIVE_EXCLUDED_STEPS[step_name]
+                    if min_cost is not None and cost <= min_cost:
+                        continue
+                step_costs[step_name].append(cost)
+                if slow_sink is not None and biz_seq is not None:
+                    if step_name not in slow_sink:
+                        slow_sink[step_name] = TopK(slow_request_config.top_k)
+                    slow_sink[step_name].push(cost, biz_seq)
             
             results = []
             for step_name, step_name_cn in self.step_name_mapping.items():
-                # 获取所有cost数据用于计算P90
-                cost_sql = f"""
-                    SELECT cost 
-                    FROM t_step_time_record 
-                    WHERE create_time >= %s AND create_time < %s 
-                    AND step_name = %s
-                """
-                
-                # 对特定步骤添加额外条件
-                if step_name == 'QUERY_SCHEMA':
-                    cost_sql += """ AND biz_seq NOT IN (
-                        SELECT biz_seq FROM t_handler_logs 
-                        WHERE create_time >= %s AND create_time < %s 
-                        AND req_info LIKE %s
-                    ) AND cost > 1000"""
-                    params = (queryDate, next_date.strftime('%Y-%m-%d'), step_name, queryDate, next_date.strftime('%Y-%m-%d'), '%HIVE%')
-                elif step_name == 'SUB_QUERY':
-                    cost_sql += """ AND biz_seq NOT IN (
-                        SELECT biz_seq FROM t_handler_logs 
-                        WHERE create_time >= %s AND create_time < %s 
-                        AND req_info LIKE %s
-                    )"""
-                    params = (queryDate, next_date.strftime('%Y-%m-%d'), step_name, queryDate, next_date.strftime('%Y-%m-%d'), '%HIVE%')
-                else:
-                    params = (queryDate, next_date.strftime('%Y-%m-%d'), step_name)
-                
-                cost_results = self.execute_query(cost_sql, params)
-                
-                if cost_results and len(cost_results) > 0:
-                    from decimal import Decimal
+                costs = step_costs[step_name]
+                if costs and cost_sink is not None:
+                    cost_sink[step_name] = costs
+                if costs:
+                    # 一次计算平均值、最大值和各百分位
+                    summary = self._summarize_costs(costs, percentiles)
                     
-                    # 提取所有cost值
-                    costs = [float(row['cost']) if isinstance(row['cost'], Decimal) else row['cost'] 
-                            for row in cost_results if row['cost'] is not None]
-                    
-                    if costs:
-                        # 计算平均值、最大值和P90
-                        avg_cost = sum(costs) / len(costs)
-                        max_cost = max(costs)
-                        p90_cost = self._calculate_p90(costs)
-                        
-                        results.append({
-                            'step_name': step_name,
-                            'step_name_cn': step_name_cn,
-                            'avg_cost': round(avg_cost, 2),
-                            'p90_cost': round(p90_cost, 2),
-                            'max_cost': round(max_cost, 2)
-                        })
+                    results.append({
+                        'step_name': step_name,
+                        'step_name_cn': step_name_cn,
+                        'avg_cost': round(summary['avg'], 2),
+                        'p90_cost': round(summary['p90'], 2),
+                        'max_cost': round(summary['max'], 2),
+                        'percentiles': summary['percentiles']
+                    })
             
             return results
         except Exception as e:
             logger.error(f"获取步骤性能统计失败: {e}")
             raise e
 
-    def get_channel_stats(self, queryDate: str) -> Dict[str, Any]:
-        """获取各个渠道的查询数量统计（按项目组成员和非项目组成员划分）"""
+    def compute_channel_stats(self, queryDate: str) -> Dict[str, Any]:
+        """
+        获取各个渠道的查询数量统计（按项目组成员和非项目组成员划分）
+        按user_id和渠道分组扫描一次，在内存中区分项目组成员
+        """
         try:
             date_obj = datetime.strptime(queryDate, '%Y-%m-%d').date()
-            next_date = date_obj.replace(day=date_obj.day + 1) if date_obj.day < 28 else date_obj.replace(month=date_obj.month + 1, day=1)
-            
-            # 项目组成员列表
-            project_members = [
-                'qingyiluan', 'ruihu', 'syroalxiao', 'froggynie', 'xinxu', 'kuixu', 
-                'liamyang', 'owenzhang', 'xinyinshu', 'weijiang', 'taojiang', 'eruditemao',
-                'dylanding', 'hongqinluo', 'mjyu', 'docwang', 'bowenduan', 'alexxliu',
-                'ivesxiong', 'xiweili', 'derekye', 'rawlinschen', 'tiantianhu', 'haoqunliu',
-                'penhuazhang', 'liangdonghu', 'rorozhang', 'quanzhang', 'pengfeili', 'kellymeng',
-                'qianlong', 'kaipengxu', 'norazeng', 'colinxu', 'xiaojianxia', 'joeyxu',
-                'rouzhitang', 'cccpeng', 'jiajian'
-            ]
-            
-            # 查询项目组成员的渠道统计
-            sql_members = """
-                SELECT channel, COUNT(1) as count 
-                FROM t_handler_logs 
-                WHERE create_time >= %s AND create_time < %s 
-                AND user_id IN ({})
-                GROUP BY channel
-            """.format(','.join(['%s'] * len(project_members)))
-            
-            params_members = [queryDate, next_date.strftime('%Y-%m-%d')] + project_members
-            results_members = self.execute_query(sql_members, tuple(params_members))
+            next_date = date_obj + timedelta(days=1)
             
-            # 查询非项目组成员的渠道统计
-            sql_non_members = """
-                SELECT channel, COUNT(1) as count 
+            sql = """
+                SELECT user_id, channel, COUNT(1) as count 
                 FROM t_handler_logs 
                 WHERE create_time >= %s AND create_time < %s 
-                AND (user_id NOT IN ({}) OR user_id IS NULL)
-                GROUP BY channel
-            """.format(','.join(['%s'] * len(project_members)))
-            
-            params_non_members = [queryDate, next_date.strftime('%Y-%m-%d')] + project_members
-            results_non_members = self.execute_query(sql_non_members, tuple(params_non_members))
+                GROUP BY user_id, channel
+            """
+            results = self.execute_query(sql, (queryDate, next_date.strftime('%Y-%m-%d')))
             
-            # 格式化项目组成员数据
-            member_stats = []
-            for result in results_members:
+            # (渠道, 是否项目组成员) -> 请求数
+            channel_counts = Counter()
+            for result in results:
                 channel = result['channel'] or '未知渠道'
-                channel_name = self.channel_name_mapping.get(channel, channel)
-                member_stats.append({
-                    'channel': channel,
-                    'channel_name': channel_name,
-                    'count': result['count']
-                })
+                channel_counts[(channel, member_dimension.is_member(result['user_id']))] += result['count']
             
-            # 格式化非项目组成员数据
+            member_stats = []
             non_member_stats = []
-            for result in results_non_members:
-                channel = result['channel'] or '未知渠道'
-                channel_name = self.channel_name_mapping.get(channel, channel)
-                non_member_stats.append({
+            for (channel, is_member), count in channel_counts.items():
+                stats = member_stats if is_member else non_member_stats
+                stats.append({
                     'channel': channel,
-                    'channel_name': channel_name,
-                    'count': result['count']
+                    'channel_name': self.channel_name_mapping.get(channel, channel),
+                    'count': count
                 })
             
             return {
@@ -871,222 +963,71 @@ class DatabaseManager:
             raise e
 
     def get_no_ticket_stats(self, queryDate: str) -> Dict[str, Any]:
-        """获取免提单数量统计"""
+        """获取免提单数量统计（已完成请求标签的日期读取标签表）"""
         try:
+            if self.is_labelled(queryDate):
+                result = self.execute_query(
+                    "SELECT COUNT(1) as count FROM t_request_label WHERE stat_date = %s AND is_no_ticket = 1",
+                    (queryDate,)
+                )
+                return {
+                    'count': result[0]['count'] if result else 0,
+                    'queryDate': queryDate
+                }
+            
             date_obj = datetime.strptime(queryDate, '%Y-%m-%d').date()
-            next_date = date_obj.replace(day=date_obj.day + 1) if date_obj.day < 28 else date_obj.replace(month=date_obj.month + 1, day=1)
+            next_date = date_obj + timedelta(days=1)
             
             sql = """
                 SELECT COUNT(1) as count FROM t_handler_logs 
-                WHERE create_time >= %s AND create_time < %s 
-                AND req_info LIKE %s AND rsp_info LIKE %s
-            """
-            result = self.execute_query(sql, (queryDate, next_date.strftime('%Y-%m-%d'), '%"sysNameList": []%', '%查询执行成功%'))
-            
-            return {
-                'count': result[0]['count'] if result else 0,
-                'queryDate': queryDate
-            }
-        except Exception as e:
-            logger.error(f"获取免提单统计失败: {e}")
-            raise e
-
-    def get_scenario_stats(self, queryDate: str) -> List[Dict[str, Any]]:
-        """获取各个场景的查询数量统计"""
-        try:
-            date_obj = datetime.strptime(queryDate, '%Y-%m-%d').date()
-            next_date = date_obj.replace(day=date_obj.day + 1) if date_obj.day < 28 else date_obj.replace(month=date_obj.month + 1, day=1)
-            
-            scenario_queries = [
-                {
-                    'scenario': 'execution_plan',
-                    'scenario_name': '执行计划',
-                    'sql': """
-                        SELECT COUNT(1) as count FROM t_handler_logs 
-                        WHERE create_time >= %s AND create_time < %s 
-                        AND UPPER(req_info) LIKE %s
-                    """,
-                    'params': (queryDate, next_date.strftime('%Y-%m-%d'), '%EXPLAIN%')
-                },
-                {
-                    'scenario': 'yn_query',
-                    'scenario_name': 'Y/N查询',
-                    'sql': """
-                        SELECT COUNT(1) as count FROM t_handler_logs 
-                        WHERE create_time >= %s AND create_time < %s 
-                        AND UPPER(req_info) NOT LIKE %s 
-                        AND UPPER(req_info) LIKE %s
-                    """,
-                    'params': (queryDate, next_date.strftime('%Y-%m-%d'), '%EXPLAIN%', '%IF(%')
-                },
-                {
-                    'scenario': 'count_query',
-                    'scenario_name': '数量查询',
-                    'sql': """
-                        SELECT COUNT(1) as count FROM t_handler_logs 
-                        WHERE create_time >= %s AND create_time < %s 
-                        AND UPPER(req_info) NOT LIKE %s 
-                        AND UPPER(req_info) NOT LIKE %s 
-                        AND UPPER(req_info) LIKE %s
-                    """,
-                    'params': (queryDate, next_date.strftime('%Y-%m-%d'), '%EXPLAIN%', '%IF(%', '%COUNT%')
-                },
-                {
-                    'scenario': 'table_structure',
-                    'scenario_name': '表结构查询',
-                    'sql': """
-                        SELECT COUNT(1) as count FROM t_handler_logs 
-                        WHERE create_time >= %s AND create_time < %s 
-                        AND UPPER(req_info) NOT LIKE %s 
-                        AND UPPER(req_info) NOT LIKE %s 
-                        AND UPPER(req_info) NOT LIKE %s 
-                        AND (UPPER(req_info) LIKE %s OR UPPER(req_info) LIKE %s) 
-                        AND UPPER(req_info) NOT LIKE %s
-                    """,
-                    'params': (queryDate, next_date.strftime('%Y-%m-%d'), '%EXPLAIN%', '%IF(%', '%COUNT%', '%DESC%', '%SHOW%', '%SELECT%')
-                },
-                {
-                    'scenario': 'enum_query',
-                    'scenario_name': '枚举查询',
-                    'sql': """
-                        SELECT COUNT(1) as count FROM t_handler_logs 
-                        WHERE create_time >= %s AND create_time < %s 
-                        AND UPPER(req_info) NOT LIKE %s 
-                        AND UPPER(req_info) NOT LIKE %s 
-                        AND UPPER(req_info) NOT LIKE %s 
-                        AND UPPER(req_info) NOT LIKE %s 
-                        AND (UPPER(req_info) NOT LIKE %s OR UPPER(req_info) LIKE %s) 
-                        AND UPPER(req_info) LIKE %s
-                    """,
-                    'params': (queryDate, next_date.strftime('%Y-%m-%d'), '%EXPLAIN%', '%IF(%', '%COUNT%', '%SHOW%', '%DESC%', '%SELECT%', '%DISTINCT%')
-                },
-                {
-                    'scenario': 'time_query',
-                    'scenario_name': '时间查询',
-                    'sql': """
-                        SELECT COUNT(1) as count FROM t_handler_logs 
-                        WHERE create_time >= %s AND create_time < %s 
-                        AND UPPER(req_info) NOT LIKE %s 
-                        AND UPPER(req_info) NOT LIKE %s 
-                        AND UPPER(req_info) NOT LIKE %s 
-                        AND UPPER(req_info) NOT LIKE %s 
-                        AND (UPPER(req_info) NOT LIKE %s OR UPPER(req_info) LIKE %s) 
-                        AND UPPER(req_info) NOT LIKE %s 
-                        AND UPPER(req_info) LIKE %s
-                    """,
-                    'params': (queryDate, next_date.strftime('%Y-%m-%d'), '%EXPLAIN%', '%IF(%', '%COUNT%', '%SHOW%', '%DESC%', '%SELECT%', '%DISTINCT%', '%TIME%FROM%')
-                },
-                {
-                    'scenario': 'config_query',
-                    'scenario_name': '配置查询',
-                    'sql': """
-                        SELECT COUNT(1) as count FROM t_handler_logs 
-                        WHERE create_time >= %s AND create_time < %s 
-                        AND UPPER(rsp_info) LIKE %s
-                    """,
-                    'params': (queryDate, next_date.strftime('%Y-%m-%d'), '%SQL_TITLE%配置%')
-                },
-                {
-                    'scenario': 'field_length',
-                    'scenario_name': '字段长度查询',
-                    'sql': """
-                        SELECT COUNT(1) as count FROM t_handler_logs 
-                        WHERE create_time >= %s AND create_time < %s 
-                        AND UPPER(req_info) NOT LIKE %s 
-                        AND UPPER(req_info) NOT LIKE %s 
-                        AND UPPER(req_info) NOT LIKE %s 
-                        AND UPPER(req_info) NOT LIKE %s 
-                        AND (UPPER(req_info) NOT LIKE %s OR UPPER(req_info) LIKE %s) 
-                        AND UPPER(req_info) NOT LIKE %s 
-                        AND UPPER(req_info) NOT LIKE %s 
-                        AND UPPER(req_info) LIKE %s
-                    """,
-                    'params': (queryDate, next_date.strftime('%Y-%m-%d'), '%EXPLAIN%', '%IF(%', '%COUNT%', '%SHOW%', '%DESC%', '%SELECT%', '%DISTINCT%', '%TIME%FROM%', '%LENGTH%')
-                },
-                {
-                    'scenario': 'ticket_related',
-                    'scenario_name': '提单相关',
-                    'sql': """
-                        SELECT COUNT(1) as count FROM t_handler_logs 
-                        WHERE create_time >= %s AND create_time < %s 
-                        AND UPPER(req_info) NOT LIKE %s 
-                        AND UPPER(req_info) NOT LIKE %s 
-                        AND UPPER(req_info) NOT LIKE %s 
-                        AND UPPER(req_info) NOT LIKE %s 
-                        AND (UPPER(req_info) NOT LIKE %s OR UPPER(req_info) LIKE %s) 
-                        AND UPPER(req_info) NOT LIKE %s 
-                        AND UPPER(req_info) NOT LIKE %s 
-                        AND (req_info LIKE %s OR req_info LIKE %s OR req_info LIKE %s OR rsp_info LIKE %s OR rsp_info LIKE %s)
-                    """,
-                    'params': (queryDate, next_date.strftime('%Y-%m-%d'), '%EXPLAIN%', '%IF(%', '%COUNT%', '%SHOW%', '%DESC%', '%SELECT%', '%DISTINCT%', '%TIME%FROM%', '%提单%', '%确认%', '%同意%', '%很荣幸能够%', '%用户协议%')
-                },
-                {
-                    'scenario': 'other',
-                    'scenario_name': '其他',
-                    'sql': """
-                        SELECT COUNT(1) as count FROM t_handler_logs 
-                        WHERE create_time >= %s AND create_time < %s 
-                        AND UPPER(req_info) NOT LIKE %s 
-                        AND UPPER(req_info) NOT LIKE %s 
-                        AND UPPER(req_info) NOT LIKE %s 
-                        AND UPPER(req_info) NOT LIKE %s 
-                        AND (UPPER(req_info) NOT LIKE %s OR UPPER(req_info) LIKE %s) 
-                        AND UPPER(req_info) NOT LIKE %s 
-                        AND UPPER(req_info) NOT LIKE %s 
-                        AND req_info NOT LIKE %s 
-                        AND req_info NOT LIKE %s 
-                        AND req_info NOT LIKE %s 
-                        AND rsp_info NOT LIKE %s 
-                        AND rsp_info NOT LIKE %s
-                    """,
-                    'params': (queryDate, next_date.strftime('%Y-%m-%d'), '%EXPLAIN%', '%IF(%', '%COUNT%', '%SHOW%', '%DESC%', '%SELECT%', '%DISTINCT%', '%TIME%FROM%', '%提单%', '%确认%', '%同意%', '%很荣幸能够%', '%用户协议%')
-                }
-            ]
+                WHERE create_time >= %s AND create_time < %s 
+                AND req_info LIKE %s AND rsp_info LIKE %s
+            """
+            result = self.execute_query(sql, (queryDate, next_date.strftime('%Y-%m-%d'), '%"sysNameList": []%', '%查询执行成功%'))
             
-            # 项目组成员列表
-            project_members = [
-                'qingyiluan', 'ruihu', 'syroalxiao', 'froggynie', 'xinxu', 'kuixu', 
-                'liamyang', 'owenzhang', 'xinyinshu', 'weijiang', 'taojiang', 'eruditemao',
-                'dylanding', 'hongqinluo', 'mjyu', 'docwang', 'bowenduan', 'alexxliu',
-                'ivesxiong', 'xiweili', 'derekye', 'rawlinschen', 'tiantianhu', 'haoqunliu',
-                'penhuazhang', 'liangdonghu', 'rorozhang', 'quanzhang', 'pengfeili', 'kellymeng',
-                'qianlong', 'kaipengxu', 'norazeng', 'colinxu', 'xiaojianxia', 'joeyxu',
-                'rouzhitang', 'cccpeng', 'jiajian'
-            ]
+            return {
+                'count': result[0]['count'] if result else 0,
+                'queryDate': queryDate
+            }
+        except Exception as e:
+            logger.error(f"获取免提单统计失败: {e}")
+            raise e
+
+    def compute_scenario_stats(self, queryDate: str) -> List[Dict[str, Any]]:
+        """
+        获取各个场景的查询数量统计
+        已完成请求标签的日期按场景位掩码和是否项目组成员分组计数；
+        否则一次流式读取当天日志的user_id/req_info/rsp_info，由scenario_rules中预编译的分类器判断场景，
+        同时得到各场景的总数、项目组成员和非项目组成员的数量
+        """
+        try:
+            if self.is_labelled(queryDate):
+                scenario_counts = Counter()
+                rows = self.execute_query("""
+                    SELECT scenario_mask, is_member, COUNT(1) as count FROM t_request_label 
+                    WHERE stat_date = %s 
+                    GROUP BY scenario_mask, is_member
+                """, (queryDate,))
+                for row in rows:
+                    for scenario in decode_scenarios(int(row['scenario_mask'])):
+                        scenario_counts[(scenario, bool(row['is_member']))] += row['count']
+                return build_scenario_stats(scenario_counts)
             
-            results = []
-            for query_info in scenario_queries:
-                # 总体查询
-                result = self.execute_query(query_info['sql'], query_info['params'])
-                total_count = result[0]['count'] if result else 0
-                
-                # 项目组成员查询
-                member_sql = query_info['sql'].replace(
-                    'WHERE create_time',
-                    'WHERE user_id IN ({}) AND create_time'.format(','.join(['%s'] * len(project_members)))
-                )
-                member_params = list(project_members) + list(query_info['params'])
-                member_result = self.execute_query(member_sql, tuple(member_params))
-                member_count = member_result[0]['count'] if member_result else 0
-                
-                # 非项目组成员查询
-                non_member_sql = query_info['sql'].replace(
-                    'WHERE create_time',
-                    'WHERE (user_id NOT IN ({}) OR user_id IS NULL) AND create_time'.format(','.join(['%s'] * len(project_members)))
-                )
-                non_member_params = list(project_members) + list(query_info['params'])
-                non_member_result = self.execute_query(non_member_sql, tuple(non_member_params))
-                non_member_count = non_member_result[0]['count'] if non_member_result else 0
-                
-                results.append({
-                    'scenario': query_info['scenario'],
-                    'scenario_name': query_info['scenario_name'],
-                    'count': total_count,
-                    'member_count': member_count,
-                    'non_member_count': non_member_count
-                })
+            date_obj = datetime.strptime(queryDate, '%Y-%m-%d').date()
+            next_date = date_obj + timedelta(days=1)
+            
+            scenario_counts = Counter()
+            sql = """
+                SELECT user_id, req_info, rsp_info FROM t_handler_logs 
+                WHERE create_time >= %s AND create_time < %s
+            """
+            for rows in self.execute_query_stream(sql, (queryDate, next_date.strftime('%Y-%m-%d'))):
+                for row in rows:
+                    is_member = member_dimension.is_member(row['user_id'])
+                    for scenario in classify_scenarios(row['req_info'], row['rsp_info']):
+                        scenario_counts[(scenario, is_member)] += 1
             
-            return sorted(results, key=lambda x: x['count'], reverse=True)
+            return build_scenario_stats(scenario_counts)
         except Exception as e:
             logger.error(f"获取场景统计失败: {e}")
             raise e
@@ -1095,7 +1036,7 @@ class DatabaseManager:
         """获取使用人员统计"""
         try:
             date_obj = datetime.strptime(queryDate, '%Y-%m-%d').date()
-            next_date = date_obj.replace(day=date_obj.day + 1) if date_obj.day < 28 else date_obj.replace(month=date_obj.month + 1, day=1)
+            next_date = date_obj + timedelta(days=1)
             
             sql = """
                 SELECT user_id, COUNT(1) as count 
@@ -1185,72 +1126,21 @@ class DatabaseManager:
     def get_date_range_query_trend(self, start_date: str = None, end_date: str = None) -> List[Dict[str, Any]]:
         """获取指定日期范围的查询趋势（按项目组和非项目组划分）"""
         try:
-            # 项目组成员列表
-            project_members = [
-                'qingyiluan', 'ruihu', 'syroalxiao', 'froggynie', 'xinxu', 'kuixu', 
-                'liamyang', 'owenzhang', 'xinyinshu', 'weijiang', 'taojiang', 'eruditemao',
-                'dylanding', 'hongqinluo', 'mjyu', 'docwang', 'bowenduan', 'alexxliu',
-                'ivesxiong', 'xiweili', 'derekye', 'rawlinschen', 'tiantianhu', 'haoqunliu',
-                'penhuazhang', 'liangdonghu', 'rorozhang', 'quanzhang', 'pengfeili', 'kellymeng',
-                'qianlong', 'kaipengxu', 'norazeng', 'colinxu', 'xiaojianxia', 'joeyxu',
-                'rouzhitang', 'cccpeng', 'jiajian'
-            ]
+            # 如果没有指定日期范围，默认查询最近7天（包含今天）
+            start_date_obj, end_date_obj = resolve_date_range(start_date, end_date)
             
-            # 如果没有指定日期范围，默认查询最近7天
-            if not end_date:
-                end_date = datetime.now().strftime('%Y-%m-%d')
-            
-            if not start_date:
-                end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
-                start_date_obj = end_date_obj - timedelta(days=6)  # 包含今天共7天
-                start_date = start_date_obj.strftime('%Y-%m-%d')
-            
-            # 计算日期范围
-            start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date()
-            end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
+            # 整个范围一次扫描，按天和是否项目组成员计数
+            counts = RangeEngine(self).count_by_day(start_date_obj, end_date_obj)
             
             results = []
-            current_date = start_date_obj
-            
-            while current_date <= end_date_obj:
-                next_date = current_date + timedelta(days=1)
-                
-                # 总查询数
-                total_sql = """
-                    SELECT COUNT(1) as count FROM t_handler_logs 
-                    WHERE create_time >= %s AND create_time < %s
-                """
-                total_result = self.execute_query(total_sql, (current_date.strftime('%Y-%m-%d'), next_date.strftime('%Y-%m-%d')))
-                total_count = total_result[0]['count'] if total_result else 0
-                
-                # 项目组查询数
-                member_sql = """
-                    SELECT COUNT(1) as count FROM t_handler_logs 
-                    WHERE create_time >= %s AND create_time < %s 
-                    AND user_id IN ({})
-                """.format(','.join(['%s'] * len(project_members)))
-                member_params = (current_date.strftime('%Y-%m-%d'), next_date.strftime('%Y-%m-%d')) + tuple(project_members)
-                member_result = self.execute_query(member_sql, member_params)
-                member_count = member_result[0]['count'] if member_result else 0
-                
-                # 非项目组查询数
-                non_member_sql = """
-                    SELECT COUNT(1) as count FROM t_handler_logs 
-                    WHERE create_time >= %s AND create_time < %s 
-                    AND (user_id NOT IN ({}) OR user_id IS NULL)
-                """.format(','.join(['%s'] * len(project_members)))
-                non_member_params = (current_date.strftime('%Y-%m-%d'), next_date.strftime('%Y-%m-%d')) + tuple(project_members)
-                non_member_result = self.execute_query(non_member_sql, non_member_params)
-                non_member_count = non_member_result[0]['count'] if non_member_result else 0
-                
+            for day in iter_days(start_date_obj, end_date_obj):
+                day_counts = counts.get((day,), {})
                 results.append({
-                    'date': current_date.strftime('%Y-%m-%d'),
-                    'total_count': total_count,
-                    'member_count': member_count,
-                    'non_member_count': non_member_count
+                    'date': day,
+                    'total_count': day_counts.get('count', 0),
+                    'member_count': day_counts.get('member_count', 0),
+                    'non_member_count': day_counts.get('non_member_count', 0)
                 })
-                
-                current_date += timedelta(days=1)
             
             return results
         except Exception as e:
@@ -1260,67 +1150,24 @@ class DatabaseManager:
     def get_date_range_step_trend(self, start_date: str = None, end_date: str = None) -> List[Dict[str, Any]]:
         """获取指定日期范围的各环节耗时趋势"""
         try:
-            # 如果没有指定日期范围，默认查询最近7天
-            if not end_date:
-                end_date = datetime.now().strftime('%Y-%m-%d')
+            # 如果没有指定日期范围，默认查询最近7天（包含今天）
+            start_date_obj, end_date_obj = resolve_date_range(start_date, end_date)
             
-            if not start_date:
-                end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
-                start_date_obj = end_date_obj - timedelta(days=6)  # 包含今天共7天
-                start_date = start_date_obj.strftime('%Y-%m-%d')
-            
-            # 计算日期范围
-            start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date()
-            end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
+            # 整个范围一次扫描，按天和环节计算平均耗时
+            averages = RangeEngine(self).step_avg_by_day(start_date_obj, end_date_obj, list(self.step_name_mapping))
             
             results = []
-            current_date = start_date_obj
-            
-            while current_date <= end_date_obj:
-                next_date = current_date + timedelta(days=1)
-                
+            for day in iter_days(start_date_obj, end_date_obj):
+                # 为每一天每个步骤都添加数据，没有数据时avg_cost为0
                 for step_name, step_name_cn in self.step_name_mapping.items():
-                    sql = f"""
-                        SELECT AVG(cost) as avg_cost 
-                        FROM t_step_time_record 
-                        WHERE create_time >= %s AND create_time < %s 
-                        AND step_name = %s
-                    """
-                    
-                    # 对特定步骤添加额外条件
-                    if step_name == 'QUERY_SCHEMA':
-                        sql += """ AND biz_seq NOT IN (
-                            SELECT biz_seq FROM t_handler_logs 
-                            WHERE create_time >= %s AND create_time < %s 
-                            AND req_info LIKE %s
-                        ) AND cost > 1000"""
-                        params = (current_date.strftime('%Y-%m-%d'), next_date.strftime('%Y-%m-%d'), step_name, current_date.strftime('%Y-%m-%d'), next_date.strftime('%Y-%m-%d'), '%HIVE%')
-                    elif step_name == 'SUB_QUERY':
-                        sql += """ AND biz_seq NOT IN (
-                            SELECT biz_seq FROM t_handler_logs 
-                            WHERE create_time >= %s AND create_time < %s 
-                            AND req_info LIKE %s
-                        )"""
-                        params = (current_date.strftime('%Y-%m-%d'), next_date.strftime('%Y-%m-%d'), step_name, current_date.strftime('%Y-%m-%d'), next_date.strftime('%Y-%m-%d'), '%HIVE%')
-                    else:
-                        params = (current_date.strftime('%Y-%m-%d'), next_date.strftime('%Y-%m-%d'), step_name)
-                    
-                    result = self.execute_query(sql, params)
-                    avg_cost = 0
-                    if result and result[0]['avg_cost'] is not None:
-                        avg_cost = round(float(result[0]['avg_cost']), 2)
-                    
-                    # 为每一天每个步骤都添加数据，没有数据时avg_cost为0
                     results.append({
-                        'date': current_date.strftime('%Y-%m-%d'),
+                        'date': day,
                         'step_name': step_name,
                         'step_name_cn': step_name_cn,
-                        'avg_cost': avg_cost
+                        'avg_cost': averages.get((day, step_name), 0)
                     })
-                
-                current_date += timedelta(days=1)
             
-            return sorted(results, key=lambda x: x['date'])
+            return results
         except Exception as e:
             logger.error(f"获取日期范围步骤趋势失败: {e}")
             raise e
@@ -1328,203 +1175,250 @@ class DatabaseManager:
     def get_date_range_channel_trend(self, start_date: str = None, end_date: str = None) -> List[Dict[str, Any]]:
         """获取指定日期范围的各渠道查询趋势（包含项目组和非项目组维度）"""
         try:
-            project_members = [
-                'qingyiluan', 'ruihu', 'syroalxiao', 'froggynie', 'xinxu', 'kuixu',
-                'liamyang', 'owenzhang', 'xinyinshu', 'weijiang', 'taojiang', 'eruditemao',
-                'dylanding', 'hongqinluo', 'mjyu', 'docwang', 'bowenduan', 'alexxliu',
-                'ivesxiong', 'xiweili', 'derekye', 'rawlinschen', 'tiantianhu', 'haoqunliu',
-                'penhuazhang', 'liangdonghu', 'rorozhang', 'quanzhang', 'pengfeili', 'kellymeng',
-                'qianlong', 'kaipengxu', 'norazeng', 'colinxu', 'xiaojianxia', 'joeyxu',
-                'rouzhitang', 'cccpeng', 'jiajian'
-            ]
-            
-            # 如果没有指定日期范围，默认查询最近7天
-            if not end_date:
-                end_date = datetime.now().strftime('%Y-%m-%d')
+            # 如果没有指定日期范围，默认查询最近7天（包含今天）
+            start_date_obj, end_date_obj = resolve_date_range(start_date, end_date)
             
-            if not start_date:
-                end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
-                start_date_obj = end_date_obj - timedelta(days=6)  # 包含今天共7天
-                start_date = start_date_obj.strftime('%Y-%m-%d')
-            
-            # 计算日期范围
-            start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date()
-            end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
+            # 整个范围一次扫描，按天、渠道和是否项目组成员计数
+            channel_counts = {}
+            for (day, channel), day_counts in RangeEngine(self).count_by_day(start_date_obj, end_date_obj, ['channel']).items():
+                item = channel_counts.setdefault((day, channel or '未知渠道'), {'count': 0, 'member_count': 0, 'non_member_count': 0})
+                for key, value in day_counts.items():
+                    item[key] += value
             
             results = []
-            current_date = start_date_obj
-            
-            while current_date <= end_date_obj:
-                next_date = current_date + timedelta(days=1)
-                
-                # 总查询数（按渠道）
-                sql_total = """
-                    SELECT channel, COUNT(1) as count 
-                    FROM t_handler_logs 
-                    WHERE create_time >= %s AND create_time < %s 
-                    GROUP BY channel
-                """
-                total_results = self.execute_query(sql_total, (current_date.strftime('%Y-%m-%d'), next_date.strftime('%Y-%m-%d')))
-                
-                # 项目组查询数（按渠道）
-                sql_member = f"""
-                    SELECT channel, COUNT(1) as count 
-                    FROM t_handler_logs 
-                    WHERE create_time >= %s AND create_time < %s 
-                    AND user_id IN ({', '.join(['%s'] * len(project_members))})
-                    GROUP BY channel
-                """
-                member_params = [current_date.strftime('%Y-%m-%d'), next_date.strftime('%Y-%m-%d')] + project_members
-                member_results = self.execute_query(sql_member, tuple(member_params))
-                
-                # 非项目组查询数（按渠道）
-                sql_non_member = f"""
-                    SELECT channel, COUNT(1) as count 
-                    FROM t_handler_logs 
-                    WHERE create_time >= %s AND create_time < %s 
-                    AND (user_id NOT IN ({', '.join(['%s'] * len(project_members))}) OR user_id IS NULL)
-                    GROUP BY channel
-                """
-                non_member_params = [current_date.strftime('%Y-%m-%d'), next_date.strftime('%Y-%m-%d')] + project_members
-                non_member_results = self.execute_query(sql_non_member, tuple(non_member_params))
-                
-                # 创建渠道数据映射
-                channel_data = {}
-                member_data = {}
-                non_member_data = {}
-                
-                # 处理总数
-                for result in total_results:
-                    channel = result['channel'] or '未知渠道'
-                    channel_data[channel] = result['count']
-                
-                # 处理项目组数据
-                for result in member_results:
-                    channel = result['channel'] or '未知渠道'
-                    member_data[channel] = result['count']
-                
-                # 处理非项目组数据
-                for result in non_member_results:
-                    channel = result['channel'] or '未知渠道'
-                    non_member_data[channel] = result['count']
-                
+            empty_counts = {'count': 0, 'member_count': 0, 'non_member_count': 0}
+            for day in iter_days(start_date_obj, end_date_obj):
                 # 为所有已知渠道生成数据，没有数据的渠道count为0
                 for channel, channel_name in self.channel_name_mapping.items():
                     results.append({
-                        'date': current_date.strftime('%Y-%m-%d'),
+                        'date': day,
                         'channel': channel,
                         'channel_name': channel_name,
-                        'count': channel_data.get(channel, 0),
-                        'member_count': member_data.get(channel, 0),
-                        'non_member_count': non_member_data.get(channel, 0)
+                        **channel_counts.get((day, channel), empty_counts)
                     })
                 
                 # 如果有未知渠道数据，也添加进去
-                if '未知渠道' in channel_data:
+                if (day, '未知渠道') in channel_counts:
                     results.append({
-                        'date': current_date.strftime('%Y-%m-%d'),
+                        'date': day,
                         'channel': '未知渠道',
                         'channel_name': '未知渠道',
-                        'count': channel_data.get('未知渠道', 0),
-                        'member_count': member_data.get('未知渠道', 0),
-                        'non_member_count': non_member_data.get('未知渠道', 0)
+                        **channel_counts[(day, '未知渠道')]
                     })
-                
-                current_date += timedelta(days=1)
             
-            return sorted(results, key=lambda x: x['date'])
+            return results
         except Exception as e:
             logger.error(f"获取日期范围渠道趋势失败: {e}")
             raise e
 
-    def get_agent_error_details(self, queryDate: str) -> Dict[str, Any]:
-        """获取Agent子系统错误明细数据 - 三层结构"""
+    def get_latency_percentiles(self, start_date: str = None, end_date: str = None,
+                                kind: str = 'step', percentiles: List[float] = None) -> Dict[str, Any]:
+        """
+        获取指定日期范围各环节（或各查询类别）的耗时分位数
+        合并每日汇总中保存的耗时草图得到，不读取原始耗时记录；尚未汇总的日期（如当天）列在missing_dates中
+        kind: step 环节 / template 模板查询 / non_template 非模板查询
+        percentiles: 百分位列表，默认[50, 90, 99]
+        """
         try:
-            next_date = datetime.strptime(queryDate, '%Y-%m-%d') + timedelta(days=1)
+            if kind not in LATENCY_SKETCH_KINDS:
+                raise ValueError(f"不支持的耗时类型: {kind}")
+            percentiles = normalize_percentiles(percentiles)
+            
+            # 如果没有指定日期范围，默认查询最近7天（包含今天）
+            start_date_obj, end_date_obj = resolve_date_range(start_date, end_date)
+            range_params = (start_date_obj.strftime('%Y-%m-%d'), end_date_obj.strftime('%Y-%m-%d'))
+            
+            rows = self.execute_query("""
+                SELECT name, sketch FROM t_daily_latency_sketch 
+                WHERE kind = %s AND stat_date >= %s AND stat_date <= %s 
+                ORDER BY name
+            """, (kind,) + range_params)
+            merged = {}
+            for row in rows:
+                sketch = DDSketch.from_json(row['sketch'])
+                if row['name'] not in merged:
+                    merged[row['name']] = DDSketch(sketch.relative_accuracy)
+                merged[row['name']].merge(sketch)
+            
+            rolled_up_dates = {
+                row['stat_date'].strftime('%Y-%m-%d') if isinstance(row['stat_date'], date) else str(row['stat_date'])
+                for row in self.execute_query(
+                    "SELECT stat_date FROM t_daily_rollup_status WHERE stat_date >= %s AND stat_date <= %s",
+                    range_params
+                )
+            }
             
-            # 获取所有Agent错误记录
-            sql = """
-                SELECT biz_seq, result_code, req_info, rsp_info, create_time
-                FROM t_handler_logs 
-                WHERE create_time >= %s AND create_time < %s
-                AND result_code NOT LIKE '%%0000' 
-                AND result_code LIKE 'B2DU%%'
-                ORDER BY create_time DESC
-            """
+            # 环节按定义顺序返回，查询类别按名称排序
+            if kind == 'step':
+                names = [name for name in self.step_name_mapping if name in merged]
+            else:
+                names = list(merged)
+            items = []
+            for name in names:
+                sketch = merged[name]
+                items.append({
+                    'name': name,
+                    'name_cn': self.step_name_mapping.get(name, name) if kind == 'step' else name,
+                    'count': sketch.count,
+                    'avg_cost': round(sketch.avg, 2) if sketch.count else None,
+                    'min_cost': sketch.min if sketch.count else None,
+                    'max_cost': sketch.max if sketch.count else None,
+                    'percentiles': sketch.quantiles(percentiles)
+                })
             
-            results = self.execute_query(sql, (queryDate, next_date.strftime('%Y-%m-%d')))
+            return {
+                'kind': kind,
+                'start_date': range_params[0],
+                'end_date': range_params[1],
+                'items': items,
+                'missing_dates': [
+                    day for day in iter_days(start_date_obj, end_date_obj) if day not in rolled_up_dates
+                ]
+            }
+        except Exception as e:
+            logger.error(f"获取耗时分位数失败: {e}")
+            raise e
+
+    def get_slow_requests(self, start_date: str = None, end_date: str = None, kind: str = 'template',
+                          name: str = None, limit: int = 50) -> Dict[str, Any]:
+        """
+        获取指定日期范围内各查询类别（或各环节）耗时最长的请求
+        已汇总的日期读取最慢请求索引t_daily_slow_request；当天尚未汇总，实时计算并列在computed_dates中，
+        其它尚未汇总的日期不实时计算（避免一次请求扫描多天的原始耗时记录），列在missing_dates中
+        kind: step 环节 / template 模板查询 / non_template 非模板查询
+        name: 查询类别或环节名称，为空时返回所有类别/环节
+        limit: 每个类别/环节返回的请求数，不超过slow_request_config.top_k
+        """
+        try:
+            if kind not in LATENCY_SKETCH_KINDS:
+                raise ValueError(f"不支持的耗时类型: {kind}")
+            if not 0 < limit <= slow_request_config.top_k:
+                raise ValueError(f"limit必须在1到{slow_request_config.top_k}之间: {limit}")
+            
+            # 如果没有指定日期范围，默认查询最近7天（包含今天）
+            start_date_obj, end_date_obj = resolve_date_range(start_date, end_date)
+            if start_date_obj > end_date_obj:
+                raise ValueError("开始日期不能晚于结束日期")
+            if (end_date_obj - start_date_obj).days + 1 > MAX_SLOW_REQUEST_DAYS:
+                raise ValueError(f"日期范围不能超过{MAX_SLOW_REQUEST_DAYS}天")
+            range_params = (start_date_obj.strftime('%Y-%m-%d'), end_date_obj.strftime('%Y-%m-%d'))
             
-            # 错误类型映射
-            business_error_types = {
-                '1': '用户输入信息缺失/错误',
-                '2': '用户权限问题'
+            sql = """
+                SELECT stat_date, name, biz_seq, cost FROM t_daily_slow_request 
+                WHERE kind = %s AND stat_date >= %s AND stat_date <= %s 
+            """
+            params = (kind,) + range_params
+            if name:
+                sql += " AND name = %s "
+                params += (name,)
+            sql += " ORDER BY cost DESC"
+            
+            # 每天的索引已是该天的top_k，合并后再取前limit个即为范围内的最慢请求
+            merged: Dict[str, TopK] = {}
+            def push(item_name: str, stat_date: str, biz_seq: str, cost: float):
+                if item_name not in merged:
+                    merged[item_name] = TopK(limit)
+                merged[item_name].push(float(cost), (stat_date, biz_seq))
+            
+            for row in self.execute_query(sql, params):
+                stat_date = row['stat_date'].strftime('%Y-%m-%d') if isinstance(row['stat_date'], date) else str(row['stat_date'])
+                push(row['name'], stat_date, row['biz_seq'], row['cost'])
+            
+            rolled_up_dates = {
+                row['stat_date'].strftime('%Y-%m-%d') if isinstance(row['stat_date'], date) else str(row['stat_date'])
+                for row in self.execute_query(
+                    "SELECT stat_date FROM t_daily_rollup_status WHERE stat_date >= %s AND stat_date <= %s",
+                    range_params
+                )
             }
+            today = date.today().strftime('%Y-%m-%d')
+            computed_dates = []
+            missing_dates = []
+            for day in iter_days(start_date_obj, min(end_date_obj, date.today())):
+                if day in rolled_up_dates:
+                    continue
+                if day != today:
+                    missing_dates.append(day)
+                    continue
+                slow_sink: Dict[str, TopK] = {}
+                if kind == 'step':
+                    self.compute_step_performance(day, slow_sink=slow_sink)
+                else:
+                    self._compute_query_performance(day, kind, None, None, slow_sink=slow_sink)
+                for item_name, slowest in slow_sink.items():
+                    if name and item_name != name:
+                        continue
+                    for cost, biz_seq in slowest.items()[:limit]:
+                        push(item_name, day, biz_seq, cost)
+                computed_dates.append(day)
+            
+            # 环节按定义顺序返回，查询类别按统计类别的顺序返回
+            if kind == 'step':
+                names = [step_name for step_name in self.step_name_mapping if step_name in merged]
+            else:
+                names = [category['category'] for category in PERFORMANCE_CATEGORIES if category['category'] in merged]
+            items = []
+            for item_name in names:
+                items.append({
+                    'name': item_name,
+                    'name_cn': self.step_name_mapping.get(item_name, item_name) if kind == 'step' else item_name,
+                    'slowest': [
+                        {'stat_date': stat_date, 'biz_seq': biz_seq, 'cost': round(cost, 2)}
+                        for cost, (stat_date, biz_seq) in merged[item_name].items()
+                    ]
+                })
             
-            system_error_types = {
-                '3': '服务调用错误',
-                '4': '数据访问错误',
-                '9': '服务端发生了未预期的内部异常'
+            return {
+                'kind': kind,
+                'start_date': range_params[0],
+                'end_date': range_params[1],
+                'limit': limit,
+                'items': items,
+                'computed_dates': computed_dates,
+                'missing_dates': missing_dates
             }
+        except Exception as e:
+            logger.error(f"获取最慢请求失败: {e}")
+            raise e
+
+    def get_agent_error_details(self, queryDate: str) -> Dict[str, Any]:
+        """
+        获取Agent子系统错误明细数据 - 错误类型 → 错误码分组的计数
+        只在数据库中按第7位和后四位分组计数，分组内的请求明细通过get_error_detail_page分页读取
+        错误类型和错误码分组的顺序与逐条读取时一致：按最近一次出现的时间倒序
+        """
+        try:
+            next_date = datetime.strptime(queryDate, '%Y-%m-%d') + timedelta(days=1)
+            
+            sql = f"""
+                SELECT SUBSTRING(result_code, 7, 1) AS error_type, RIGHT(result_code, 4) AS code, COUNT(1) AS count,
+                       MAX(create_time) AS latest_time
+                FROM t_handler_logs 
+                WHERE create_time >= %s AND create_time < %s
+                AND {SUBSYSTEM_CONDITIONS['agent']}
+                GROUP BY error_type, code
+                ORDER BY latest_time DESC
+            """
+            rows = self.execute_query(sql, (queryDate, next_date.strftime('%Y-%m-%d')))
             
             # 分类统计
             business_errors = {}
             system_errors = {}
-            
-            for record in results:
-                result_code = record.get('result_code', '')
-                if len(result_code) >= 7:
-                    error_type = result_code[6]  # 第7位（索引6）
-                    last_four = result_code[-4:]  # 后四位
-                    
-                    error_data = {
-                        'biz_seq': record.get('biz_seq'),
-                        'result_code': result_code,
-                        'req_info': record.get('req_info'),
-                        'rsp_info': record.get('rsp_info'),
-                        'create_time': record.get('create_time').strftime('%Y-%m-%d %H:%M:%S') if record.get('create_time') else None
+            for row in rows:
+                error_type = row['error_type']
+                # 判断是业务错误还是系统错误
+                if error_type in AGENT_BUSINESS_ERROR_TYPES:
+                    errors, type_names = business_errors, AGENT_BUSINESS_ERROR_TYPES
+                else:
+                    errors, type_names = system_errors, AGENT_SYSTEM_ERROR_TYPES
+                if error_type not in errors:
+                    errors[error_type] = {
+                        'type_name': type_names.get(error_type, f'未知错误类型{error_type}'),
+                        'count': 0,
+                        'code_groups': []
                     }
-                    
-                    # 判断是业务错误还是系统错误
-                    if error_type in ['1', '2']:
-                        # 业务错误
-                        if error_type not in business_errors:
-                            business_errors[error_type] = {
-                                'type_name': business_error_types.get(error_type, f'未知错误类型{error_type}'),
-                                'count': 0,
-                                'code_groups': {}
-                            }
-                        
-                        business_errors[error_type]['count'] += 1
-                        
-                        if last_four not in business_errors[error_type]['code_groups']:
-                            business_errors[error_type]['code_groups'][last_four] = {
-                                'code': last_four,
-                                'count': 0,
-                                'details': []
-                            }
-                        
-                        business_errors[error_type]['code_groups'][last_four]['count'] += 1
-                        business_errors[error_type]['code_groups'][last_four]['details'].append(error_data)
-                    else:
-                        # 系统错误
-                        if error_type not in system_errors:
-                            system_errors[error_type] = {
-                                'type_name': system_error_types.get(error_type, f'未知错误类型{error_type}'),
-                                'count': 0,
-                                'code_groups': {}
-                            }
-                        
-                        system_errors[error_type]['count'] += 1
-                        
-                        if last_four not in system_errors[error_type]['code_groups']:
-                            system_errors[error_type]['code_groups'][last_four] = {
-                                'code': last_four,
-                                'count': 0,
-                                'details': []
-                            }
-                        
-                        system_errors[error_type]['code_groups'][last_four]['count'] += 1
-                        system_errors[error_type]['code_groups'][last_four]['details'].append(error_data)
+                errors[error_type]['count'] += row['count']
+                errors[error_type]['code_groups'].append({'code': row['code'], 'count': row['count']})
             
             # 转换为列表格式
             business_error_list = [
@@ -1532,7 +1426,7 @@ class DatabaseManager:
                     'error_type': key,
                     'type_name': value['type_name'],
                     'count': value['count'],
-                    'code_groups': list(value['code_groups'].values())
+                    'code_groups': value['code_groups']
                 }
                 for key, value in business_errors.items()
             ]
@@ -1542,7 +1436,7 @@ class DatabaseManager:
                     'error_type': key,
                     'type_name': value['type_name'],
                     'count': value['count'],
-                    'code_groups': list(value['code_groups'].values())
+                    'code_groups': value['code_groups']
                 }
                 for key, value in system_errors.items()
             ]
@@ -1561,109 +1455,45 @@ class DatabaseManager:
     
     def get_ds_error_details(self, queryDate: str) -> Dict[str, Any]:
         """
-        获取DS子系统错误明细数据
+        获取DS子系统错误明细数据 - 错误码分组的计数
         
         DS子系统错误判断规则：
         1. result_code是8位，前4位是"2030"，后4位不是"0000" -> DS子系统错误
         2. result_code不是8位 -> 也是DS子系统错误（系统错误）
         
         业务错误vs系统错误：
-        - 后4位在business_error_codes中 -> 业务错误
+        - 后4位在DS_BUSINESS_ERROR_CODES中 -> 业务错误
         - 否则 -> 系统错误（统一为"其他错误"）
+        
+        分组内的请求明细通过get_error_detail_page分页读取
         """
         try:
             next_date = datetime.strptime(queryDate, '%Y-%m-%d') + timedelta(days=1)
             
-            # 获取所有可能的DS错误记录
-            # 条件：result_code前4位是2030，且后4位不是0000
-            # 或者result_code不是8位（异常情况）
-            sql = """
-                SELECT biz_seq, result_code, req_info, rsp_info, create_time
+            sql = f"""
+                SELECT CASE WHEN CHAR_LENGTH(result_code) = 8 THEN RIGHT(result_code, 4) ELSE '' END AS code, 
+                       COUNT(1) AS count
                 FROM t_handler_logs 
                 WHERE create_time >= %s AND create_time < %s
-                AND (
-                    (LENGTH(result_code) = 8 AND LEFT(result_code, 4) = '2030' AND RIGHT(result_code, 4) != '0000')
-                    OR (LENGTH(result_code) != 8 AND result_code IS NOT NULL AND result_code != '')
-                )
-                ORDER BY create_time DESC
+                AND {SUBSYSTEM_CONDITIONS['ds']}
+                GROUP BY code
             """
-            
-            results = self.execute_query(sql, (queryDate, next_date.strftime('%Y-%m-%d')))
-            
-            # DS的业务错误码映射
-            business_error_codes = {
-                '0001': '参数错误',
-                '0101': '请求aomp异常',
-                '0103': '验签失败',
-                '1001': '查询元数据信息异常',
-                '1002': '用户没有对应子系统权限',
-                '1003': 'dbName输入错误',
-                '1004': 'DCN信息为空，请排查子系统是否接入AOMP',
-                '1006': 'DCN不为异地备',
-                '1007': 'dcn输入错误',
-                '1008': '查询出的IDC信息为空，请排查子系统是否接入AOMP',
-                '1009': 'IDC输入错误',
-                '2001': '提交SQL执行异常',
-                '2002': '解析sql中的表名发送异常',
-                '3001': 'AOMP返回结果为空',
-                '3002': 'SQL执行超时'
-            }
+            rows = self.execute_query(sql, (queryDate, next_date.strftime('%Y-%m-%d')))
             
             # 分类统计
             business_errors = {}
             system_errors = {}
-            
-            for record in results:
-                result_code = record.get('result_code', '')
-                
-                error_data = {
-                    'biz_seq': record.get('biz_seq'),
-                    'result_code': result_code,
-                    'req_info': record.get('req_info'),
-                    'rsp_info': record.get('rsp_info'),
-                    'create_time': record.get('create_time').strftime('%Y-%m-%d %H:%M:%S') if record.get('create_time') else None
-                }
-                
-                # 判断是业务错误还是系统错误
-                if len(result_code) == 8:
-                    # 8位result_code，取后4位判断
-                    last_four = result_code[-4:]
-                    
-                    if last_four in business_error_codes:
-                        # 业务错误 - 按后四位分组
-                        if last_four not in business_errors:
-                            business_errors[last_four] = {
-                                'code': last_four,
-                                'code_name': business_error_codes[last_four],
-                                'count': 0,
-                                'details': []
-                            }
-                        business_errors[last_four]['count'] += 1
-                        business_errors[last_four]['details'].append(error_data)
-                    else:
-                        # 系统错误 - 统一为"其他错误"
-                        code_key = '9999'
-                        if code_key not in system_errors:
-                            system_errors[code_key] = {
-                                'code': code_key,
-                                'code_name': '其他错误',
-                                'count': 0,
-                                'details': []
-                            }
-                        system_errors[code_key]['count'] += 1
-                        system_errors[code_key]['details'].append(error_data)
+            for row in rows:
+                code = row['code']
+                if code in DS_BUSINESS_ERROR_CODES:
+                    # 业务错误 - 按后四位分组
+                    errors, code_name = business_errors, DS_BUSINESS_ERROR_CODES[code]
                 else:
-                    # 非8位result_code，也是系统错误，统一为"其他错误"
-                    code_key = '9999'
-                    if code_key not in system_errors:
-                        system_errors[code_key] = {
-                            'code': code_key,
-                            'code_name': '其他错误',
-                            'count': 0,
-                            'details': []
-                        }
-                    system_errors[code_key]['count'] += 1
-                    system_errors[code_key]['details'].append(error_data)
+                    # 系统错误（包括非8位result_code）- 统一为"其他错误"
+                    errors, code, code_name = system_errors, DS_OTHER_ERROR_CODE, '其他错误'
+                if code not in errors:
+                    errors[code] = {'code': code, 'code_name': code_name, 'count': 0}
+                errors[code]['count'] += row['count']
             
             # 转换为列表格式并排序
             business_error_list = sorted(
@@ -1690,83 +1520,318 @@ class DatabaseManager:
             logger.error(f"获取DS错误明细失败: {e}")
             raise e
 
-    def get_user_retention_stats(self, queryDate: str) -> Dict[str, Any]:
-        """获取用户留存率统计"""
+    def get_error_detail_page(self, queryDate: str, subsystem: str, code: str, error_type: str = None,
+                              cursor: str = None, limit: int = None) -> Dict[str, Any]:
+        """
+        分页获取一个错误码分组的请求明细（按create_time、id倒序）
+        subsystem: agent / ds；Agent分组由error_type（第7位）和code（后四位）确定，DS分组由code确定
+        cursor: 上一页返回的next_cursor，为空时从最新的记录开始
+        每条记录只返回请求/响应的截断预览，完整内容通过get_error_detail按id获取
+        """
         try:
-            date_obj = datetime.strptime(queryDate, '%Y-%m-%d').date()
-            
-            # 计算7日留存率
-            d0_date_7 = date_obj - timedelta(days=7)
-            d0_next_7 = d0_date_7 + timedelta(days=1)
+            limit = limit or error_detail_config.page_size
+            if not isinstance(limit, int) or isinstance(limit, bool) or not 0 < limit <= error_detail_config.max_page_size:
+                raise ValueError(f"limit必须是1到{error_detail_config.max_page_size}之间的整数")
+            condition, condition_params = group_condition(subsystem, code, error_type)
+            next_date = datetime.strptime(queryDate, '%Y-%m-%d') + timedelta(days=1)
             
-            # D0用户（7天前活跃的用户）
-            d0_users_7_sql = """
-                SELECT DISTINCT user_id
-                FROM t_handler_logs
-                WHERE DATE(create_time) >= %s AND DATE(create_time) < %s
-                AND user_id IS NOT NULL
+            sql = f"""
+                SELECT id, biz_seq, result_code, create_time, req_info, rsp_info
+                FROM t_handler_logs 
+                WHERE create_time >= %s AND create_time < %s
+                AND {SUBSYSTEM_CONDITIONS[subsystem]}
+                AND {condition}
             """
-            d0_users_7 = self.execute_query(d0_users_7_sql, (d0_date_7.strftime('%Y-%m-%d'), d0_next_7.strftime('%Y-%m-%d')))
-            d0_count_7 = len(d0_users_7)
-            
-            # D7用户（今天活跃的用户，且在7天前也活跃）
-            if d0_count_7 > 0:
-                d0_user_ids_7 = [u['user_id'] for u in d0_users_7]
-                placeholders_7 = ', '.join(['%s'] * len(d0_user_ids_7))
-                d7_users_sql = f"""
-                    SELECT DISTINCT user_id
-                    FROM t_handler_logs
-                    WHERE DATE(create_time) = %s
-                    AND user_id IN ({placeholders_7})
-                """
-                d7_users = self.execute_query(d7_users_sql, tuple([queryDate] + d0_user_ids_7))
-                d7_count = len(d7_users)
-                day7_retention = round(d7_count * 100.0 / d0_count_7, 2) if d0_count_7 > 0 else 0
+            params = [queryDate, next_date.strftime('%Y-%m-%d')] + condition_params
+            # 同一biz_seq有多条日志，create_time相同时按id排序
+            if cursor:
+                cursor_time, cursor_id = decode_cursor(cursor)
+                sql += " AND (create_time < %s OR (create_time = %s AND id < %s)) "
+                params += [cursor_time, cursor_time, cursor_id]
+            # 多读一条判断是否还有下一页
+            sql += " ORDER BY create_time DESC, id DESC LIMIT %s"
+            params.append(limit + 1)
+            rows = self.execute_query(sql, tuple(params))
+            
+            has_more = len(rows) > limit
+            rows = rows[:limit]
+            length = error_detail_config.preview_length
+            details = [
+                {
+                    'id': row['id'],
+                    'biz_seq': row['biz_seq'],
+                    'result_code': row['result_code'],
+                    'create_time': row['create_time'].strftime('%Y-%m-%d %H:%M:%S') if row['create_time'] else None,
+                    'req_preview': preview(row['req_info'], 'query', length),
+                    'rsp_preview': preview(row['rsp_info'], 'queryRsp', length)
+                }
+                for row in rows
+            ]
+            
+            return {
+                'queryDate': queryDate,
+                'subsystem': subsystem,
+                'error_type': error_type,
+                'code': code,
+                'details': details,
+                'next_cursor': encode_cursor(rows[-1]['create_time'], rows[-1]['id']) if has_more else None
+            }
+        except Exception as e:
+            logger.error(f"获取错误明细分页失败: {e}")
+            raise e
+
+    def get_error_signatures(self, queryDate: str, subsystem: str, code: str = None, error_type: str = None,
+                             limit: int = None) -> Dict[str, Any]:
+        """
+        获取错误消息签名：按result_code汇总，每个签名返回消息模板、错误数和一条示例请求
+        code/error_type与get_error_detail_page相同，为空时返回子系统的全部错误
+        label_job已累计签名的日期读取t_error_signature（未完成的日期合并标签位置之后的日志），
+        否则流式读取当天的错误日志计算
+        """
+        try:
+            limit = limit or error_detail_config.page_size
+            if not isinstance(limit, int) or isinstance(limit, bool) or not 0 < limit <= error_detail_config.max_page_size:
+                raise ValueError(f"limit必须是1到{error_detail_config.max_page_size}之间的整数")
+            if code:
+                condition, condition_params = group_condition(subsystem, code, error_type)
+            elif subsystem in SUBSYSTEM_CONDITIONS:
+                condition, condition_params = "1 = 1", []
             else:
-                d7_count = 0
-                day7_retention = 0
-            
-            # 计算15日留存率
-            d0_date_15 = date_obj - timedelta(days=15)
-            d0_next_15 = d0_date_15 + timedelta(days=1)
-            
-            # D0用户（15天前活跃的用户）
-            d0_users_15_sql = """
-                SELECT DISTINCT user_id
-                FROM t_handler_logs
-                WHERE DATE(create_time) >= %s AND DATE(create_time) < %s
-                AND user_id IS NOT NULL
-            """
-            d0_users_15 = self.execute_query(d0_users_15_sql, (d0_date_15.strftime('%Y-%m-%d'), d0_next_15.strftime('%Y-%m-%d')))
-            d0_count_15 = len(d0_users_15)
-            
-            # D15用户（今天活跃的用户，且在15天前也活跃）
-            if d0_count_15 > 0:
-                d0_user_ids_15 = [u['user_id'] for u in d0_users_15]
-                placeholders_15 = ', '.join(['%s'] * len(d0_user_ids_15))
-                d15_users_sql = f"""
-                    SELECT DISTINCT user_id
-                    FROM t_handler_logs
-                    WHERE DATE(create_time) = %s
-                    AND user_id IN ({placeholders_15})
+                raise ValueError(f"不支持的子系统: {subsystem}")
+            next_date = datetime.strptime(queryDate, '%Y-%m-%d') + timedelta(days=1)
+            
+            counter = SignatureCounter()
+            status = self.execute_query("""
+                SELECT l.watermark_time, l.watermark_id, l.completed 
+                FROM t_request_label_status l 
+                JOIN t_error_signature_status s ON s.stat_date = l.stat_date 
+                WHERE l.stat_date = %s
+            """, (queryDate,))
+            if status:
+                rows = self.execute_query("""
+                    SELECT subsystem, result_code, signature, template, count, 
+                           exemplar_biz_seq, exemplar_message, first_seen, last_seen 
+                    FROM t_error_signature 
+                    WHERE stat_date = %s AND subsystem = %s
+                """, (queryDate, subsystem))
+                for row in rows:
+                    if not code or in_group(subsystem, row['result_code'], code, error_type):
+                        counter.merge_entry(row)
+            
+            # 没有累计签名的日期读取全天，未完成的日期读取标签位置之后的日志
+            if not status or not status[0]['completed']:
+                sql = f"""
+                    SELECT biz_seq, result_code, create_time, rsp_info 
+                    FROM t_handler_logs 
+                    WHERE create_time >= %s AND create_time < %s
+                    AND {SUBSYSTEM_CONDITIONS[subsystem]}
+                    AND {condition}
                 """
-                d15_users = self.execute_query(d15_users_sql, tuple([queryDate] + d0_user_ids_15))
-                d15_count = len(d15_users)
-                day15_retention = round(d15_count * 100.0 / d0_count_15, 2) if d0_count_15 > 0 else 0
+                params = [queryDate, next_date.strftime('%Y-%m-%d')] + condition_params
+                if status and status[0]['watermark_time'] is not None:
+                    sql += " AND (create_time > %s OR (create_time = %s AND id > %s)) "
+                    params += [status[0]['watermark_time'], status[0]['watermark_time'], status[0]['watermark_id'] or 0]
+                for records in self.execute_query_stream(sql, tuple(params)):
+                    for record in records:
+                        counter.add(record['result_code'], record['biz_seq'], record['create_time'],
+                                    record['rsp_info'], subsystems=(subsystem,))
+            
+            result_codes = group_by_result_code(counter.values(), limit)
+            return {
+                'queryDate': queryDate,
+                'subsystem': subsystem,
+                'error_type': error_type,
+                'code': code,
+                'total_count': sum(group['count'] for group in result_codes),
+                'signature_count': sum(group['signature_count'] for group in result_codes),
+                'result_codes': result_codes
+            }
+        except Exception as e:
+            logger.error(f"获取错误签名失败: {e}")
+            raise e
+
+    def get_error_detail(self, biz_seq: str = None, log_id: int = None, subsystem: str = None) -> Dict[str, Any]:
+        """
+        获取错误请求的完整req_info/rsp_info
+        log_id: 分页明细中的id，指定时直接按id读取
+        biz_seq: 没有id时（如错误签名的示例请求）按业务流水号读取；同一biz_seq有多条日志，
+        只读取错误日志（subsystem为空时为任一子系统的错误），取最早的一条
+        """
+        try:
+            if log_id is not None:
+                rows = self.execute_query("""
+                    SELECT id, biz_seq, result_code, create_time, req_info, rsp_info 
+                    FROM t_handler_logs 
+                    WHERE id = %s
+                """, (log_id,))
+            elif biz_seq:
+                if subsystem is None:
+                    condition = ' OR '.join(f"({sql})" for sql in SUBSYSTEM_CONDITIONS.values())
+                elif subsystem in SUBSYSTEM_CONDITIONS:
+                    condition = SUBSYSTEM_CONDITIONS[subsystem]
+                else:
+                    raise ValueError(f"不支持的子系统: {subsystem}")
+                rows = self.execute_query(f"""
+                    SELECT id, biz_seq, result_code, create_time, req_info, rsp_info 
+                    FROM t_handler_logs 
+                    WHERE biz_seq = %s
+                    AND ({condition})
+                    ORDER BY create_time, id
+                    LIMIT 1
+                """, (biz_seq,))
             else:
-                d15_count = 0
-                day15_retention = 0
+                raise ValueError("缺少id或bizSeq参数")
+            if not rows:
+                return {'id': log_id, 'biz_seq': biz_seq, 'found': False}
+            row = rows[0]
+            return {
+                'id': row['id'],
+                'biz_seq': row['biz_seq'],
+                'found': True,
+                'result_code': row['result_code'],
+                'create_time': row['create_time'].strftime('%Y-%m-%d %H:%M:%S') if row['create_time'] else None,
+                'req_info': row['req_info'],
+                'rsp_info': row['rsp_info']
+            }
+        except Exception as e:
+            logger.error(f"获取错误请求详情失败: {e}")
+            raise e
+
+    def _get_day_bitmaps(self, days: List[str]) -> Dict[str, UserBitmap]:
+        """
+        获取各日期的活跃用户位图（不包括未来的日期）
+        已完成的日期直接读取t_daily_user_bitmap；未完成的日期（如当天）在保存的位图上合并位置之后的日志；
+        没有位图的日期从原始日志生成（字典中没有的用户使用临时编号）
+        """
+        today = date.today().strftime('%Y-%m-%d')
+        days = sorted(day for day in set(days) if day <= today)
+        if not days:
+            return {}
+        
+        stored = {}
+        for row in self.execute_query("""
+            SELECT stat_date, bitmap, watermark_time, completed 
+            FROM t_daily_user_bitmap 
+            WHERE stat_date >= %s AND stat_date <= %s
+        """, (days[0], days[-1])):
+            day = row['stat_date'].strftime('%Y-%m-%d') if isinstance(row['stat_date'], date) else str(row['stat_date'])
+            stored[day] = (UserBitmap.from_bytes(row['bitmap']), row['watermark_time'], row['completed'])
+        
+        # 字典在读取位图之后加载，临时编号从所有位图中最大的编号之后开始
+        index = UserIndex(self.execute_query("SELECT user_no, user_id FROM t_user_dict"))
+        for bitmap, _, _ in stored.values():
+            index.reserve(bitmap.max_user_no())
+        
+        bitmaps = {}
+        for day in days:
+            bitmap, watermark_time, completed = stored.get(day, (UserBitmap(), None, False))
+            if completed:
+                bitmaps[day] = bitmap
+                continue
+            day_start = datetime.strptime(day, '%Y-%m-%d')
+            user_ids = self.execute_query_columns("""
+                SELECT DISTINCT user_id FROM t_handler_logs 
+                WHERE create_time >= %s AND create_time < %s 
+                AND user_id IS NOT NULL
+            """, (watermark_time or day_start, day_start + timedelta(days=1))).get('user_id', [])
+            bitmaps[day] = bitmap | index.bitmap(user_ids)
+        return bitmaps
+
+    def get_n_day_retention(self, queryDate: str, days: List[int] = None) -> Dict[str, Any]:
+        """
+        获取N日留存率：N天前（D0）活跃的用户中，queryDate当天仍活跃的比例
+        days: 留存天数列表，默认[1, 7, 15, 30]
+        """
+        try:
+            days = days or [1, 7, 15, 30]
+            for n in days:
+                if not isinstance(n, int) or isinstance(n, bool) or not 0 < n <= MAX_RETENTION_DAYS:
+                    raise ValueError(f"留存天数必须是1到{MAX_RETENTION_DAYS}之间的整数: {n}")
+            date_obj = datetime.strptime(queryDate, '%Y-%m-%d').date()
+            d0_dates = {n: (date_obj - timedelta(days=n)).strftime('%Y-%m-%d') for n in days}
+            bitmaps = self._get_day_bitmaps([queryDate] + list(d0_dates.values()))
+            active = bitmaps.get(queryDate, UserBitmap())
+            
+            items = []
+            for n in days:
+                d0_users = bitmaps.get(d0_dates[n], UserBitmap())
+                d0_count = d0_users.count()
+                retained = (d0_users & active).count()
+                items.append({
+                    'days': n,
+                    'd0_date': d0_dates[n],
+                    'd0_users': d0_count,
+                    'retained': retained,
+                    'retention_rate': retention_rate(retained, d0_count)
+                })
+            return {'queryDate': queryDate, 'items': items}
+        except Exception as e:
+            logger.error(f"获取N日留存率失败: {e}")
+            raise e
+
+    def get_retention_matrix(self, start_date: str = None, end_date: str = None, max_offset: int = 30) -> Dict[str, Any]:
+        """
+        获取同期群留存矩阵：每个同期群（start_date到end_date中的每一天的活跃用户）在之后第1到max_offset天仍活跃的人数和比例
+        未到的日期不返回
+        """
+        try:
+            if not isinstance(max_offset, int) or isinstance(max_offset, bool) or not 0 < max_offset <= MAX_RETENTION_DAYS:
+                raise ValueError(f"maxOffset必须是1到{MAX_RETENTION_DAYS}之间的整数: {max_offset}")
+            # 如果没有指定日期范围，默认查询最近7天（包含今天）
+            start_date_obj, end_date_obj = resolve_date_range(start_date, end_date)
+            if (end_date_obj - start_date_obj).days + 1 > MAX_RETENTION_DAYS:
+                raise ValueError(f"同期群日期范围不能超过{MAX_RETENTION_DAYS}天")
+            bitmaps = self._get_day_bitmaps(iter_days(start_date_obj, end_date_obj + timedelta(days=max_offset)))
+            
+            cohorts = []
+            for cohort_date in iter_days(start_date_obj, end_date_obj):
+                if cohort_date not in bitmaps:
+                    continue
+                cohort = bitmaps[cohort_date]
+                cohort_count = cohort.count()
+                cohort_obj = datetime.strptime(cohort_date, '%Y-%m-%d').date()
+                retention = []
+                for offset in range(1, max_offset + 1):
+                    day = (cohort_obj + timedelta(days=offset)).strftime('%Y-%m-%d')
+                    if day not in bitmaps:
+                        break
+                    retained = (cohort & bitmaps[day]).count()
+                    retention.append({
+                        'offset': offset,
+                        'date': day,
+                        'retained': retained,
+                        'retention_rate': retention_rate(retained, cohort_count)
+                    })
+                cohorts.append({
+                    'cohort_date': cohort_date,
+                    'users': cohort_count,
+                    'retention': retention
+                })
             
+            return {
+                'start_date': start_date_obj.strftime('%Y-%m-%d'),
+                'end_date': end_date_obj.strftime('%Y-%m-%d'),
+                'max_offset': max_offset,
+                'cohorts': cohorts
+            }
+        except Exception as e:
+            logger.error(f"获取留存矩阵失败: {e}")
+            raise e
+
+    def get_user_retention_stats(self, queryDate: str) -> Dict[str, Any]:
+        """获取用户留存率统计（7日和15日留存，由活跃用户位图计算）"""
+        try:
+            day7, day15 = self.get_n_day_retention(queryDate, [7, 15])['items']
             return {
                 'day7_retention': {
-                    'd0_users': d0_count_7,
-                    'd7_retained': d7_count,
-                    'retention_rate': day7_retention
+                    'd0_users': day7['d0_users'],
+                    'd7_retained': day7['retained'],
+                    'retention_rate': day7['retention_rate']
                 },
                 'day15_retention': {
-                    'd0_users': d0_count_15,
-                    'd15_retained': d15_count,
-                    'retention_rate': day15_retention
+                    'd0_users': day15['d0_users'],
+                    'd15_retained': day15['retained'],
+                    'retention_rate': day15['retention_rate']
                 },
                 'queryDate': queryDate
             }
@@ -1774,110 +1839,188 @@ class DatabaseManager:
             logger.error(f"获取用户留存率统计失败: {e}")
             raise e
     
-    def get_churned_users(self, queryDate: str) -> Dict[str, Any]:
-        """获取流失用户列表"""
+    def get_churned_users(self, queryDate: str, days: List[int] = None) -> Dict[str, Any]:
+        """
+        获取流失用户列表：最近活跃日期早于 queryDate - N 天的用户
+        days: 未活跃天数阈值列表，默认[7, 15]，结果键为churned_{N}_days
+        用户活跃汇总（t_user_activity_summary）已初始化时，所有阈值只需要一次按last_seen的索引范围查询，
+        汇总位置之后有请求的用户不计为流失；未初始化时按user_id分组扫描一次原始日志
+        """
         try:
+            days = days or [7, 15]
+            for n in days:
+                if not isinstance(n, int) or isinstance(n, bool) or not 0 < n <= MAX_RETENTION_DAYS:
+                    raise ValueError(f"未活跃天数必须是1到{MAX_RETENTION_DAYS}之间的整数: {n}")
             date_obj = datetime.strptime(queryDate, '%Y-%m-%d').date()
-            
-            # 7日流失用户：7天前有活跃，但最近7天没有活跃
-            seven_days_ago = date_obj - timedelta(days=7)
-            
-            # 找出7天前有活跃的所有用户
-            users_before_7_sql = """
-                SELECT DISTINCT user_id
-                FROM t_handler_logs
-                WHERE DATE(create_time) < %s
-                AND user_id IS NOT NULL
-            """
-            users_before_7 = self.execute_query(users_before_7_sql, (seven_days_ago.strftime('%Y-%m-%d'),))
-            
-            # 找出最近7天有活跃的用户
-            users_recent_7_sql = """
-                SELECT DISTINCT user_id
-                FROM t_handler_logs
-                WHERE DATE(create_time) >= %s AND DATE(create_time) <= %s
-                AND user_id IS NOT NULL
-            """
-            users_recent_7 = self.execute_query(users_recent_7_sql, (seven_days_ago.strftime('%Y-%m-%d'), queryDate))
-            
-            # 计算差集：之前有但最近7天没有的
-            recent_7_user_ids = set([u['user_id'] for u in users_recent_7])
-            churned_7_users = []
-            for user in users_before_7:
-                if user['user_id'] not in recent_7_user_ids:
-                    # 获取该用户最后一次活跃时间
-                    last_active_sql = """
-                        SELECT MAX(DATE(create_time)) as last_active_date,
-                               COUNT(1) as total_queries
-                        FROM t_handler_logs
-                        WHERE user_id = %s
-                    """
-                    last_active = self.execute_query(last_active_sql, (user['user_id'],))
-                    churned_7_users.append({
-                        'user_id': user['user_id'],
-                        'last_active_date': last_active[0]['last_active_date'].strftime('%Y-%m-%d') if last_active[0]['last_active_date'] else None,
-                        'total_queries': last_active[0]['total_queries'],
-                        'days_inactive': (date_obj - last_active[0]['last_active_date']).days if last_active[0]['last_active_date'] else None
-                    })
-            
-            # 15日流失用户：15天前有活跃，但最近15天没有活跃
-            fifteen_days_ago = date_obj - timedelta(days=15)
-            
-            # 找出15天前有活跃的所有用户
-            users_before_15_sql = """
-                SELECT DISTINCT user_id
-                FROM t_handler_logs
-                WHERE DATE(create_time) < %s
-                AND user_id IS NOT NULL
-            """
-            users_before_15 = self.execute_query(users_before_15_sql, (fifteen_days_ago.strftime('%Y-%m-%d'),))
-            
-            # 找出最近15天有活跃的用户
-            users_recent_15_sql = """
-                SELECT DISTINCT user_id
-                FROM t_handler_logs
-                WHERE DATE(create_time) >= %s AND DATE(create_time) <= %s
-                AND user_id IS NOT NULL
-            """
-            users_recent_15 = self.execute_query(users_recent_15_sql, (fifteen_days_ago.strftime('%Y-%m-%d'), queryDate))
-            
-            # 计算差集：之前有但最近15天没有的
-            recent_15_user_ids = set([u['user_id'] for u in users_recent_15])
-            churned_15_users = []
-            for user in users_before_15:
-                if user['user_id'] not in recent_15_user_ids:
-                    # 获取该用户最后一次活跃时间
-                    last_active_sql = """
-                        SELECT MAX(DATE(create_time)) as last_active_date,
-                               COUNT(1) as total_queries
-                        FROM t_handler_logs
-                        WHERE user_id = %s
-                    """
-                    last_active = self.execute_query(last_active_sql, (user['user_id'],))
-                    churned_15_users.append({
-                        'user_id': user['user_id'],
-                        'last_active_date': last_active[0]['last_active_date'].strftime('%Y-%m-%d') if last_active[0]['last_active_date'] else None,
-                        'total_queries': last_active[0]['total_queries'],
-                        'days_inactive': (date_obj - last_active[0]['last_active_date']).days if last_active[0]['last_active_date'] else None
-                    })
-            
+            # 最小阈值对应最晚的截止日期，其它阈值的用户是它的子集
+            latest_cutoff = date_obj - timedelta(days=min(days))
+
+            watermark = self.execute_query(
+                "SELECT watermark_time FROM t_activity_watermark WHERE name = %s",
+                ('user_activity_summary',)
+            )
+            if watermark:
+                candidates = self.execute_query("""
+                    SELECT user_id, last_seen AS last_active, total_queries, channel_counts
+                    FROM t_user_activity_summary
+                    WHERE last_seen < %s
+                    ORDER BY last_seen
+                """, (latest_cutoff.strftime('%Y-%m-%d'),))
+                # 汇总位置之后（尚未合并）有请求的用户仍然活跃
+                recent_users = set(
+                    user_id.lower() for user_id in self.execute_query_columns("""
+                        SELECT DISTINCT user_id FROM t_handler_logs
+                        WHERE create_time >= %s AND user_id IS NOT NULL
+                    """, (watermark[0]['watermark_time'],)).get('user_id', [])
+                )
+            else:
+                candidates = self.execute_query("""
+                    SELECT user_id, MAX(create_time) AS last_active, COUNT(1) AS total_queries
+                    FROM t_handler_logs
+                    WHERE user_id IS NOT NULL
+                    GROUP BY user_id
+                    HAVING MAX(create_time) < %s
+                """, (latest_cutoff.strftime('%Y-%m-%d'),))
+                recent_users = set()
+
+            users = []
+            for row in candidates:
+                if row['user_id'].lower() in recent_users:
+                    continue
+                last_active_date = row['last_active'].date()
+                user = {
+                    'user_id': row['user_id'],
+                    'last_active_date': last_active_date.strftime('%Y-%m-%d'),
+                    'total_queries': row['total_queries'],
+                    'days_inactive': (date_obj - last_active_date).days
+                }
+                if row.get('channel_counts'):
+                    user['channel_counts'] = json.loads(row['channel_counts'])
+                users.append(user)
             # 按未活跃天数排序
-            churned_7_users.sort(key=lambda x: x['days_inactive'] if x['days_inactive'] else 0, reverse=True)
-            churned_15_users.sort(key=lambda x: x['days_inactive'] if x['days_inactive'] else 0, reverse=True)
+            users.sort(key=lambda x: x['days_inactive'], reverse=True)
+
+            result = {}
+            for n in days:
+                churned = [user for user in users if user['days_inactive'] > n]
+                result[f'churned_{n}_days'] = {
+                    'count': len(churned),
+                    'users': churned
+                }
+            result['queryDate'] = queryDate
+            return result
+        except Exception as e:
+            logger.error(f"获取流失用户列表失败: {e}")
+            raise e
+
+    def _get_day_user_sketches(self, start_date: date, end_date: date):
+        """
+        获取日期范围内各日期按 (渠道, 是否项目组成员) 划分的去重用户数草图（不包括未来的日期）
+        已完成的日期直接读取t_daily_user_sketch；未完成的日期（如当天）在保存的草图上合并位置之后的日志；
+        没有草图的日期从原始日志生成，返回 (草图, 从原始日志生成的日期列表)
+        """
+        end_date = min(end_date, date.today())
+        days = iter_days(start_date, end_date)
+        if not days:
+            return {}, []
+        range_params = (days[0], days[-1])
+        
+        status = {}
+        for row in self.execute_query("""
+            SELECT stat_date, user_count, watermark_time, completed 
+            FROM t_daily_user_bitmap 
+            WHERE stat_date >= %s AND stat_date <= %s
+        """, range_params):
+            day = row['stat_date'].strftime('%Y-%m-%d') if isinstance(row['stat_date'], date) else str(row['stat_date'])
+            status[day] = row
+        stored = {}
+        for row in self.execute_query("""
+            SELECT stat_date, channel, is_member, sketch 
+            FROM t_daily_user_sketch 
+            WHERE stat_date >= %s AND stat_date <= %s
+        """, range_params):
+            day = row['stat_date'].strftime('%Y-%m-%d') if isinstance(row['stat_date'], date) else str(row['stat_date'])
+            stored.setdefault(day, {})[(row['channel'], bool(row['is_member']))] = HyperLogLog.from_bytes(row['sketch'])
+        
+        sketches = {}
+        computed_dates = []
+        for day in days:
+            day_status = status.get(day)
+            day_sketches = stored.get(day, {})
+            # 草图功能上线前已完成的位图没有对应草图，从原始日志生成
+            if day_status is not None and (day_sketches or not day_status['user_count']):
+                if day_status['completed']:
+                    sketches[day] = day_sketches
+                    continue
+                lower = day_status['watermark_time']
+            else:
+                day_sketches = {}
+                lower = None
+                computed_dates.append(day)
+            day_start = datetime.strptime(day, '%Y-%m-%d')
+            rows = self.execute_query("""
+                SELECT DISTINCT user_id, channel FROM t_handler_logs 
+                WHERE create_time >= %s AND create_time < %s 
+                AND user_id IS NOT NULL
+            """, (lower or day_start, day_start + timedelta(days=1)))
+            sketches[day] = add_user_rows(day_sketches, rows)
+        return sketches, computed_dates
+
+    def get_distinct_users(self, start_date: str = None, end_date: str = None) -> Dict[str, Any]:
+        """
+        获取日期范围内的去重用户数（如最近1/7/30天即DAU/WAU/MAU），按渠道和项目组成员/非项目组成员划分
+        合并每天的HyperLogLog草图得到，耗时与天数成正比，与日志量无关；
+        standard_error为估计值的相对标准误差（约99.7%的估计与真实值相差不超过3倍standard_error）
+        """
+        try:
+            # 如果没有指定日期范围，默认查询最近7天（包含今天）
+            start_date_obj, end_date_obj = resolve_date_range(start_date, end_date)
+            if start_date_obj > end_date_obj:
+                raise ValueError("开始日期不能晚于结束日期")
+            if (end_date_obj - start_date_obj).days + 1 > MAX_DISTINCT_USER_DAYS:
+                raise ValueError(f"日期范围不能超过{MAX_DISTINCT_USER_DAYS}天")
+            
+            day_sketches, computed_dates = self._get_day_user_sketches(start_date_obj, end_date_obj)
+            total = HyperLogLog()
+            groups = {True: HyperLogLog(), False: HyperLogLog()}
+            channels = {}
+            daily = []
+            for day in iter_days(start_date_obj, end_date_obj):
+                day_total = HyperLogLog()
+                for (channel, is_member), sketch in day_sketches.get(day, {}).items():
+                    day_total.merge(sketch)
+                    groups[is_member].merge(sketch)
+                    channel_groups = channels.setdefault(channel, {True: HyperLogLog(), False: HyperLogLog()})
+                    channel_groups[is_member].merge(sketch)
+                total.merge(day_total)
+                daily.append({'date': day, 'distinct_users': day_total.count()})
+            
+            channel_stats = []
+            for channel, channel_groups in channels.items():
+                channel_total = HyperLogLog()
+                channel_total.merge(channel_groups[True])
+                channel_total.merge(channel_groups[False])
+                channel_stats.append({
+                    'channel': channel,
+                    'channel_name': self.channel_name_mapping.get(channel, channel),
+                    'distinct_users': channel_total.count(),
+                    'member_users': channel_groups[True].count(),
+                    'non_member_users': channel_groups[False].count()
+                })
             
             return {
-                'churned_7_days': {
-                    'count': len(churned_7_users),
-                    'users': churned_7_users
-                },
-                'churned_15_days': {
-                    'count': len(churned_15_users),
-                    'users': churned_15_users
-                },
-                'queryDate': queryDate
+                'start_date': start_date_obj.strftime('%Y-%m-%d'),
+                'end_date': end_date_obj.strftime('%Y-%m-%d'),
+                'distinct_users': total.count(),
+                'member_users': groups[True].count(),
+                'non_member_users': groups[False].count(),
+                'channels': sorted(channel_stats, key=lambda x: x['distinct_users'], reverse=True),
+                'daily': daily,
+                'standard_error': round(total.standard_error, 4),
+                'computed_dates': computed_dates
             }
         except Exception as e:
-            logger.error(f"获取流失用户列表失败: {e}")
+            logger.error(f"获取去重用户数失败: {e}")
             raise e
 
     def close(self):
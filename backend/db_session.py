@@ -1,9 +1,10 @@
 # -*- coding: utf-8 -*-
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 from urllib.parse import quote_plus
 import logging
+import threading
 
 logger = logging.getLogger(__name__)
 
@@ -43,9 +44,32 @@ engine = create_engine(
     }
 )
 
+# 连接池统计：每次从连接池检出连接都会触发一次pre_ping往返
+_pool_stats_lock = threading.Lock()
+pool_stats = {
+    'checkouts': 0
+}
+
+@event.listens_for(engine, 'checkout')
+def _on_connection_checkout(dbapi_connection, connection_record, connection_proxy):
+    """记录连接检出次数"""
+    with _pool_stats_lock:
+        pool_stats['checkouts'] += 1
+
+def get_pool_stats() -> dict:
+    """获取连接池统计信息"""
+    with _pool_stats_lock:
+        checkouts = pool_stats['checkouts']
+    return {
+        'checkouts': checkouts,
+        'pool_status': engine.pool.status()
+    }
+
+# 会话工厂只创建一次，避免每条语句都重新构建sessionmaker
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
 def create_sqlalchemy_session():
     """创建SQLAlchemy会话"""
-    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
     sqlalchemy_session = SessionLocal()
     return sqlalchemy_session
 
@@ -60,6 +84,10 @@ class MySqlDb:
 
     def init_db(self):
         """初始化数据库表"""
+        # 导入汇总表、请求标签表、活跃用户位图表模型，使其注册到Base.metadata
+        import rollup_models  # noqa: F401
+        import label_models  # noqa: F401
+        import activity_models  # noqa: F401
         # 创建所有表
         Base.metadata.create_all(bind=engine)
         logger.info("数据库表初始化完成")
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+错误明细分组与分页
+
+Agent/DS错误明细接口只返回 错误类型 → 错误码分组 的计数（GROUP BY在数据库中完成），
+每个错误码分组的请求明细按 (create_time, id) 倒序键集分页读取，只返回请求/响应的截断预览，
+完整的req_info/rsp_info按biz_seq单独获取
+"""
+
+from typing import List, Dict, Any, Optional, Tuple
+from datetime import datetime
+import base64
+import json
+
+class ErrorDetailConfig:
+    """错误明细分页配置类"""
+    def __init__(self):
+        # 默认每页条数
+        self.page_size = 20
+        # 每页条数上限
+        self.max_page_size = 100
+        # 请求/响应预览的最大字符数
+        self.preview_length = 200
+
+# 获取配置
+error_detail_config = ErrorDetailConfig()
+
+# Agent子系统（B2DU开头）第7位对应的错误类型
+AGENT_BUSINESS_ERROR_TYPES = {
+    '1': '用户输入信息缺失/错误',
+    '2': '用户权限问题'
+}
+
+AGENT_SYSTEM_ERROR_TYPES = {
+    '3': '服务调用错误',
+    '4': '数据访问错误',
+    '9': '服务端发生了未预期的内部异常'
+}
+
+# DS子系统的业务错误码（后四位）
+DS_BUSINESS_ERROR_CODES = {
+    '0001': '参数错误',
+    '0101': '请求aomp异常',
+    '0103': '验签失败',
+    '1001': '查询元数据信息异常',
+    '1002': '用户没有对应子系统权限',
+    '1003': 'dbName输入错误',
+    '1004': 'DCN信息为空，请排查子系统是否接入AOMP',
+    '1006': 'DCN不为异地备',
+    '1007': 'dcn输入错误',
+    '1008': '查询出的IDC信息为空，请排查子系统是否接入AOMP',
+    '1009': 'IDC输入错误',
+    '2001': '提交SQL执行异常',
+    '2002': '解析sql中的表名发送异常',
+    '3001': 'AOMP返回结果为空',
+    '3002': 'SQL执行超时'
+}
+
+# DS子系统其余错误统一归为"其他错误"
+DS_OTHER_ERROR_CODE = '9999'
+
+# 各子系统错误记录的筛选条件（与create_time范围条件一起使用）
+SUBSYSTEM_CONDITIONS = {
+    'agent': """
+        result_code NOT LIKE '%%0000'
+        AND result_code LIKE 'B2DU%%'
+        AND CHAR_LENGTH(result_code) >= 7
+    """,
+    'ds': """
+        (
+            (LENGTH(result_code) = 8 AND LEFT(result_code, 4) = '2030' AND RIGHT(result_code, 4) != '0000')
+            OR (LENGTH(result_code) != 8 AND result_code IS NOT NULL AND result_code != '')
+        )
+    """
+}
+
+def error_subsystems(result_code: Optional[str]) -> List[str]:
+    """
+    返回result_code所属的错误明细子系统（与SUBSYSTEM_CONDITIONS一致，LIKE不区分大小写，LENGTH按字节计算）
+    非8位的B2DU错误码同时满足两个子系统的条件
+    """
+    if not result_code:
+        return []
+    subsystems = []
+    if result_code.upper().startswith('B2DU') and not result_code.endswith('0000') and len(result_code) >= 7:
+        subsystems.append('agent')
+    byte_length = len(result_code.encode('utf-8'))
+    if (byte_length == 8 and result_code[:4] == '2030' and result_code[-4:] != '0000') or byte_length != 8:
+        subsystems.append('ds')
+    return subsystems
+
+def in_group(subsystem: str, result_code: str, code: str, error_type: Optional[str] = None) -> bool:
+    """判断result_code是否属于错误码分组（与group_condition一致）"""
+    if subsystem == 'agent':
+        return result_code[6:7] == error_type and result_code[-4:] == code
+    if code == DS_OTHER_ERROR_CODE:
+        return not (len(result_code) == 8 and result_code[-4:] in DS_BUSINESS_ERROR_CODES)
+    return len(result_code) == 8 and result_code[-4:] == code
+
+def group_condition(subsystem: str, code: str, error_type: Optional[str] = None) -> Tuple[str, List[str]]:
+    """返回错误码分组的筛选条件和参数（Agent按第7位和后四位，DS按后四位，9999为其他错误）"""
+    if subsystem not in SUBSYSTEM_CONDITIONS:
+        raise ValueError(f"不支持的子系统: {subsystem}")
+    if not isinstance(code, str) or not code:
+        raise ValueError("缺少错误码分组code")
+    if subsystem == 'agent':
+        if not isinstance(error_type, str) or len(error_type) != 1:
+            raise ValueError("Agent错误明细需要一位的errorType")
+        return "SUBSTRING(result_code, 7, 1) = %s AND RIGHT(result_code, 4) = %s", [error_type, code]
+    codes = list(DS_BUSINESS_ERROR_CODES)
+    if code == DS_OTHER_ERROR_CODE:
+        placeholders = ','.join(['%s'] * len(codes))
+        return f"NOT (CHAR_LENGTH(result_code) = 8 AND RIGHT(result_code, 4) IN ({placeholders}))", codes
+    if code not in DS_BUSINESS_ERROR_CODES:
+        raise ValueError(f"不支持的DS错误码分组: {code}")
+    return "CHAR_LENGTH(result_code) = 8 AND RIGHT(result_code, 4) = %s", [code]
+
+def encode_cursor(create_time: datetime, log_id: int) -> str:
+    """把最后一条记录的 (create_time, id) 编码为下一页的游标"""
+    payload = json.dumps([create_time.isoformat(sep=' '), log_id])
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        create_time, log_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8'))
+        if not isinstance(log_id, int) or isinstance(log_id, bool):
+            raise ValueError(log_id)
+        return datetime.fromisoformat(create_time), log_id
+    except Exception:
+        raise ValueError(f"无效的游标: {cursor}")
+
+def preview(text: Optional[str], field: str, length: int) -> Dict[str, Any]:
+    """
+    生成请求/响应预览：JSON中有field字段（如req_info的query、rsp_info的queryRsp）时取该字段，否则取原文，
+    超过length个字符时截断
+    """
+    if text is None:
+        return {'text': None, 'truncated': False}
+    value = text
+    try:
+        obj = json.loads(text)
+        if isinstance(obj, dict) and obj.get(field) is not None:
+            value = str(obj[field])
+    except (ValueError, TypeError):
+        pass
+    if len(value) > length:
+        return {'text': value[:length], 'truncated': True}
+    return {'text': value, 'truncated': value is not text}
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+错误码分类规则
+
+规则只在ERROR_CODE_RULES中定义一次，同时编译为：
+- MySQL的CASE表达式：在数据库中完成分类，只有GROUP BY后的计数返回给应用
+- Python分类函数：用于单条错误码的判断（如DatabaseManager._classify_error_code）
+
+每个分类维度是一组按顺序匹配的规则，第一条所有条件都满足的规则决定分类结果；
+条件之间为AND关系，前缀匹配与MySQL默认排序规则一致，不区分大小写
+"""
+
+from typing import List, Dict, Any, Optional, Callable, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+# DS子系统（2030开头）的业务错误码后四位
+DS_BUSINESS_SUFFIXES = ['1002', '1003', '1004', '1006', '1007', '1008', '1009']
+
+# agent子系统（B2DU开头）第7位为以下值时为业务错误
+AGENT_BUSINESS_CHARS = ['1', '2']
+
+# 条件格式：(条件类型, 参数...)
+# - ('is_null',)                     result_code为NULL
+# - ('is_empty',)                    result_code为空字符串
+# - ('equals', s)                    等于s
+# - ('contains', s)                  包含子串s
+# - ('prefix', s)                    以s开头（不区分大小写）
+# - ('length_ne', n) / ('length_ge', n)  长度不等于n / 长度不小于n
+# - ('char_in', pos, values)         第pos位（从1开始）在values中
+# - ('substr_in', pos, n, values)    从第pos位开始的n个字符在values中
+ERROR_CODE_RULES = {
+    # 请求结果：success 成功（包含0000）；error 失败；null 没有result_code（只计入总数）
+    'outcome': {
+        'rules': [
+            ([('is_null',)], 'null'),
+            ([('contains', '0000')], 'success'),
+        ],
+        'default': 'error'
+    },
+    # 业务错误/系统错误（与原_classify_error_code一致，空码视为success）
+    'error_class': {
+        'rules': [
+            ([('is_null',)], 'success'),
+            ([('is_empty',)], 'success'),
+            ([('equals', '0000')], 'success'),
+            ([('length_ne', 8)], 'system'),
+            ([('prefix', 'B2DU'), ('char_in', 7, AGENT_BUSINESS_CHARS)], 'business'),
+            ([('prefix', 'B2DU')], 'system'),
+            ([('prefix', '2030'), ('substr_in', 5, 4, DS_BUSINESS_SUFFIXES)], 'business'),
+        ],
+        'default': 'system'
+    },
+    # 子系统错误归属：B2DU开头为agent子系统，其余为ds子系统
+    'subsystem_class': {
+        'rules': [
+            ([('prefix', 'B2DU'), ('char_in', 7, AGENT_BUSINESS_CHARS)], 'agent_business'),
+            ([('prefix', 'B2DU')], 'agent_system'),
+            ([('length_ge', 8), ('prefix', '2030'), ('substr_in', 5, 4, DS_BUSINESS_SUFFIXES)], 'ds_business'),
+        ],
+        'default': 'ds_system'
+    }
+}
+
+# 用于校验SQL与Python分类一致性的错误码样例
+ERROR_CODE_FIXTURES = [
+    None, '', '0000', '00000000', 'B2DU0000', '20300000',
+    'B2DU0110', 'B2DU0120', 'B2DU0130', 'B2DU0490', 'B2DU019', 'B2DU01',
+    'b2du0110', 'b2du0190',
+    '20301002', '20301003', '20301005', '20301009', '20300001', '203010021',
+    '2030100', '2030', '12345678', '1234', 'ERROR', 'E0000001',
+]
+
+
+def _sql_literal(value: str) -> str:
+    """把规则中的常量转换为SQL字符串字面量"""
+    return "'" + value.replace("\\", "\\\\").replace("'", "''") + "'"
+
+
+def _sql_in_list(values: List[str]) -> str:
+    return ', '.join(_sql_literal(v) for v in values)
+
+
+def _condition_to_sql(condition: Tuple, column: str) -> str:
+    """把单个条件编译为SQL布尔表达式"""
+    kind = condition[0]
+    if kind == 'is_null':
+        return f"{column} IS NULL"
+    if kind == 'is_empty':
+        return f"{column} = ''"
+    if kind == 'equals':
+        return f"{column} = {_sql_literal(condition[1])}"
+    if kind == 'contains':
+        return f"LOCATE({_sql_literal(condition[1])}, {column}) > 0"
+    if kind == 'prefix':
+        return f"UPPER(LEFT({column}, {len(condition[1])})) = {_sql_literal(condition[1].upper())}"
+    if kind == 'length_ne':
+        return f"CHAR_LENGTH({column}) <> {int(condition[1])}"
+    if kind == 'length_ge':
+        return f"CHAR_LENGTH({column}) >= {int(condition[1])}"
+    if kind == 'char_in':
+        return f"SUBSTRING({column}, {int(condition[1])}, 1) IN ({_sql_in_list(condition[2])})"
+    if kind == 'substr_in':
+        return f"SUBSTRING({column}, {int(condition[1])}, {int(condition[2])}) IN ({_sql_in_list(condition[3])})"
+    raise ValueError(f"未知的规则条件: {kind}")
+
+
+def _condition_to_python(condition: Tuple) -> Callable[[Optional[str]], bool]:
+    """把单个条件编译为Python判断函数（非空条件在result_code为NULL时均不成立，与SQL一致）"""
+    kind = condition[0]
+    if kind == 'is_null':
+        return lambda code: code is None
+    if kind == 'is_empty':
+        return lambda code: code == ''
+    if kind == 'equals':
+        value = condition[1]
+        return lambda code: code == value
+    if kind == 'contains':
+        value = condition[1]
+        return lambda code: code is not None and value in code
+    if kind == 'prefix':
+        value = condition[1].upper()
+        return lambda code: code is not None and code[:len(value)].upper() == value
+    if kind == 'length_ne':
+        length = int(condition[1])
+        return lambda code: code is not None and len(code) != length
+    if kind == 'length_ge':
+        length = int(condition[1])
+        return lambda code: code is not None and len(code) >= length
+    if kind == 'char_in':
+        index = int(condition[1]) - 1
+        values = frozenset(condition[2])
+        return lambda code: code is not None and len(code) > index and code[index] in values
+    if kind == 'substr_in':
+        start = int(condition[1]) - 1
+        end = start + int(condition[2])
+        values = frozenset(condition[3])
+        return lambda code: code is not None and code[start:end] in values
+    raise ValueError(f"未知的规则条件: {kind}")
+
+
+def build_case_sql(dimension: str, column: str = 'result_code') -> str:
+    """生成指定分类维度的CASE表达式"""
+    spec = ERROR_CODE_RULES[dimension]
+    whens = []
+    for conditions, label in spec['rules']:
+        predicate = ' AND '.join(_condition_to_sql(c, column) for c in conditions)
+        whens.append(f"WHEN {predicate} THEN {_sql_literal(label)}")
+    return f"CASE {' '.join(whens)} ELSE {_sql_literal(spec['default'])} END"
+
+
+def _build_python_classifier(dimension: str) -> Callable[[Optional[str]], str]:
+    spec = ERROR_CODE_RULES[dimension]
+    compiled = [
+        ([_condition_to_python(c) for c in conditions], label)
+        for conditions, label in spec['rules']
+    ]
+    default = spec['default']
+
+    def classify(code: Optional[str]) -> str:
+        for predicates, label in compiled:
+            if all(predicate(code) for predicate in predicates):
+                return label
+        return default
+
+    return classify
+
+
+# 预编译的Python分类函数
+_PYTHON_CLASSIFIERS = {dimension: _build_python_classifier(dimension) for dimension in ERROR_CODE_RULES}
+
+
+def classify_error_code(dimension: str, code: Optional[str]) -> str:
+    """使用Python规则对单个错误码分类"""
+    return _PYTHON_CLASSIFIERS[dimension](code)
+
+
+def build_class_counts_sql(dimensions: List[str], table: str = 't_handler_logs') -> str:
+    """生成按分类维度分组计数的SQL（时间范围参数：create_time >= %s AND create_time < %s）"""
+    select_cases = ',\n                '.join(f"{build_case_sql(d)} AS {d}" for d in dimensions)
+    return f"""
+            SELECT {select_cases},
+                COUNT(1) AS count
+            FROM {table}
+            WHERE create_time >= %s AND create_time < %s
+            GROUP BY {', '.join(dimensions)}
+        """
+
+
+def check_sql_python_agreement(execute_query: Callable, fixtures: List[Optional[str]] = None) -> List[Dict[str, Any]]:
+    """
+    在数据库中对样例错误码执行CASE表达式，与Python分类结果比较
+    返回不一致的记录列表（为空表示一致）
+    """
+    fixtures = ERROR_CODE_FIXTURES if fixtures is None else fixtures
+    dimensions = list(ERROR_CODE_RULES)
+    union_sql = ' UNION ALL '.join(
+        f"SELECT {i} AS idx, CAST(%s AS CHAR) AS result_code" for i in range(len(fixtures))
+    )
+    cases = ', '.join(f"{build_case_sql(d)} AS {d}" for d in dimensions)
+    sql = f"SELECT idx, {cases} FROM ({union_sql}) fixtures ORDER BY idx"
+    rows = execute_query(sql, tuple(fixtures))
+
+    mismatches = []
+    for row in rows:
+        code = fixtures[row['idx']]
+        for dimension in dimensions:
+            python_label = classify_error_code(dimension, code)
+            if row[dimension] != python_label:
+                mismatches.append({
+                    'result_code': code,
+                    'dimension': dimension,
+                    'sql': row[dimension],
+                    'python': python_label
+                })
+    return mismatches
+
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+错误消息签名
+
+同一个result_code下的rsp_info消息往往只在ID、表名、时间、数值上不同。extract_template把这些可变部分替换为占位符
+（<TS>、<UUID>、<IP>、<STR>、<TABLE>、<ID>、<HEX>、<NUM>）得到消息模板，模板的哈希即签名。
+label_job在生成请求标签时按天、子系统、result_code和签名增量计数（t_error_signature），
+错误明细只需要展示几十个签名（计数 + 一条示例），不再返回成千上万条相似的请求
+"""
+
+from typing import List, Dict, Any, Optional, Iterable
+from datetime import datetime
+import hashlib
+import json
+import re
+from error_details import error_subsystems
+
+# rsp_info为JSON时依次尝试的消息字段，都没有时使用原文
+MESSAGE_FIELDS = ('queryRsp', 'message', 'msg', 'errorMsg')
+
+# 参与模板提取的消息最大字符数，模板和示例消息保存的最大字符数
+MAX_MESSAGE_LENGTH = 2000
+MAX_TEMPLATE_LENGTH = 500
+MAX_EXEMPLAR_LENGTH = 500
+
+# 按顺序替换的可变部分（先替换结构明确的时间、UUID、引号内容，最后替换剩余的数字）
+_MASKS = [
+    (re.compile(r'\d{4}[-/]\d{1,2}[-/]\d{1,2}(?:[ T]\d{1,2}:\d{2}(?::\d{2})?(?:\.\d+)?)?'), '<TS>'),
+    (re.compile(r'\d{1,2}:\d{2}:\d{2}(?:\.\d+)?'), '<TS>'),
+    (re.compile(r'[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}'), '<UUID>'),
+    (re.compile(r'\b\d{1,3}(?:\.\d{1,3}){3}(?::\d+)?\b'), '<IP>'),
+    (re.compile(r"'[^']*'|\"[^\"]*\"|`[^`]*`|“[^”]*”|‘[^’]*’|「[^」]*」"), '<STR>'),
+    (re.compile(r'(?i)(\btable\s+|表\s*[:：]?\s*)[A-Za-z_][\w.]*', re.ASCII), r'\1<TABLE>'),
+    (re.compile(r'\b0[xX][0-9a-fA-F]+\b'), '<HEX>'),
+    # 同时包含字母和数字的长标识（如流水号、带日期后缀的表名）
+    (re.compile(r'(?<![A-Za-z0-9_])(?=[A-Za-z0-9_\-]*[0-9])(?=[A-Za-z0-9_\-]*[A-Za-z])[A-Za-z0-9_\-]{8,}(?![A-Za-z0-9_])'), '<ID>'),
+    (re.compile(r'\d+(?:\.\d+)?'), '<NUM>'),
+    (re.compile(r'\s+'), ' '),
+]
+
+def extract_message(rsp_info: Optional[str]) -> str:
+    """从rsp_info中取出错误消息"""
+    if not rsp_info:
+        return ''
+    try:
+        obj = json.loads(rsp_info)
+        if isinstance(obj, dict):
+            for field in MESSAGE_FIELDS:
+                if obj.get(field):
+                    return str(obj[field])
+    except (ValueError, TypeError):
+        pass
+    return rsp_info
+
+def extract_template(message: str) -> str:
+    """把消息中的可变部分替换为占位符，得到消息模板"""
+    template = message[:MAX_MESSAGE_LENGTH]
+    for pattern, placeholder in _MASKS:
+        template = pattern.sub(placeholder, template)
+    return template.strip()[:MAX_TEMPLATE_LENGTH]
+
+def signature_of(template: str) -> str:
+    """模板的签名（16位十六进制）"""
+    return hashlib.sha1(template.encode('utf-8')).hexdigest()[:16]
+
+class SignatureCounter:
+    """按 (子系统, result_code, 签名) 累计错误数，每个签名保留最早的一条请求作为示例"""
+
+    def __init__(self):
+        self.entries: Dict[tuple, Dict[str, Any]] = {}
+        # 相同rsp_info只提取一次模板
+        self._templates: Dict[str, tuple] = {}
+
+    def add(self, result_code: Optional[str], biz_seq: Optional[str], create_time: Optional[datetime],
+            rsp_info: Optional[str], subsystems: Iterable[str] = None):
+        """加入一条日志，不属于任何错误明细子系统的日志忽略"""
+        subsystems = error_subsystems(result_code) if subsystems is None else subsystems
+        if not subsystems:
+            return
+        cached = self._templates.get(rsp_info or '')
+        if cached is None:
+            message = extract_message(rsp_info)
+            template = extract_template(message)
+            cached = self._templates[rsp_info or ''] = (signature_of(template), template, message[:MAX_EXEMPLAR_LENGTH])
+        signature, template, message = cached
+        for subsystem in subsystems:
+            key = (subsystem, result_code, signature)
+            entry = self.entries.get(key)
+            if entry is None:
+                self.entries[key] = {
+                    'subsystem': subsystem,
+                    'result_code': result_code,
+                    'signature': signature,
+                    'template': template,
+                    'count': 1,
+                    'exemplar_biz_seq': biz_seq,
+                    'exemplar_message': message,
+                    'first_seen': create_time,
+                    'last_seen': create_time
+                }
+                continue
+            entry['count'] += 1
+            if create_time is not None:
+                if entry['first_seen'] is None or create_time < entry['first_seen']:
+                    entry['first_seen'] = create_time
+                    entry['exemplar_biz_seq'] = biz_seq
+                    entry['exemplar_message'] = message
+                if entry['last_seen'] is None or create_time > entry['last_seen']:
+                    entry['last_seen'] = create_time
+
+    def merge_entry(self, entry: Dict[str, Any]):
+        """合并一条已保存的签名计数（如t_error_signature的一行）"""
+        key = (entry['subsystem'], entry['result_code'], entry['signature'])
+        current = self.entries.get(key)
+        if current is None:
+            self.entries[key] = dict(entry)
+            return
+        current['count'] += entry['count']
+        if entry['first_seen'] is not None and (current['first_seen'] is None or entry['first_seen'] < current['first_seen']):
+            current['first_seen'] = entry['first_seen']
+            current['exemplar_biz_seq'] = entry['exemplar_biz_seq']
+            current['exemplar_message'] = entry['exemplar_message']
+        if entry['last_seen'] is not None and (current['last_seen'] is None or entry['last_seen'] > current['last_seen']):
+            current['last_seen'] = entry['last_seen']
+
+    def values(self) -> List[Dict[str, Any]]:
+        return list(self.entries.values())
+
+def group_by_result_code(entries: Iterable[Dict[str, Any]], limit: int) -> List[Dict[str, Any]]:
+    """按result_code汇总签名，每个result_code按计数从大到小保留limit个签名"""
+    groups: Dict[str, Dict[str, Any]] = {}
+    for entry in entries:
+        group = groups.setdefault(entry['result_code'], {
+            'result_code': entry['result_code'],
+            'count': 0,
+            'signature_count': 0,
+            'signatures': []
+        })
+        group['count'] += entry['count']
+        group['signature_count'] += 1
+        group['signatures'].append({
+            'signature': entry['signature'],
+            'template': entry['template'],
+            'count': entry['count'],
+            'exemplar': {
+                'biz_seq': entry['exemplar_biz_seq'],
+                'message': entry['exemplar_message'],
+                'create_time': entry['first_seen'].strftime('%Y-%m-%d %H:%M:%S') if entry['first_seen'] else None
+            },
+            'last_seen': entry['last_seen'].strftime('%Y-%m-%d %H:%M:%S') if entry['last_seen'] else None
+        })
+    result = sorted(groups.values(), key=lambda x: x['count'], reverse=True)
+    for group in result:
+        group['signatures'] = sorted(group['signatures'], key=lambda x: x['count'], reverse=True)[:limit]
+    return result
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+去重用户数草图（HyperLogLog）
+
+每个值哈希后按前precision位分到m = 2^precision个寄存器，寄存器只保存剩余位中第一个1出现的最大位置，
+去重数的估计值标准误差约为1.04 / sqrt(m)（默认precision=14，约0.81%）。两个草图逐个寄存器取最大值即可合并，
+且重复添加同一个值不改变结果。每天每个渠道、项目组成员/非项目组成员保存一个草图，
+任意日期范围的DAU/WAU/MAU只需要合并这些草图，不再对原始日志做COUNT(DISTINCT user_id)
+"""
+
+from typing import Dict, Tuple, Iterable, Optional
+import hashlib
+import math
+import zlib
+import numpy as np
+from project_members import member_dimension
+
+# 默认精度（寄存器数16384，标准误差约0.81%）
+DEFAULT_PRECISION = 14
+
+class HyperLogLog:
+    """可合并的去重计数草图"""
+
+    def __init__(self, precision: int = DEFAULT_PRECISION, registers: Optional[np.ndarray] = None):
+        if not 4 <= precision <= 18:
+            raise ValueError(f"precision必须在4和18之间: {precision}")
+        self.precision = precision
+        self.m = 1 << precision
+        self._rank_bits = 64 - precision
+        self.registers = registers if registers is not None else np.zeros(self.m, dtype=np.uint8)
+
+    def add(self, value: str):
+        """添加一个值（重复添加不影响结果）"""
+        h = int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+        index = h >> self._rank_bits
+        rank = self._rank_bits - (h & ((1 << self._rank_bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def add_many(self, values: Iterable[str]):
+        for value in values:
+            self.add(value)
+
+    def merge(self, other: 'HyperLogLog'):
+        """合并另一个草图（精度必须相同）"""
+        if other.precision != self.precision:
+            raise ValueError("只能合并精度相同的草图")
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def count(self) -> int:
+        """估计去重数（基数较小时使用线性计数修正）"""
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / float(np.sum(np.ldexp(1.0, -self.registers.astype(np.int32))))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * self.m and zeros:
+            estimate = self.m * math.log(self.m / zeros)
+        return int(round(estimate))
+
+    @property
+    def standard_error(self) -> float:
+        """估计值的相对标准误差（约68%的估计落在 ±1倍、99.7%落在 ±3倍以内）"""
+        return 1.04 / math.sqrt(self.m)
+
+    def to_bytes(self) -> bytes:
+        """首字节为精度，其后为zlib压缩的寄存器"""
+        return bytes([self.precision]) + zlib.compress(self.registers.tobytes())
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'HyperLogLog':
+        registers = np.frombuffer(zlib.decompress(data[1:]), dtype=np.uint8).copy()
+        return cls(data[0], registers)
+
+def add_user_rows(sketches: Dict[Tuple[str, bool], HyperLogLog], rows: Iterable[Dict],
+                  precision: int = DEFAULT_PRECISION) -> Dict[Tuple[str, bool], HyperLogLog]:
+    """
+    把 {'user_id', 'channel'} 行添加到按 (渠道, 是否项目组成员) 划分的草图中（跳过NULL用户）
+    user_id不区分大小写（与MySQL默认排序规则下的DISTINCT一致），NULL渠道记为未知渠道
+    """
+    for row in rows:
+        user_id = row['user_id']
+        if user_id is None:
+            continue
+        key = (row['channel'] or '未知渠道', member_dimension.is_member(user_id))
+        sketch = sketches.get(key)
+        if sketch is None:
+            sketch = sketches[key] = HyperLogLog(precision)
+        sketch.add(user_id.lower())
+    return sketches
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+请求标签任务
+
+按天为t_handler_logs的日志生成特征标签（request_labels.compute_labels），写入t_request_label；
+错误日志同时按消息签名（error_signatures）累计到t_error_signature。每天记录已处理到的位置（create_time + id），后台任务每次只处理新增的日志；
+日期结束且超过等待时间后核对当天日志数（不一致时按整天重新生成）并标记为完成，此后该日期的统计读取标签表。也可以通过命令行回填历史：
+
+    python label_job.py run
+    python label_job.py backfill --start 2025-01-01 --end 2025-01-31 [--force]
+"""
+
+from datetime import datetime, date, timedelta
+import argparse
+import asyncio
+import logging
+from database import DatabaseManager
+from db_session import get_db_session
+from label_models import RequestLabel, RequestLabelStatus, ErrorSignature, ErrorSignatureStatus
+from request_labels import compute_labels
+from error_signatures import SignatureCounter
+
+logger = logging.getLogger(__name__)
+
+class LabelConfig:
+    """请求标签任务配置类"""
+    def __init__(self):
+        # 是否在服务启动后运行后台标签任务
+        self.enabled = True
+        # 后台任务检查间隔（秒）
+        self.interval_seconds = 60
+        # 只处理create_time早于 now - lag_seconds 的日志
+        self.lag_seconds = 5
+        # 日期结束后等待多久再标记完成（分钟），留给延迟写入的日志
+        self.settle_minutes = 30
+        # 每次检查最近多少天
+        self.lookback_days = 30
+        # 每批读取的行数（每批在一个事务中写入标签和位置）
+        self.batch_size = 2000
+
+# 获取配置
+label_config = LabelConfig()
+
+class LabelJob:
+    """请求标签任务"""
+
+    def __init__(self, config: LabelConfig = label_config):
+        self.config = config
+        self.db_manager = DatabaseManager()
+
+    def _get_status(self, session, stat_date: date) -> RequestLabelStatus:
+        status = session.query(RequestLabelStatus).filter(RequestLabelStatus.stat_date == stat_date).first()
+        if status is None:
+            status = RequestLabelStatus(stat_date=stat_date, labelled_rows=0, completed=False, updated_at=datetime.now())
+            session.add(status)
+        return status
+
+    def _clear_day(self, stat_date: date):
+        """删除指定日期的标签和进度"""
+        session = get_db_session()
+        try:
+            session.query(RequestLabel).filter(RequestLabel.stat_date == stat_date).delete(synchronize_session=False)
+            session.query(ErrorSignature).filter(ErrorSignature.stat_date == stat_date).delete(synchronize_session=False)
+            session.query(ErrorSignatureStatus).filter(ErrorSignatureStatus.stat_date == stat_date).delete(synchronize_session=False)
+            session.query(RequestLabelStatus).filter(RequestLabelStatus.stat_date == stat_date).delete(synchronize_session=False)
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            logger.error(f"删除{stat_date}请求标签失败: {e}")
+            raise e
+        finally:
+            session.close()
+
+    def _merge_signatures(self, session, stat_date: date, counter: SignatureCounter):
+        """把一批日志的错误签名计数累加到t_error_signature"""
+        entries = counter.values()
+        if not entries:
+            return
+        existing = {
+            (row.subsystem, row.result_code, row.signature): row
+            for row in session.query(ErrorSignature).filter(
+                ErrorSignature.stat_date == stat_date,
+                ErrorSignature.signature.in_(list({entry['signature'] for entry in entries}))
+            )
+        }
+        for entry in entries:
+            row = existing.get((entry['subsystem'], entry['result_code'], entry['signature']))
+            if row is None:
+                session.add(ErrorSignature(stat_date=stat_date, **entry))
+                continue
+            row.count += entry['count']
+            if entry['first_seen'] is not None and (row.first_seen is None or entry['first_seen'] < row.first_seen):
+                row.first_seen = entry['first_seen']
+                row.exemplar_biz_seq = entry['exemplar_biz_seq']
+                row.exemplar_message = entry['exemplar_message']
+            if entry['last_seen'] is not None and (row.last_seen is None or entry['last_seen'] > row.last_seen):
+                row.last_seen = entry['last_seen']
+
+    def _label_rows(self, session, status: RequestLabelStatus, stat_date: date,
+                    day_start: datetime, upper: datetime) -> int:
+        """为status位置之后、upper之前的日志生成标签，返回处理的日志数"""
+        # 从当天第一条日志开始时同时累计错误签名；签名功能上线前已开始的日期不累计，查询时从原始日志计算
+        if status.watermark_time is None:
+            if session.query(ErrorSignatureStatus).filter(ErrorSignatureStatus.stat_date == stat_date).first() is None:
+                session.add(ErrorSignatureStatus(stat_date=stat_date, updated_at=datetime.now()))
+            track_signatures = True
+        else:
+            track_signatures = session.query(ErrorSignatureStatus).filter(
+                ErrorSignatureStatus.stat_date == stat_date
+            ).first() is not None
+
+        # biz_seq不唯一（同一请求有多条日志），位置按 (create_time, id) 记录
+        sql = """
+            SELECT id, create_time, biz_seq, user_id, result_code, req_info, rsp_info
+            FROM t_handler_logs
+            WHERE create_time >= %s AND create_time < %s
+        """
+        params = [day_start, upper]
+        if status.watermark_time is not None:
+            sql += " AND (create_time > %s OR (create_time = %s AND id > %s)) "
+            params += [status.watermark_time, status.watermark_time, status.watermark_id or 0]
+        sql += " ORDER BY create_time, id"
+
+        total = 0
+        for rows in self.db_manager.execute_query_stream(sql, tuple(params), self.config.batch_size):
+            mappings = []
+            counter = SignatureCounter()
+            for row in rows:
+                labels = compute_labels(row['req_info'], row['rsp_info'], row['user_id'])
+                labels.update(stat_date=stat_date, create_time=row['create_time'], biz_seq=row['biz_seq'])
+                mappings.append(labels)
+                if track_signatures:
+                    counter.add(row['result_code'], row['biz_seq'], row['create_time'], row['rsp_info'])
+            # 标签、错误签名和位置在同一事务中写入，中途失败时下次从上一批的位置继续
+            last = rows[-1]
+            session.bulk_insert_mappings(RequestLabel, mappings)
+            self._merge_signatures(session, stat_date, counter)
+            status.watermark_time = last['create_time']
+            status.watermark_id = last['id']
+            status.labelled_rows += len(rows)
+            status.updated_at = datetime.now()
+            session.commit()
+            total += len(rows)
+        return total
+
+    def _count_day_rows(self, day_start: datetime, day_end: datetime) -> int:
+        rows = self.db_manager.execute_query("""
+            SELECT COUNT(1) AS count
+            FROM t_handler_logs
+            WHERE create_time >= %s AND create_time < %s
+        """, (day_start, day_end))
+        return rows[0]['count'] if rows else 0
+
+    def label_day(self, stat_date: date, force: bool = False) -> int:
+        """为指定日期上次位置之后的日志生成标签，返回本次处理的日志数；force为True时重新生成整天"""
+        if force:
+            self._clear_day(stat_date)
+
+        now = datetime.now()
+        day_start = datetime.combine(stat_date, datetime.min.time())
+        day_end = day_start + timedelta(days=1)
+        upper = min(now - timedelta(seconds=self.config.lag_seconds), day_end)
+        if upper <= day_start:
+            return 0
+        completing = now >= day_end + timedelta(minutes=self.config.settle_minutes)
+
+        session = get_db_session()
+        try:
+            status = self._get_status(session, stat_date)
+            if status.completed:
+                return 0
+            total = self._label_rows(session, status, stat_date, day_start, upper)
+
+            if completing:
+                # 写入时create_time已落后于位置的日志不会被增量读取到：标签数与当天日志数不一致时按整天重新生成
+                day_rows = self._count_day_rows(day_start, day_end)
+                if day_rows != status.labelled_rows:
+                    logger.warning(f"{stat_date}已生成标签{status.labelled_rows}条，日志共{day_rows}条，按整天重新生成")
+                    session.close()
+                    self._clear_day(stat_date)
+                    session = get_db_session()
+                    status = self._get_status(session, stat_date)
+                    total = self._label_rows(session, status, stat_date, day_start, upper)
+                status.completed = True
+                status.updated_at = datetime.now()
+                session.commit()
+                logger.info(f"{stat_date}请求标签完成，共{status.labelled_rows}条")
+            return total
+        except Exception as e:
+            session.rollback()
+            logger.error(f"生成{stat_date}请求标签失败: {e}")
+            raise e
+        finally:
+            session.close()
+
+    def backfill(self, start_date: date, end_date: date, force: bool = False) -> int:
+        """为日期范围内的日志生成标签，返回处理的日志数"""
+        end_date = min(end_date, date.today())
+        total = 0
+        current = start_date
+        while current <= end_date:
+            try:
+                total += self.label_day(current, force=force)
+            except Exception as e:
+                # 单日失败不影响其它日期，下次运行时从该日期的位置继续
+                logger.error(f"{current}请求标签失败: {e}")
+            current += timedelta(days=1)
+        return total
+
+    def run_pending(self) -> int:
+        """处理最近lookback_days天内（包括当天）未完成的日期"""
+        end_date = date.today()
+        start_date = end_date - timedelta(days=self.config.lookback_days - 1)
+        return self.backfill(start_date, end_date)
+
+async def run_label_loop(config: LabelConfig = label_config):
+    """后台定期为新日志生成标签（在线程池中执行，不阻塞事件循环）"""
+    loop = asyncio.get_running_loop()
+    job = LabelJob(config)
+    while True:
+        try:
+            total = await loop.run_in_executor(None, job.run_pending)
+            if total:
+                logger.debug(f"后台请求标签处理{total}条日志")
+        except Exception as e:
+            logger.error(f"后台请求标签任务失败: {e}")
+        await asyncio.sleep(config.interval_seconds)
+
+def main():
+    parser = argparse.ArgumentParser(description='请求标签任务')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('run', help='处理最近未完成的日期')
+    backfill_parser = subparsers.add_parser('backfill', help='回填指定日期范围的标签')
+    backfill_parser.add_argument('--start', required=True, help='开始日期，格式YYYY-MM-DD')
+    backfill_parser.add_argument('--end', required=True, help='结束日期，格式YYYY-MM-DD')
+    backfill_parser.add_argument('--force', action='store_true', help='删除已有标签后重新生成')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    from db_session import first_init_db
+    first_init_db()
+
+    job = LabelJob()
+    if args.command == 'run':
+        total = job.run_pending()
+    else:
+        total = job.backfill(
+            datetime.strptime(args.start, '%Y-%m-%d').date(),
+            datetime.strptime(args.end, '%Y-%m-%d').date(),
+            force=args.force
+        )
+    logger.info(f"共处理{total}条日志")
+
+if __name__ == '__main__':
+    main()
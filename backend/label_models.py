@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+请求标签表模型
+
+t_handler_logs每条日志的特征标签（见request_labels）由label_job增量写入，
+已完成标签的日期按整数列分组统计，不再对req_info/rsp_info做LIKE扫描。
+错误日志同时按rsp_info的消息签名（见error_signatures）累计到t_error_signature
+"""
+
+from sqlalchemy import Column, Integer, BigInteger, String, Date, DateTime, Boolean, Text, Index
+from db_session import Base
+
+
+class RequestLabel(Base):
+    """单条请求日志的特征标签"""
+    __tablename__ = 't_request_label'
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    stat_date = Column(Date, nullable=False, comment='日志日期')
+    create_time = Column(DateTime, nullable=False, comment='日志create_time')
+    biz_seq = Column(String(64), nullable=True, comment='业务流水号')
+    scenario_mask = Column(Integer, nullable=False, default=0, comment='命中场景的位掩码')
+    db_type_mask = Column(Integer, nullable=False, default=0, comment='数据库类型位掩码：TDSQL=1, TIDB=2, HIVE=4')
+    is_template = Column(Boolean, nullable=True, comment='是否模板查询（req_info为NULL时为NULL）')
+    is_no_ticket = Column(Boolean, nullable=False, default=False, comment='是否免提单')
+    is_member = Column(Boolean, nullable=False, default=False, comment='是否项目组成员')
+
+    __table_args__ = (
+        Index('idx_request_label_date_scenario', 'stat_date', 'scenario_mask', 'is_member'),
+        Index('idx_request_label_date_biz_seq', 'stat_date', 'biz_seq'),
+        Index('idx_request_label_biz_seq', 'biz_seq'),
+    )
+
+
+class RequestLabelStatus(Base):
+    """每天的标签进度：已处理到的位置，以及该日期是否已全部完成"""
+    __tablename__ = 't_request_label_status'
+
+    stat_date = Column(Date, primary_key=True, comment='日志日期')
+    watermark_time = Column(DateTime, nullable=True, comment='已处理到的create_time')
+    watermark_id = Column(BigInteger, nullable=True, comment='已处理到的日志id（create_time相同时按id排序）')
+    labelled_rows = Column(BigInteger, nullable=False, default=0, comment='已生成标签的日志数')
+    completed = Column(Boolean, nullable=False, default=False, comment='该日期是否已结束且全部生成标签')
+    updated_at = Column(DateTime, nullable=False, comment='更新时间')
+
+
+class ErrorSignature(Base):
+    """每天各子系统、result_code下每个错误消息签名的计数和示例"""
+    __tablename__ = 't_error_signature'
+
+    stat_date = Column(Date, primary_key=True, comment='日志日期')
+    subsystem = Column(String(16), primary_key=True, comment='错误明细子系统：agent / ds')
+    result_code = Column(String(64), primary_key=True, comment='结果码')
+    signature = Column(String(16), primary_key=True, comment='消息模板的签名')
+    template = Column(Text, nullable=False, comment='消息模板（可变部分替换为占位符）')
+    count = Column(BigInteger, nullable=False, default=0, comment='错误数')
+    exemplar_biz_seq = Column(String(64), nullable=True, comment='示例请求的业务流水号（最早的一条）')
+    exemplar_message = Column(Text, nullable=True, comment='示例请求的错误消息（截断）')
+    first_seen = Column(DateTime, nullable=True, comment='最早出现时间')
+    last_seen = Column(DateTime, nullable=True, comment='最近出现时间')
+
+
+class ErrorSignatureStatus(Base):
+    """
+    该日期的错误签名是否与请求标签从同一位置开始累计（从当天第一条日志开始生成标签时写入）
+    签名功能上线前已开始生成标签的日期没有这条记录，查询时从原始日志计算
+    """
+    __tablename__ = 't_error_signature_status'
+
+    stat_date = Column(Date, primary_key=True, comment='日志日期')
+    updated_at = Column(DateTime, nullable=False, comment='更新时间')
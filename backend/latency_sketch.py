@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+耗时分位数草图（DDSketch）
+
+把耗时按对数划分到桶中，每个桶只保存计数：任意分位数的估计值与真实值的相对误差不超过relative_accuracy，
+两个草图（如两天的同一环节）直接按桶相加即可合并。每日汇总时为各环节和各查询类别生成草图并持久化，
+日期范围的P50/P90/P99只需要合并这些草图，不再读取原始的耗时记录
+"""
+
+from typing import List, Dict, Any, Optional, Iterable
+import json
+import math
+
+# 默认相对误差1%
+DEFAULT_RELATIVE_ACCURACY = 0.01
+
+# 小于该值的耗时计入零值桶
+MIN_INDEXABLE_VALUE = 1e-9
+
+class DDSketch:
+    """可合并的分位数草图"""
+
+    def __init__(self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY):
+        if not 0 < relative_accuracy < 1:
+            raise ValueError(f"relative_accuracy必须在0和1之间: {relative_accuracy}")
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins: Dict[int, int] = {}
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def _index(self, value: float) -> int:
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def _bin_value(self, index: int) -> float:
+        """桶的代表值，与桶内任意值的相对误差不超过relative_accuracy"""
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def add(self, value: float, weight: int = 1):
+        """添加一个耗时（耗时不应为负数，负数按0处理）"""
+        if value > MIN_INDEXABLE_VALUE:
+            index = self._index(value)
+            self.bins[index] = self.bins.get(index, 0) + weight
+        else:
+            self.zero_count += weight
+        self.count += weight
+        self.sum += value * weight
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def add_many(self, values: Iterable[float]):
+        """批量添加耗时（跳过None）"""
+        for value in values:
+            if value is not None:
+                self.add(float(value))
+
+    def merge(self, other: 'DDSketch'):
+        """合并另一个草图（相对误差必须相同）"""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("只能合并相对误差相同的草图")
+        for index, count in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0) + count
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """估计q分位数（0 <= q <= 1），草图为空时返回None"""
+        if not 0 <= q <= 1:
+            raise ValueError(f"分位数必须在0和1之间: {q}")
+        if self.count == 0:
+            return None
+        if q == 0:
+            return self.min
+        if q == 1:
+            return self.max
+        rank = q * (self.count - 1)
+        cumulative = self.zero_count
+        if cumulative > rank:
+            return max(self.min, 0.0)
+        for index in sorted(self.bins):
+            cumulative += self.bins[index]
+            if cumulative > rank:
+                # 估计值不会超出实际出现过的最小、最大值
+                return min(max(self._bin_value(index), self.min), self.max)
+        return self.max
+
+    def quantiles(self, percentiles: List[float]) -> Dict[str, Optional[float]]:
+        """按百分位（如[50, 90, 99]）批量估计，返回 {'p50': ..., 'p90': ..., 'p99': ...}"""
+        return {
+            f"p{percentile:g}": self._round(self.quantile(percentile / 100.0))
+            for percentile in percentiles
+        }
+
+    @staticmethod
+    def _round(value: Optional[float]) -> Optional[float]:
+        return round(value, 2) if value is not None else None
+
+    @property
+    def avg(self) -> Optional[float]:
+        return self.sum / self.count if self.count else None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'relative_accuracy': self.relative_accuracy,
+            'bins': {str(index): count for index, count in self.bins.items()},
+            'zero_count': self.zero_count,
+            'count': self.count,
+            'sum': self.sum,
+            'min': self.min if self.count else None,
+            'max': self.max if self.count else None
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'DDSketch':
+        sketch = cls(data.get('relative_accuracy', DEFAULT_RELATIVE_ACCURACY))
+        sketch.bins = {int(index): count for index, count in data.get('bins', {}).items()}
+        sketch.zero_count = data.get('zero_count', 0)
+        sketch.count = data.get('count', 0)
+        sketch.sum = data.get('sum', 0.0)
+        if sketch.count:
+            sketch.min = data['min']
+            sketch.max = data['max']
+        return sketch
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), separators=(',', ':'))
+
+    @classmethod
+    def from_json(cls, text: str) -> 'DDSketch':
+        return cls.from_dict(json.loads(text))
+
+    @classmethod
+    def from_values(cls, values: Iterable[float], relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY) -> 'DDSketch':
+        sketch = cls(relative_accuracy)
+        sketch.add_many(values)
+        return sketch
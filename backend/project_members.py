@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+项目组成员维度
+
+渠道、场景和趋势统计都要区分项目组成员与非项目组成员。成员集合在进程内加载一次，
+统计SQL只按user_id分组扫描一次，由MemberDimension在内存中拆分成员/非成员，
+不再把成员列表作为IN / NOT IN的绑定参数各扫描一次
+"""
+
+from typing import List, Optional, Iterable
+
+# 项目组成员列表
+PROJECT_MEMBERS = [
+    'qingyiluan', 'ruihu', 'syroalxiao', 'froggynie', 'xinxu', 'kuixu', 
+    'liamyang', 'owenzhang', 'xinyinshu', 'weijiang', 'taojiang', 'eruditemao',
+    'dylanding', 'hongqinluo', 'mjyu', 'docwang', 'bowenduan', 'alexxliu',
+    'ivesxiong', 'xiweili', 'derekye', 'rawlinschen', 'tiantianhu', 'haoqunliu',
+    'penhuazhang', 'liangdonghu', 'rorozhang', 'quanzhang', 'pengfeili', 'kellymeng',
+    'qianlong', 'kaipengxu', 'norazeng', 'colinxu', 'xiaojianxia', 'joeyxu',
+    'rouzhitang', 'cccpeng', 'jiajian'
+]
+
+class MemberDimension:
+    """项目组成员维度"""
+
+    def __init__(self, members: Iterable[str]):
+        self.members: List[str] = list(members)
+        # 与SQL的 user_id IN (...) 一致，不区分大小写
+        self._lookup = frozenset(member.lower() for member in self.members)
+
+    def is_member(self, user_id: Optional[str]) -> bool:
+        """user_id为NULL时与 NOT IN ... OR user_id IS NULL 一致，属于非项目组成员"""
+        return user_id is not None and user_id.lower() in self._lookup
+
+# 进程内共享的成员维度
+member_dimension = MemberDimension(PROJECT_MEMBERS)
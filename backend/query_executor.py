@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Callable
+import asyncio
+import functools
+import logging
+
+logger = logging.getLogger(__name__)
+
+class ExecutorConfig:
+    """查询执行器配置类"""
+    def __init__(self):
+        # 线程池大小，同时也是所有接口合计的最大并发查询数
+        # 不超过db_session.py中连接池的pool_size=10，保证连接池不会被打满
+        self.max_workers = 10
+        # 未单独配置的接口默认并发上限
+        self.default_route_limit = 4
+        # 各接口的并发上限（key为/api/之后的路径）
+        self.route_limits = {
+            'template-query/stats': 16,
+            'non-template-query/stats': 16,
+            'channel-stats': 8,
+            'no-ticket-stats': 8,
+            'user-stats': 8,
+            'performance-detail': 8,
+            'template-query/performance': 4,
+            'non-template-query/performance': 4,
+            'step-performance': 4,
+            'scenario-stats': 4,
+            'weekly-query-trend': 4,
+            'weekly-step-trend': 2,
+            'weekly-channel-trend': 4,
+            'latency-percentiles': 8,
+            'slow-requests': 4,
+            'agent-error-details': 2,
+            'ds-error-details': 2,
+            'error-details/page': 8,
+            'error-details/full': 8,
+            'error-signatures': 4,
+            'user-retention-stats': 2,
+            'n-day-retention': 4,
+            'retention-matrix': 2,
+            'distinct-users': 4,
+            'churned-users': 2
+        }
+
+# 获取配置
+executor_config = ExecutorConfig()
+
+class QueryExecutor:
+    """
+    查询执行器：把阻塞的数据库调用放到有界线程池中执行，并按接口限制并发
+
+    - 全局并发不超过max_workers，避免数据库连接池被占满
+    - 每个接口有独立的并发上限，耗时的报表接口排队时不影响轻量接口
+    """
+
+    def __init__(self, config: ExecutorConfig = executor_config):
+        self.config = config
+        self._executor = ThreadPoolExecutor(
+            max_workers=config.max_workers,
+            thread_name_prefix='db-query'
+        )
+        self._global_semaphore = None
+        self._route_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._active: Dict[str, int] = {}
+        self._waiting: Dict[str, int] = {}
+
+    def get_route_limit(self, route: str) -> int:
+        """获取接口的并发上限"""
+        return self.config.route_limits.get(route, self.config.default_route_limit)
+
+    def _get_semaphores(self, route: str):
+        """获取全局和接口级信号量（在事件循环中首次使用时创建）"""
+        if self._global_semaphore is None:
+            self._global_semaphore = asyncio.Semaphore(self.config.max_workers)
+        if route not in self._route_semaphores:
+            self._route_semaphores[route] = asyncio.Semaphore(self.get_route_limit(route))
+        return self._global_semaphore, self._route_semaphores[route]
+
+    async def _limited(self, route: str, awaitable_factory: Callable):
+        """在接口级和全局并发限制内执行"""
+        global_semaphore, route_semaphore = self._get_semaphores(route)
+        self._waiting[route] = self._waiting.get(route, 0) + 1
+        started = False
+        try:
+            # 先占用接口级名额，再占用全局名额，避免排队中的请求占住全局名额
+            async with route_semaphore:
+                async with global_semaphore:
+                    self._waiting[route] -= 1
+                    started = True
+                    self._active[route] = self._active.get(route, 0) + 1
+                    try:
+                        return await awaitable_factory()
+                    finally:
+                        self._active[route] -= 1
+        finally:
+            # 排队期间被取消时也要扣减排队计数
+            if not started:
+                self._waiting[route] -= 1
+
+    async def run(self, route: str, func: Callable, *args) -> Any:
+        """在线程池中执行同步函数"""
+        loop = asyncio.get_running_loop()
+        return await self._limited(
+            route,
+            lambda: loop.run_in_executor(self._executor, functools.partial(func, *args))
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取各接口当前执行中和排队中的请求数"""
+        routes = sorted(set(self._active) | set(self._waiting))
+        return {
+            'max_workers': self.config.max_workers,
+            'routes': [
+                {
+                    'route': route,
+                    'limit': self.get_route_limit(route),
+                    'active': self._active.get(route, 0),
+                    'waiting': self._waiting.get(route, 0)
+                }
+                for route in routes
+            ]
+        }
+
+    def shutdown(self):
+        """关闭线程池"""
+        self._executor.shutdown(wait=False)
+        logger.info("查询线程池已关闭")
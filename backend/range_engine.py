@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+日期范围聚合引擎
+
+趋势接口按天循环查询时，请求次数随天数 × 维度增长。RangeEngine对整个日期范围只扫描一次，
+通过 GROUP BY DATE(create_time), 维度 在数据库中完成分组，再在Python中补齐没有数据的日期，
+趋势接口的耗时只与数据量有关
+"""
+
+from datetime import datetime, date, timedelta
+from typing import List, Dict, Tuple, Optional
+import logging
+from today_aggregator import HIVE_EXCLUDED_STEPS
+from project_members import member_dimension
+
+logger = logging.getLogger(__name__)
+
+# count_by_day允许分组的t_handler_logs维度及对应的列表达式
+DIMENSION_COLUMNS = {
+    'channel': 'channel'
+}
+
+def resolve_date_range(start_date: Optional[str], end_date: Optional[str], default_days: int = 7) -> Tuple[date, date]:
+    """解析日期范围，未指定时默认为截止今天的最近default_days天"""
+    if not end_date:
+        end_date = datetime.now().strftime('%Y-%m-%d')
+    end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
+    if not start_date:
+        start_date_obj = end_date_obj - timedelta(days=default_days - 1)
+    else:
+        start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date()
+    return start_date_obj, end_date_obj
+
+def iter_days(start_date: date, end_date: date) -> List[str]:
+    """返回范围内的所有日期（包含首尾），用于补齐没有数据的日期"""
+    days = []
+    current = start_date
+    while current <= end_date:
+        days.append(current.strftime('%Y-%m-%d'))
+        current += timedelta(days=1)
+    return days
+
+def _day_key(value) -> str:
+    """DATE(create_time)的结果统一为YYYY-MM-DD字符串"""
+    return value.strftime('%Y-%m-%d') if isinstance(value, (date, datetime)) else str(value)
+
+class RangeEngine:
+    """日期范围聚合引擎，通过传入的DatabaseManager执行查询"""
+
+    def __init__(self, db_manager):
+        self.db_manager = db_manager
+
+    @staticmethod
+    def _range_params(start_date: date, end_date: date) -> List[str]:
+        return [start_date.strftime('%Y-%m-%d'), (end_date + timedelta(days=1)).strftime('%Y-%m-%d')]
+
+    def count_by_day(self, start_date: date, end_date: date, dimensions: List[str] = None) -> Dict[tuple, Dict[str, int]]:
+        """
+        一次扫描t_handler_logs，按天、维度和是否项目组成员计数
+        返回 {(日期, 维度值...): {'count', 'member_count', 'non_member_count'}}，只包含有数据的组合
+        """
+        dimensions = list(dimensions or [])
+        for dimension in dimensions:
+            if dimension not in DIMENSION_COLUMNS:
+                raise ValueError(f"不支持的分组维度: {dimension}")
+        select_dimensions = ''.join(f"{DIMENSION_COLUMNS[d]} AS {d}, " for d in dimensions)
+        group_dimensions = ''.join(f", {d}" for d in dimensions)
+        # 按user_id分组，项目组成员在内存中区分（见project_members.MemberDimension）
+        sql = f"""
+            SELECT DATE(create_time) AS stat_date, {select_dimensions}
+                user_id, COUNT(1) AS count
+            FROM t_handler_logs
+            WHERE create_time >= %s AND create_time < %s
+            GROUP BY stat_date{group_dimensions}, user_id
+        """
+        params = tuple(self._range_params(start_date, end_date))
+
+        counts: Dict[tuple, Dict[str, int]] = {}
+        for row in self.db_manager.execute_query(sql, params):
+            key = (_day_key(row['stat_date']),) + tuple(row[d] for d in dimensions)
+            item = counts.setdefault(key, {'count': 0, 'member_count': 0, 'non_member_count': 0})
+            item['count'] += row['count']
+            is_member = member_dimension.is_member(row['user_id'])
+            item['member_count' if is_member else 'non_member_count'] += row['count']
+        return counts
+
+    def step_avg_by_day(self, start_date: date, end_date: date, step_names: List[str]) -> Dict[Tuple[str, str], float]:
+        """
+        一次扫描t_step_time_record，按天和环节计算平均耗时
+        QUERY_SCHEMA和SUB_QUERY排除范围内HIVE查询的请求，QUERY_SCHEMA只统计耗时大于1000的记录
+        返回 {(日期, 环节): 平均耗时}，只包含有数据的组合
+        """
+        range_params = self._range_params(start_date, end_date)
+        hive_steps = [step for step in step_names if step in HIVE_EXCLUDED_STEPS]
+        min_cost_conditions = [
+            (step, min_cost) for step, min_cost in HIVE_EXCLUDED_STEPS.items()
+            if step in hive_steps and min_cost is not None
+        ]
+
+        sql = f"""
+            SELECT DATE(create_time) AS stat_date, step_name, AVG(cost) AS avg_cost
+            FROM t_step_time_record
+            WHERE create_time >= %s AND create_time < %s
+            AND step_name IN ({','.join(['%s'] * len(step_names))})
+        """
+        params = range_params + list(step_names)
+        if hive_steps:
+            sql += f"""
+            AND (step_name NOT IN ({','.join(['%s'] * len(hive_steps))}) OR biz_seq NOT IN (
+                SELECT biz_seq FROM t_handler_logs
+                WHERE create_time >= %s AND create_time < %s
+                AND req_info LIKE %s
+            ))
+            """
+            params += hive_steps + range_params + ['%HIVE%']
+        for step, min_cost in min_cost_conditions:
+            sql += " AND (step_name <> %s OR cost > %s) "
+            params += [step, min_cost]
+        sql += " GROUP BY stat_date, step_name"
+
+        averages: Dict[Tuple[str, str], float] = {}
+        for row in self.db_manager.execute_query(sql, tuple(params)):
+            if row['avg_cost'] is not None:
+                averages[(_day_key(row['stat_date']), row['step_name'])] = round(float(row['avg_cost']), 2)
+        return averages
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+请求日志的特征标签
+
+对每条t_handler_logs日志只计算一次的特征，由label_job写入t_request_label：
+- scenario_mask: 命中的场景（scenario_rules.SCENARIO_RULES中第i个场景对应第i位）
+- db_type_mask: req_info包含的数据库类型（biz_classification.DB_TYPE_BITS）
+- is_template: req_info是否包含###（req_info为NULL时为NULL）
+- is_no_ticket: 免提单（req_info包含"sysNameList": []且rsp_info包含查询执行成功）
+- is_member: 是否项目组成员
+
+已完成标签的日期，场景统计、免提单统计和biz_seq分类都改为对这些整数列分组计数，不再扫描req_info/rsp_info。
+注意：场景按位存储，新增场景只能追加到SCENARIO_RULES末尾，调整顺序后需要重新生成历史标签
+"""
+
+from typing import List, Dict, Any, Optional
+from scenario_rules import SCENARIO_RULES, classify_scenarios, like_matcher
+from biz_classification import DB_TYPE_BITS
+from project_members import member_dimension
+
+# 场景对应的位
+SCENARIO_BITS = {rule['scenario']: 1 << i for i, rule in enumerate(SCENARIO_RULES)}
+
+# 模板查询、免提单的判断条件（与原SQL的LIKE条件一致）
+_TEMPLATE_MATCH = like_matcher('%###%')
+_NO_TICKET_REQ_MATCH = like_matcher('%"sysNameList": []%')
+_NO_TICKET_RSP_MATCH = like_matcher('%查询执行成功%')
+_DB_TYPE_MATCHES = [(bit, like_matcher(f'%{db_type}%')) for db_type, bit in DB_TYPE_BITS.items()]
+
+def compute_labels(req_info: Optional[str], rsp_info: Optional[str], user_id: Optional[str]) -> Dict[str, Any]:
+    """计算单条日志的特征标签"""
+    scenario_mask = 0
+    for scenario in classify_scenarios(req_info, rsp_info):
+        scenario_mask |= SCENARIO_BITS[scenario]
+
+    db_type_mask = 0
+    is_template = None
+    is_no_ticket = False
+    if req_info is not None:
+        upper_req = req_info.upper()
+        for bit, match in _DB_TYPE_MATCHES:
+            if match(upper_req, req_info):
+                db_type_mask |= bit
+        is_template = _TEMPLATE_MATCH(upper_req, req_info)
+        is_no_ticket = (
+            rsp_info is not None
+            and _NO_TICKET_REQ_MATCH(upper_req, req_info)
+            and _NO_TICKET_RSP_MATCH(rsp_info.upper(), rsp_info)
+        )
+
+    return {
+        'scenario_mask': scenario_mask,
+        'db_type_mask': db_type_mask,
+        'is_template': is_template,
+        'is_no_ticket': is_no_ticket,
+        'is_member': member_dimension.is_member(user_id)
+    }
+
+def decode_scenarios(scenario_mask: int) -> List[str]:
+    """场景位掩码转换为场景列表"""
+    return [scenario for scenario, bit in SCENARIO_BITS.items() if scenario_mask & bit]
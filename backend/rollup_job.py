@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+每日汇总任务
+
+为已结束的日期计算综合统计、渠道、场景、环节耗时、查询性能和最慢请求索引，写入rollup_models中的汇总表。
+服务启动后在后台定期补齐最近几天缺失的汇总，也可以通过命令行手动回填：
+
+    python rollup_job.py run
+    python rollup_job.py backfill --start 2025-01-01 --end 2025-01-31 [--force]
+"""
+
+from datetime import datetime, date, timedelta
+from typing import List
+import argparse
+import asyncio
+import json
+import logging
+from database import DatabaseManager
+from db_session import get_db_session
+from rollup_models import (
+    DailyRollupStatus, DailyErrorClassRollup, DailyChannelRollup,
+    DailyScenarioRollup, DailyStepRollup, DailyPerformanceRollup, DailyLatencySketch, DailySlowRequest
+)
+from latency_sketch import DDSketch
+
+logger = logging.getLogger(__name__)
+
+class RollupConfig:
+    """每日汇总任务配置类"""
+    def __init__(self):
+        # 是否在服务启动后运行后台汇总任务
+        self.enabled = True
+        # 后台任务检查间隔（秒）
+        self.interval_seconds = 3600
+        # 每次检查最近多少天缺失的汇总
+        self.lookback_days = 30
+        # 日期结束后等待多久再汇总（分钟），留给延迟写入的日志
+        self.settle_minutes = 30
+
+# 获取配置
+rollup_config = RollupConfig()
+
+# 汇总数据表（状态表单独处理，最后写入）
+ROLLUP_MODELS = [
+    DailyErrorClassRollup, DailyChannelRollup, DailyScenarioRollup,
+    DailyStepRollup, DailyPerformanceRollup, DailyLatencySketch, DailySlowRequest
+]
+
+class RollupJob:
+    """每日汇总任务：统计逻辑复用DatabaseManager的compute_*方法，结果一次性写入汇总表"""
+
+    def __init__(self, config: RollupConfig = rollup_config):
+        self.config = config
+        self.db_manager = DatabaseManager()
+
+    def get_latest_closed_date(self) -> date:
+        """获取最近一个可以汇总的日期（已结束且超过等待时间）"""
+        return (datetime.now() - timedelta(minutes=self.config.settle_minutes)).date() - timedelta(days=1)
+
+    def get_rolled_up_dates(self, start_date: date, end_date: date) -> set:
+        """获取日期范围内已完成汇总的日期"""
+        rows = self.db_manager.execute_query(
+            "SELECT stat_date FROM t_daily_rollup_status WHERE stat_date >= %s AND stat_date <= %s",
+            (start_date.strftime('%Y-%m-%d'), end_date.strftime('%Y-%m-%d'))
+        )
+        return {row['stat_date'] for row in rows}
+
+    def build_day(self, stat_date: date):
+        """计算并写入指定日期的所有汇总（已有数据会被覆盖）"""
+        if stat_date > self.get_latest_closed_date():
+            raise ValueError(f"日期{stat_date}尚未结束，不能汇总")
+        queryDate = stat_date.strftime('%Y-%m-%d')
+        started = datetime.now()
+
+        # 所有统计共用一个连接；计算耗时统计时顺带收集耗时数组和最慢请求，用于生成分位数草图和最慢请求索引
+        costs = {'step': {}, 'template': {}, 'non_template': {}}
+        slowest = {'step': {}, 'template': {}, 'non_template': {}}
+        with self.db_manager.unit_of_work():
+            class_counts = self.db_manager.compute_error_class_counts(queryDate)
+            channel_stats = self.db_manager.compute_channel_stats(queryDate)
+            scenario_stats = self.db_manager.compute_scenario_stats(queryDate)
+            step_stats = self.db_manager.compute_step_performance(queryDate, costs['step'], slow_sink=slowest['step'])
+            performance_stats = {
+                'template': self.db_manager.compute_template_query_performance(
+                    queryDate, costs['template'], slow_sink=slowest['template']),
+                'non_template': self.db_manager.compute_non_template_query_performance(
+                    queryDate, costs['non_template'], slow_sink=slowest['non_template'])
+            }
+
+        rows = []
+        for item in class_counts:
+            rows.append(DailyErrorClassRollup(
+                stat_date=stat_date,
+                outcome=item['outcome'],
+                error_class=item['error_class'],
+                subsystem_class=item['subsystem_class'],
+                count=item['count']
+            ))
+        for is_member, key in ((True, 'member_stats'), (False, 'non_member_stats')):
+            for item in channel_stats[key]:
+                rows.append(DailyChannelRollup(
+                    stat_date=stat_date,
+                    channel=item['channel'],
+                    is_member=is_member,
+                    count=item['count']
+                ))
+        for item in scenario_stats:
+            rows.append(DailyScenarioRollup(
+                stat_date=stat_date,
+                scenario=item['scenario'],
+                scenario_name=item['scenario_name'],
+                count=item['count'],
+                member_count=item['member_count'],
+                non_member_count=item['non_member_count']
+            ))
+        for item in step_stats:
+            rows.append(DailyStepRollup(
+                stat_date=stat_date,
+                step_name=item['step_name'],
+                avg_cost=item['avg_cost'],
+                p90_cost=item['p90_cost'],
+                max_cost=item['max_cost'],
+                percentiles=json.dumps(item['percentiles'])
+            ))
+        for query_kind, items in performance_stats.items():
+            for sort_order, item in enumerate(items):
+                rows.append(DailyPerformanceRollup(
+                    stat_date=stat_date,
+                    query_kind=query_kind,
+                    category=item['category'],
+                    db_type=item['db_type'],
+                    environment=item['environment'],
+                    avg_cost=float(item['avg_cost']),
+                    max_cost=float(item['max_cost']),
+                    p90_cost=float(item['p90_cost']),
+                    max_cost_biz_seq=item['max_cost_biz_seq'],
+                    sort_order=sort_order,
+                    percentiles=json.dumps(item['percentiles'])
+                ))
+        for kind, named_costs in costs.items():
+            for name, values in named_costs.items():
+                sketch = DDSketch.from_values(values)
+                rows.append(DailyLatencySketch(
+                    stat_date=stat_date,
+                    kind=kind,
+                    name=name,
+                    count=sketch.count,
+                    sketch=sketch.to_json()
+                ))
+        for kind, named_slowest in slowest.items():
+            for name, top_k in named_slowest.items():
+                for rank, (cost, biz_seq) in enumerate(top_k.items(), start=1):
+                    rows.append(DailySlowRequest(
+                        stat_date=stat_date,
+                        kind=kind,
+                        name=name,
+                        rank=rank,
+                        biz_seq=biz_seq,
+                        cost=float(cost)
+                    ))
+
+        # 删除旧数据、写入新数据和完成状态在同一事务中，读取方不会看到半成品
+        session = get_db_session()
+        try:
+            for model in ROLLUP_MODELS + [DailyRollupStatus]:
+                session.query(model).filter(model.stat_date == stat_date).delete(synchronize_session=False)
+            session.add_all(rows)
+            session.add(DailyRollupStatus(
+                stat_date=stat_date,
+                finished_at=datetime.now(),
+                source_rows=sum(item['count'] for item in class_counts)
+            ))
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            logger.error(f"写入{queryDate}每日汇总失败: {e}")
+            raise e
+        finally:
+            session.close()
+
+        logger.info(f"{queryDate}每日汇总完成，共{len(rows)}条，耗时{(datetime.now() - started).total_seconds():.1f}秒")
+
+    def backfill(self, start_date: date, end_date: date, force: bool = False) -> List[date]:
+        """回填日期范围内的汇总，force为True时重新计算已汇总的日期；返回成功汇总的日期"""
+        end_date = min(end_date, self.get_latest_closed_date())
+        if start_date > end_date:
+            return []
+        done = set() if force else self.get_rolled_up_dates(start_date, end_date)
+
+        built = []
+        current = start_date
+        while current <= end_date:
+            if current not in done:
+                try:
+                    self.build_day(current)
+                    built.append(current)
+                except Exception as e:
+                    # 单日失败不影响其它日期，下次运行时会重试
+                    logger.error(f"{current}每日汇总失败: {e}")
+            current += timedelta(days=1)
+        return built
+
+    def run_pending(self) -> List[date]:
+        """补齐最近lookback_days天内缺失的汇总"""
+        end_date = self.get_latest_closed_date()
+        start_date = end_date - timedelta(days=self.config.lookback_days - 1)
+        return self.backfill(start_date, end_date)
+
+async def run_rollup_loop(config: RollupConfig = rollup_config):
+    """后台定期补齐缺失的汇总（在线程池中执行，不阻塞事件循环）"""
+    loop = asyncio.get_running_loop()
+    job = RollupJob(config)
+    while True:
+        try:
+            built = await loop.run_in_executor(None, job.run_pending)
+            if built:
+                logger.info(f"后台汇总完成{len(built)}天")
+        except Exception as e:
+            logger.error(f"后台汇总任务失败: {e}")
+        await asyncio.sleep(config.interval_seconds)
+
+def main():
+    parser = argparse.ArgumentParser(description='每日汇总任务')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('run', help='补齐最近缺失的汇总')
+    backfill_parser = subparsers.add_parser('backfill', help='回填指定日期范围的汇总')
+    backfill_parser.add_argument('--start', required=True, help='开始日期，格式YYYY-MM-DD')
+    backfill_parser.add_argument('--end', required=True, help='结束日期，格式YYYY-MM-DD')
+    backfill_parser.add_argument('--force', action='store_true', help='重新计算已汇总的日期')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    from db_session import first_init_db
+    first_init_db()
+
+    job = RollupJob()
+    if args.command == 'run':
+        built = job.run_pending()
+    else:
+        built = job.backfill(
+            datetime.strptime(args.start, '%Y-%m-%d').date(),
+            datetime.strptime(args.end, '%Y-%m-%d').date(),
+            force=args.force
+        )
+    logger.info(f"共汇总{len(built)}天")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+每日汇总（rollup）表模型
+
+已结束日期的统计结果由rollup_job写入这些表，DatabaseManager查询历史日期时直接读取，
+不再扫描t_handler_logs / t_step_time_record原始日志
+"""
+
+from sqlalchemy import Column, Integer, BigInteger, String, Date, DateTime, Float, Boolean, Text, Index
+from db_session import Base
+
+
+class DailyRollupStatus(Base):
+    """每日汇总完成状态，存在记录表示该日期的所有汇总表都已生成"""
+    __tablename__ = 't_daily_rollup_status'
+
+    stat_date = Column(Date, primary_key=True, comment='统计日期')
+    finished_at = Column(DateTime, nullable=False, comment='汇总完成时间')
+    source_rows = Column(BigInteger, nullable=False, default=0, comment='当日t_handler_logs记录数')
+
+
+class DailyErrorClassRollup(Base):
+    """每日按错误分类的请求数（综合统计卡片）"""
+    __tablename__ = 't_daily_error_class_rollup'
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    stat_date = Column(Date, nullable=False, comment='统计日期')
+    outcome = Column(String(16), nullable=False, comment='请求结果：success/error/null')
+    error_class = Column(String(16), nullable=False, comment='业务/系统错误分类')
+    subsystem_class = Column(String(32), nullable=False, comment='子系统错误分类')
+    count = Column(BigInteger, nullable=False, default=0, comment='请求数')
+
+    __table_args__ = (
+        Index('idx_error_class_rollup_date', 'stat_date'),
+    )
+
+
+class DailyChannelRollup(Base):
+    """每日按渠道、是否项目组成员的请求数"""
+    __tablename__ = 't_daily_channel_rollup'
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    stat_date = Column(Date, nullable=False, comment='统计日期')
+    channel = Column(String(64), nullable=False, comment='渠道')
+    is_member = Column(Boolean, nullable=False, comment='是否项目组成员')
+    count = Column(BigInteger, nullable=False, default=0, comment='请求数')
+
+    __table_args__ = (
+        Index('idx_channel_rollup_date', 'stat_date'),
+    )
+
+
+class DailyScenarioRollup(Base):
+    """每日各场景的请求数"""
+    __tablename__ = 't_daily_scenario_rollup'
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    stat_date = Column(Date, nullable=False, comment='统计日期')
+    scenario = Column(String(32), nullable=False, comment='场景')
+    scenario_name = Column(String(64), nullable=False, comment='场景名称')
+    count = Column(BigInteger, nullable=False, default=0, comment='请求数')
+    member_count = Column(BigInteger, nullable=False, default=0, comment='项目组成员请求数')
+    non_member_count = Column(BigInteger, nullable=False, default=0, comment='非项目组成员请求数')
+
+    __table_args__ = (
+        Index('idx_scenario_rollup_date', 'stat_date'),
+    )
+
+
+class DailyStepRollup(Base):
+    """每日各环节耗时汇总"""
+    __tablename__ = 't_daily_step_rollup'
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    stat_date = Column(Date, nullable=False, comment='统计日期')
+    step_name = Column(String(64), nullable=False, comment='环节名称')
+    avg_cost = Column(Float, nullable=False, comment='平均耗时')
+    p90_cost = Column(Float, nullable=False, comment='P90耗时')
+    max_cost = Column(Float, nullable=False, comment='最大耗时')
+    percentiles = Column(Text, nullable=True, comment='默认百分位耗时JSON，如{"p50": ..., "p90": ..., "p99": ...}')
+
+    __table_args__ = (
+        Index('idx_step_rollup_date', 'stat_date'),
+    )
+
+
+class DailyPerformanceRollup(Base):
+    """每日模板/非模板查询各类别的性能汇总"""
+    __tablename__ = 't_daily_performance_rollup'
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    stat_date = Column(Date, nullable=False, comment='统计日期')
+    query_kind = Column(String(16), nullable=False, comment='template 模板查询 / non_template 非模板查询')
+    category = Column(String(64), nullable=False, comment='类别')
+    db_type = Column(String(16), nullable=False, comment='数据库类型')
+    environment = Column(String(16), nullable=False, comment='环境')
+    avg_cost = Column(Float, nullable=False, comment='平均耗时')
+    max_cost = Column(Float, nullable=False, comment='最大耗时')
+    p90_cost = Column(Float, nullable=False, comment='P90耗时')
+    max_cost_biz_seq = Column(String(64), nullable=True, comment='最大耗时对应的biz_seq')
+    sort_order = Column(Integer, nullable=False, default=0, comment='类别顺序')
+    percentiles = Column(Text, nullable=True, comment='默认百分位耗时JSON，如{"p50": ..., "p90": ..., "p99": ...}')
+
+    __table_args__ = (
+        Index('idx_performance_rollup_date', 'stat_date', 'query_kind'),
+    )
+
+
+class DailyLatencySketch(Base):
+    """每日各环节、各查询类别的耗时分位数草图（latency_sketch.DDSketch序列化后的JSON）"""
+    __tablename__ = 't_daily_latency_sketch'
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    stat_date = Column(Date, nullable=False, comment='统计日期')
+    kind = Column(String(16), nullable=False, comment='step 环节 / template 模板查询 / non_template 非模板查询')
+    name = Column(String(64), nullable=False, comment='环节名称或查询类别')
+    count = Column(BigInteger, nullable=False, default=0, comment='耗时记录数')
+    sketch = Column(Text, nullable=False, comment='草图JSON')
+
+    __table_args__ = (
+        Index('idx_latency_sketch_kind_date', 'kind', 'stat_date'),
+    )
+
+
+class DailySlowRequest(Base):
+    """每日各查询类别、各环节耗时最长的请求（slow_requests.TopK，每个类别/环节最多top_k条）"""
+    __tablename__ = 't_daily_slow_request'
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True)
+    stat_date = Column(Date, nullable=False, comment='统计日期')
+    kind = Column(String(16), nullable=False, comment='step 环节 / template 模板查询 / non_template 非模板查询')
+    name = Column(String(64), nullable=False, comment='环节名称或查询类别')
+    rank = Column(Integer, nullable=False, comment='当天排名，从1开始')
+    biz_seq = Column(String(64), nullable=False, comment='业务流水号')
+    cost = Column(Float, nullable=False, comment='耗时（查询类别为该请求的总耗时）')
+
+    __table_args__ = (
+        Index('idx_slow_request_kind_name_cost', 'kind', 'name', 'stat_date', 'cost'),
+    )
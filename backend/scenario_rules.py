@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+查询场景分类规则
+
+各场景的判断条件（EXPLAIN → IF( → COUNT → DESC/SHOW → DISTINCT → TIME…FROM → 配置 → …的决策列表）
+预编译为一个Python分类器：每条日志的req_info/rsp_info只转换一次大写，所有模式只判断一次，各场景共用判断结果。
+场景统计（compute_scenario_stats）和当天数据的增量聚合都通过它在应用中一次遍历日志完成
+
+吞吐量测试：python benchmarks/scenario_benchmark.py --rows 200000
+
+注意：
+- 场景之间不是互斥的（如配置查询只看rsp_info，与其它场景可以同时命中），一条日志可能属于多个场景
+- LIKE模式中%匹配任意多个字符、_匹配单个字符；与MySQL默认排序规则一致，不区分大小写
+- 与SQL的NULL语义一致：列为NULL时LIKE和NOT LIKE都不成立
+"""
+
+from typing import List, Dict, Any, Optional, Callable, Tuple, Mapping
+import re
+
+# 条件格式：
+# - ('like', column, pattern)        column LIKE pattern
+# - ('not_like', column, pattern)    column NOT LIKE pattern
+# - ('any', [条件...])               任一条件成立（OR）
+# 场景的条件列表之间为AND关系
+
+# 各场景共用的前置排除条件
+_NOT_EXPLAIN = ('not_like', 'req_info', '%EXPLAIN%')
+_NOT_IF = ('not_like', 'req_info', '%IF(%')
+_NOT_COUNT = ('not_like', 'req_info', '%COUNT%')
+_NOT_SHOW = ('not_like', 'req_info', '%SHOW%')
+_DESC_ONLY_WITH_SELECT = ('any', [('not_like', 'req_info', '%DESC%'), ('like', 'req_info', '%SELECT%')])
+_NOT_DISTINCT = ('not_like', 'req_info', '%DISTINCT%')
+_NOT_TIME_FROM = ('not_like', 'req_info', '%TIME%FROM%')
+
+# 排除执行计划、Y/N、数量、表结构、枚举、时间查询之后的剩余查询
+_REMAINING = [_NOT_EXPLAIN, _NOT_IF, _NOT_COUNT, _NOT_SHOW, _DESC_ONLY_WITH_SELECT, _NOT_DISTINCT, _NOT_TIME_FROM]
+
+# 提单相关的关键字
+_TICKET_REQ_PATTERNS = ['%提单%', '%确认%', '%同意%']
+_TICKET_RSP_PATTERNS = ['%很荣幸能够%', '%用户协议%']
+
+SCENARIO_RULES = [
+    {
+        'scenario': 'execution_plan',
+        'scenario_name': '执行计划',
+        'conditions': [('like', 'req_info', '%EXPLAIN%')]
+    },
+    {
+        'scenario': 'yn_query',
+        'scenario_name': 'Y/N查询',
+        'conditions': [_NOT_EXPLAIN, ('like', 'req_info', '%IF(%')]
+    },
+    {
+        'scenario': 'count_query',
+        'scenario_name': '数量查询',
+        'conditions': [_NOT_EXPLAIN, _NOT_IF, ('like', 'req_info', '%COUNT%')]
+    },
+    {
+        'scenario': 'table_structure',
+        'scenario_name': '表结构查询',
+        'conditions': [
+            _NOT_EXPLAIN, _NOT_IF, _NOT_COUNT,
+            ('any', [('like', 'req_info', '%DESC%'), ('like', 'req_info', '%SHOW%')]),
+            ('not_like', 'req_info', '%SELECT%')
+        ]
+    },
+    {
+        'scenario': 'enum_query',
+        'scenario_name': '枚举查询',
+        'conditions': [
+            _NOT_EXPLAIN, _NOT_IF, _NOT_COUNT, _NOT_SHOW, _DESC_ONLY_WITH_SELECT,
+            ('like', 'req_info', '%DISTINCT%')
+        ]
+    },
+    {
+        'scenario': 'time_query',
+        'scenario_name': '时间查询',
+        'conditions': [
+            _NOT_EXPLAIN, _NOT_IF, _NOT_COUNT, _NOT_SHOW, _DESC_ONLY_WITH_SELECT, _NOT_DISTINCT,
+            ('like', 'req_info', '%TIME%FROM%')
+        ]
+    },
+    {
+        'scenario': 'config_query',
+        'scenario_name': '配置查询',
+        'conditions': [('like', 'rsp_info', '%SQL_TITLE%配置%')]
+    },
+    {
+        'scenario': 'field_length',
+        'scenario_name': '字段长度查询',
+        'conditions': _REMAINING + [('like', 'req_info', '%LENGTH%')]
+    },
+    {
+        'scenario': 'ticket_related',
+        'scenario_name': '提单相关',
+        'conditions': _REMAINING + [
+            ('any', [('like', 'req_info', p) for p in _TICKET_REQ_PATTERNS]
+                    + [('like', 'rsp_info', p) for p in _TICKET_RSP_PATTERNS])
+        ]
+    },
+    {
+        'scenario': 'other',
+        'scenario_name': '其他',
+        'conditions': _REMAINING
+            + [('not_like', 'req_info', p) for p in _TICKET_REQ_PATTERNS]
+            + [('not_like', 'rsp_info', p) for p in _TICKET_RSP_PATTERNS]
+    }
+]
+
+# 场景名称
+SCENARIO_NAMES = {rule['scenario']: rule['scenario_name'] for rule in SCENARIO_RULES}
+
+
+def like_to_regex(pattern: str) -> 're.Pattern':
+    """把MySQL LIKE模式编译为正则表达式（不区分大小写，首尾的%不需要锚定）"""
+    parts = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == '\\' and i + 1 < len(pattern):
+            i += 1
+            parts.append(re.escape(pattern[i]))
+        elif char == '%':
+            parts.append('.*')
+        elif char == '_':
+            parts.append('.')
+        else:
+            parts.append(re.escape(char))
+        i += 1
+    regex = ''.join(parts)
+    # 首尾为%时用search代替.*匹配，避免长文本上的回溯
+    regex = regex[2:] if regex.startswith('.*') else r'\A' + regex
+    regex = regex[:-2] if regex.endswith('.*') else regex + r'\Z'
+    return re.compile(regex, re.IGNORECASE | re.DOTALL)
+
+
+def like_matcher(pattern: str) -> Callable[[str, str], bool]:
+    """
+    把LIKE模式编译为匹配函数，参数为(大写文本, 原文本)
+    形如%X%且X中没有通配符的模式直接在大写文本中做子串判断，其余模式使用正则
+    """
+    inner = pattern[1:-1]
+    if len(pattern) >= 2 and pattern[0] == '%' and pattern[-1] == '%' and not any(c in inner for c in '%_\\'):
+        needle = inner.upper()
+        return lambda upper_text, text: needle in upper_text
+    search = like_to_regex(pattern).search
+    return lambda upper_text, text: search(text) is not None
+
+
+# 所有场景用到的 (列, 模式)，每条日志每个模式只判断一次，各场景共用判断结果
+_ATOMS: List[Tuple[str, str]] = []
+_ATOM_INDEX = {}
+
+def _atom_index(column: str, pattern: str) -> int:
+    key = (column, pattern)
+    if key not in _ATOM_INDEX:
+        _ATOM_INDEX[key] = len(_ATOMS)
+        _ATOMS.append(key)
+    return _ATOM_INDEX[key]
+
+
+def _condition_to_python(condition: Tuple) -> Callable[[List[Optional[bool]]], bool]:
+    """把单个条件编译为判断函数，参数为各模式的判断结果（列为NULL时为None）"""
+    kind = condition[0]
+    if kind == 'any':
+        predicates = [_condition_to_python(c) for c in condition[1]]
+        return lambda atoms: any(predicate(atoms) for predicate in predicates)
+    if kind not in ('like', 'not_like'):
+        raise ValueError(f"未知的场景条件: {kind}")
+    column = condition[1]
+    if column not in ('req_info', 'rsp_info'):
+        raise ValueError(f"未知的场景条件列: {column}")
+    index = _atom_index(column, condition[2])
+    # 与SQL的NULL语义一致：None时LIKE和NOT LIKE都不成立
+    if kind == 'like':
+        return lambda atoms: atoms[index] is True
+    return lambda atoms: atoms[index] is False
+
+
+# 预编译的场景判断函数
+_COMPILED_RULES = [
+    (rule['scenario'], [_condition_to_python(c) for c in rule['conditions']])
+    for rule in SCENARIO_RULES
+]
+
+# 按列分组的模式匹配函数：[(模式序号, 匹配函数)]
+_REQ_MATCHERS = [(i, like_matcher(pattern)) for i, (column, pattern) in enumerate(_ATOMS) if column == 'req_info']
+_RSP_MATCHERS = [(i, like_matcher(pattern)) for i, (column, pattern) in enumerate(_ATOMS) if column == 'rsp_info']
+
+
+def _evaluate_atoms(req_info: Optional[str], rsp_info: Optional[str]) -> List[Optional[bool]]:
+    """对一条日志判断所有模式，每列只转换一次大写"""
+    atoms: List[Optional[bool]] = [None] * len(_ATOMS)
+    if req_info is not None:
+        upper_req = req_info.upper()
+        for index, match in _REQ_MATCHERS:
+            atoms[index] = match(upper_req, req_info)
+    if rsp_info is not None:
+        upper_rsp = rsp_info.upper()
+        for index, match in _RSP_MATCHERS:
+            atoms[index] = match(upper_rsp, rsp_info)
+    return atoms
+
+
+def classify_scenarios(req_info: Optional[str], rsp_info: Optional[str]) -> List[str]:
+    """返回单条日志命中的所有场景"""
+    atoms = _evaluate_atoms(req_info, rsp_info)
+    return [
+        scenario for scenario, predicates in _COMPILED_RULES
+        if all(predicate(atoms) for predicate in predicates)
+    ]
+
+
+def build_scenario_stats(scenario_counts: Mapping[Tuple[str, bool], int]) -> List[Dict[str, Any]]:
+    """
+    由 (场景, 是否项目组成员) -> 请求数 生成场景统计结果（所有场景都返回，按请求数降序）
+    与DatabaseManager.compute_scenario_stats的返回格式一致
+    """
+    results = []
+    for rule in SCENARIO_RULES:
+        member_count = scenario_counts.get((rule['scenario'], True), 0)
+        non_member_count = scenario_counts.get((rule['scenario'], False), 0)
+        results.append({
+            'scenario': rule['scenario'],
+            'scenario_name': rule['scenario_name'],
+            'count': member_count + non_member_count,
+            'member_count': member_count,
+            'non_member_count': non_member_count
+        })
+    return sorted(results, key=lambda x: x['count'], reverse=True)
+
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+接口响应序列化
+
+所有接口响应都通过dumps序列化：安装了orjson时使用orjson（比标准库json快数倍），否则回退到标准库json，
+两种方式对Decimal、date/datetime、numpy数值和array的输出一致，不再需要先递归复制一遍转换Decimal。
+客户端支持时，较大的响应体使用brotli（安装了brotli时）或gzip压缩。
+
+序列化耗时和响应大小测试（错误明细和趋势接口的样例数据）：
+
+    python benchmarks/serializer_benchmark.py --rows 20000
+"""
+
+from typing import Any, Optional, Tuple
+from datetime import datetime, date
+from decimal import Decimal
+import gzip
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+class SerializerConfig:
+    """响应序列化配置类"""
+    def __init__(self):
+        # 安装了orjson时是否使用
+        self.use_orjson = True
+        # 是否压缩响应体（需要客户端的Accept-Encoding支持br或gzip）
+        self.compression_enabled = True
+        # 小于该字节数的响应不压缩
+        self.compress_min_bytes = 1024
+        # gzip压缩级别和brotli压缩质量（较低的级别压缩更快，响应多为重复度很高的JSON）
+        self.gzip_level = 5
+        self.brotli_quality = 4
+
+# 获取配置
+serializer_config = SerializerConfig()
+
+def _default(obj: Any) -> Any:
+    """orjson和标准库json都不能直接序列化的类型"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, datetime):
+        return obj.strftime('%Y-%m-%d %H:%M:%S')
+    if isinstance(obj, date):
+        return obj.strftime('%Y-%m-%d')
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    # numpy数值/数组、array.array
+    if hasattr(obj, 'tolist'):
+        return obj.tolist()
+    raise TypeError(f"无法序列化的类型: {type(obj).__name__}")
+
+if orjson is not None:
+    # datetime交给_default，与标准库回退的格式一致；字典的非字符串键转换为字符串
+    _ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+
+def dumps(obj: Any) -> bytes:
+    """序列化为UTF-8编码的JSON"""
+    if orjson is not None and serializer_config.use_orjson:
+        return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS)
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def _accepted_encodings(accept_encoding: str) -> set:
+    """解析Accept-Encoding（忽略q=0的编码）"""
+    encodings = set()
+    for item in accept_encoding.lower().split(','):
+        parts = [part.strip() for part in item.split(';')]
+        if parts[0] and 'q=0' not in parts[1:]:
+            encodings.add(parts[0])
+    return encodings
+
+def compress(body: bytes, accept_encoding: str) -> Tuple[bytes, Optional[str]]:
+    """按客户端支持的编码压缩响应体，返回 (响应体, Content-Encoding)，不压缩时编码为None"""
+    if not serializer_config.compression_enabled or len(body) < serializer_config.compress_min_bytes:
+        return body, None
+    encodings = _accepted_encodings(accept_encoding or '')
+    if brotli is not None and 'br' in encodings:
+        return brotli.compress(body, quality=serializer_config.brotli_quality), 'br'
+    if 'gzip' in encodings:
+        return gzip.compress(body, compresslevel=serializer_config.gzip_level), 'gzip'
+    return body, None
+
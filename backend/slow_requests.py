@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+最慢请求索引
+
+每日汇总时为每个查询类别和每个环节保留耗时最长的top_k个请求（最小堆，单次遍历，内存只与top_k有关），
+写入t_daily_slow_request。查询一段日期内最慢的请求只需要按耗时读取这些记录，不再对t_step_time_record整体排序；
+返回的biz_seq可直接用于性能详情查询
+"""
+
+from typing import List, Any, Iterable, Tuple
+import heapq
+import itertools
+
+class SlowRequestConfig:
+    """最慢请求索引配置类"""
+    def __init__(self):
+        # 每天每个类别/环节保留的最慢请求数，也是查询时limit的上限
+        self.top_k = 100
+
+# 获取配置
+slow_request_config = SlowRequestConfig()
+
+class TopK:
+    """保留耗时最长的k个请求（最小堆，堆顶为当前第k慢的请求）"""
+
+    def __init__(self, k: int):
+        self.k = k
+        self._heap: List[Tuple[float, int, Any]] = []
+        # 耗时相同时按加入顺序比较（先加入的优先保留），避免比较附带的数据
+        self._counter = itertools.count()
+
+    def push(self, cost: float, item: Any):
+        """加入一个请求，item为请求的附带信息（如biz_seq）"""
+        if self.k <= 0:
+            return
+        # 序号取负：耗时相同时后加入的请求先被淘汰，结果与按耗时稳定排序后取前k个一致
+        entry = (cost, -next(self._counter), item)
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, entry)
+        elif cost > self._heap[0][0]:
+            heapq.heapreplace(self._heap, entry)
+
+    def push_many(self, pairs: Iterable[Tuple[float, Any]]):
+        for cost, item in pairs:
+            self.push(cost, item)
+
+    def items(self) -> List[Tuple[float, Any]]:
+        """按耗时从大到小返回 (耗时, 附带信息) 列表，耗时相同时按加入顺序"""
+        return [(cost, item) for cost, _, item in sorted(self._heap, key=lambda entry: (-entry[0], -entry[1]))]
+
+    def __len__(self) -> int:
+        return len(self._heap)
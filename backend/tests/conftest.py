@@ -0,0 +1,8 @@
+# -*- coding: utf-8 -*-
+
+"""后端模块为同目录平铺导入（如 from database import DatabaseManager），测试时把backend目录加入导入路径"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
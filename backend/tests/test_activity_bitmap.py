@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+"""活跃用户位图和用户编号：计数、序列化往返，临时编号不与已保存的编号或位图中的编号冲突"""
+
+import random
+
+import pytest
+
+from activity_bitmap import UserBitmap, UserIndex, retention_rate
+
+
+def test_bitmap_add_and_count():
+    bitmap = UserBitmap()
+    assert bitmap.count() == 0 and bitmap.max_user_no() == -1 and bitmap.user_nos() == []
+    bitmap.add_many([0, 3, 3, 64, 1000])
+    bitmap.add(5)
+    assert bitmap.count() == 5
+    assert bitmap.user_nos() == [0, 3, 5, 64, 1000]
+    assert bitmap.max_user_no() == 1000
+    assert 64 in bitmap and 63 not in bitmap and 2000 not in bitmap
+
+
+def test_count_matches_exact_set():
+    generator = random.Random(7)
+    user_nos = {generator.randrange(200000) for _ in range(5000)}
+    bitmap = UserBitmap()
+    bitmap.add_many(user_nos)
+    assert bitmap.count() == len(user_nos)
+    assert bitmap.user_nos() == sorted(user_nos)
+
+
+def test_bitmap_set_operations():
+    a = UserBitmap()
+    a.add_many([1, 2, 3, 100])
+    b = UserBitmap()
+    b.add_many([2, 3, 4])
+    assert (a & b).user_nos() == [2, 3]
+    assert (a | b).user_nos() == [1, 2, 3, 4, 100]
+    assert (a - b).user_nos() == [1, 100]
+    # 运算不修改原位图
+    assert a.user_nos() == [1, 2, 3, 100]
+
+
+@pytest.mark.parametrize('user_nos', [[], [0], [7, 8], [0, 12345, 1 << 20], list(range(0, 100000, 3))])
+def test_bytes_round_trip(user_nos):
+    bitmap = UserBitmap()
+    bitmap.add_many(user_nos)
+    restored = UserBitmap.from_bytes(bitmap.to_bytes())
+    assert restored.bits == bitmap.bits
+    assert restored.user_nos() == sorted(user_nos)
+
+
+@pytest.mark.parametrize('data', [None, b''])
+def test_from_empty_bytes(data):
+    assert UserBitmap.from_bytes(data).count() == 0
+
+
+def test_index_is_case_insensitive():
+    index = UserIndex([{'user_id': 'Alice', 'user_no': 0}, {'user_id': 'bob', 'user_no': 1}])
+    assert index.get('alice') == 0 and index.get('ALICE') == 0
+    assert index.lookup('BOB') == 1
+    assert index.get('carol') is None
+    # 未登记的用户只分配一次临时编号，大小写不同视为同一用户
+    assert index.lookup('Carol') == index.lookup('carol') == 2
+    assert index.user_ids[2] == 'Carol'
+
+
+def test_temp_numbers_follow_saved_numbers():
+    index = UserIndex([{'user_id': 'a', 'user_no': 0}, {'user_id': 'b', 'user_no': 50}, {'user_id': 'c', 'user_no': 7}])
+    assert index.max_saved_no == 50
+    temp = [index.lookup(f'new{i}') for i in range(5)]
+    assert temp == [51, 52, 53, 54, 55]
+
+
+def test_temp_numbers_do_not_collide_after_reserve():
+    """位图可能包含字典加载之后才保存的用户编号，临时编号必须从位图的最大编号之后开始"""
+    index = UserIndex([{'user_id': 'a', 'user_no': 0}, {'user_id': 'b', 'user_no': 1}])
+    stored = [UserBitmap(), UserBitmap()]
+    stored[0].add_many([0, 1, 9])
+    stored[1].add_many([1, 4])
+    for bitmap in stored:
+        index.reserve(bitmap.max_user_no())
+    # 较小的编号不会让临时编号回退
+    index.reserve(-1)
+
+    today = index.bitmap(['A', 'new1', None, 'new2', 'NEW1'])
+    assert today.user_nos() == [0, 10, 11]
+    for bitmap in stored:
+        assert (today & bitmap).user_nos() == ([0] if 0 in bitmap else [])
+
+
+def test_retention_rate():
+    assert retention_rate(1, 3) == 33.33
+    assert retention_rate(0, 0) == 0
+    assert retention_rate(5, 5) == 100.0
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+
+"""按天的biz_seq分类：类别匹配、标签位掩码解码、分类SQL参数和按天缓存"""
+
+from datetime import date, timedelta
+
+import pytest
+
+import biz_classification
+from biz_classification import (
+    BizSeqClass, CLASSIFICATION_SQL, DB_TYPE_BITS,
+    _classification_params, decode_db_types, get_day_classification, match_categories,
+)
+
+
+def _categories(db_types, is_production, query_kind='template'):
+    biz_class = BizSeqClass(
+        db_types={'template': frozenset(db_types), 'non_template': frozenset()},
+        is_production=is_production,
+        is_hive='HIVE' in db_types
+    )
+    return [category['category'] for category in match_categories(biz_class, query_kind)]
+
+
+def test_match_categories():
+    assert _categories({'TDSQL'}, False) == ['TDSQL-准生产环境']
+    assert _categories({'TDSQL'}, True) == ['TDSQL-生产环境']
+    # HIVE不区分环境
+    assert _categories({'HIVE'}, False) == ['HIVE-生产环境']
+    # 同时包含多个数据库类型时属于多个类别（按PERFORMANCE_CATEGORIES顺序）
+    assert _categories({'HIVE', 'TIDB', 'TDSQL'}, True) == ['TDSQL-生产环境', 'TIDB-生产环境', 'HIVE-生产环境']
+    assert _categories({'TDSQL'}, True, 'non_template') == []
+    assert match_categories(None, 'template') == []
+
+
+def test_decode_db_types():
+    assert decode_db_types(0) == frozenset()
+    assert decode_db_types(DB_TYPE_BITS['TDSQL'] | DB_TYPE_BITS['HIVE']) == frozenset({'TDSQL', 'HIVE'})
+    assert decode_db_types(sum(DB_TYPE_BITS.values())) == frozenset(DB_TYPE_BITS)
+
+
+def test_classification_params_match_placeholders():
+    params = _classification_params('2025-01-01', '2025-01-02')
+    assert CLASSIFICATION_SQL.count('%s') == len(params)
+    assert params[-2:] == ('2025-01-01', '2025-01-02')
+
+
+class _FakeDbManager:
+    """按SQL返回固定结果的数据访问对象，记录查询次数"""
+
+    def __init__(self, labelled, rows):
+        self.labelled = labelled
+        self.rows = rows
+        self.calls = 0
+
+    def execute_query_columns(self, sql, params):
+        self.calls += 1
+        return {'biz_seq': ['B1']}
+
+    def is_labelled(self, queryDate):
+        return self.labelled
+
+    def execute_query_stream(self, sql, params, batch_size):
+        self.calls += 1
+        yield self.rows
+
+
+@pytest.fixture(autouse=True)
+def _clear_day_cache():
+    biz_classification._day_cache.clear()
+    yield
+    biz_classification._day_cache.clear()
+
+
+def test_get_day_classification_from_logs():
+    row = {'biz_seq': 'B1', 'is_hive': 0}
+    for kind in ('template', 'non_template'):
+        for db_type in ('tdsql', 'tidb', 'hive'):
+            row[f'{kind}_{db_type}'] = 1 if (kind, db_type) == ('template', 'tdsql') else 0
+    db_manager = _FakeDbManager(False, [row, dict(row, biz_seq='B2', non_template_hive=1, is_hive=1)])
+    classification = get_day_classification(db_manager, '2025-01-01')
+    assert classification['B1'] == BizSeqClass(
+        db_types={'template': frozenset({'TDSQL'}), 'non_template': frozenset()}, is_production=True, is_hive=False
+    )
+    assert classification['B2'].db_types['non_template'] == frozenset({'HIVE'})
+    assert classification['B2'].is_production is False and classification['B2'].is_hive is True
+
+
+def test_get_day_classification_from_labels():
+    rows = [{'biz_seq': 'B1', 'template_mask': DB_TYPE_BITS['TIDB'], 'non_template_mask': 0,
+             'db_type_mask': DB_TYPE_BITS['TIDB'] | DB_TYPE_BITS['HIVE']}]
+    classification = get_day_classification(_FakeDbManager(True, rows), '2025-01-01')
+    assert classification['B1'] == BizSeqClass(
+        db_types={'template': frozenset({'TIDB'}), 'non_template': frozenset()}, is_production=True, is_hive=True
+    )
+
+
+def test_day_classification_is_cached():
+    db_manager = _FakeDbManager(True, [])
+    get_day_classification(db_manager, '2025-01-01')
+    calls = db_manager.calls
+    get_day_classification(db_manager, '2025-01-01')
+    assert db_manager.calls == calls
+    get_day_classification(db_manager, '2025-01-02')
+    assert db_manager.calls == 2 * calls
+
+
+def test_day_cache_expiry_and_size(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(biz_classification.time, 'monotonic', lambda: now[0])
+    today = date.today()
+    biz_classification._set_cached('classification', 'today', today, 'value')
+    biz_classification._set_cached('classification', 'history', today - timedelta(days=1), 'value')
+    now[0] += biz_classification.DAY_CACHE_TODAY_TTL + 1
+    assert biz_classification._get_cached('classification', 'today') is None
+    assert biz_classification._get_cached('classification', 'history') == 'value'
+
+    for i in range(biz_classification.DAY_CACHE_SIZE + 5):
+        biz_classification._set_cached('classification', f'day{i}', today - timedelta(days=1), i)
+    assert len(biz_classification._day_cache) == biz_classification.DAY_CACHE_SIZE
+    assert biz_classification._get_cached('classification', 'day0') is None
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+
+"""按天统计的原始日志查询范围：任何日期都只查询当天（月末、年末不跨多天、不报错）"""
+
+import pytest
+
+from database import DatabaseManager
+
+
+class _RecordingDatabaseManager(DatabaseManager):
+    """记录执行的SQL参数，不连接数据库"""
+
+    def __init__(self):
+        super().__init__()
+        self.params = []
+
+    def is_labelled(self, queryDate):
+        return False
+
+    def execute_query(self, sql, params=()):
+        self.params.append(params)
+        return []
+
+
+@pytest.mark.parametrize('queryDate, next_date', [
+    ('2025-01-15', '2025-01-16'),
+    ('2025-01-28', '2025-01-29'),
+    ('2025-01-31', '2025-02-01'),
+    ('2024-02-29', '2024-03-01'),
+    ('2025-12-28', '2025-12-29'),
+    ('2025-12-31', '2026-01-01'),
+])
+@pytest.mark.parametrize('method', ['get_no_ticket_stats', 'get_user_stats'])
+def test_raw_log_range_is_one_day(method, queryDate, next_date):
+    db_manager = _RecordingDatabaseManager()
+    getattr(db_manager, method)(queryDate)
+    assert db_manager.params[0][:2] == (queryDate, next_date)
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+"""错误码分类规则：Python分类结果与固定样例一致；配置了数据库时校验SQL的CASE表达式与Python一致"""
+
+import pytest
+
+from error_rules import ERROR_CODE_RULES, ERROR_CODE_FIXTURES, classify_error_code, check_sql_python_agreement
+
+# (result_code, outcome, error_class, subsystem_class)
+EXPECTED = [
+    (None, 'null', 'success', 'ds_system'),
+    ('', 'error', 'success', 'ds_system'),
+    ('0000', 'success', 'success', 'ds_system'),
+    ('00000000', 'success', 'system', 'ds_system'),
+    ('B2DU0000', 'success', 'system', 'agent_system'),
+    ('20300000', 'success', 'system', 'ds_system'),
+    ('20300001', 'success', 'system', 'ds_system'),
+    ('B2DU0110', 'error', 'business', 'agent_business'),
+    ('B2DU0120', 'error', 'business', 'agent_business'),
+    ('B2DU0130', 'error', 'system', 'agent_system'),
+    ('B2DU019', 'error', 'system', 'agent_system'),
+    ('B2DU01', 'error', 'system', 'agent_system'),
+    # 前缀与MySQL默认排序规则一致，不区分大小写
+    ('b2du0110', 'error', 'business', 'agent_business'),
+    ('b2du0190', 'error', 'system', 'agent_system'),
+    ('20301002', 'error', 'business', 'ds_business'),
+    ('20301009', 'error', 'business', 'ds_business'),
+    ('20301005', 'error', 'system', 'ds_system'),
+    # 超过8位：error_class按长度判为系统错误，子系统只要求长度不小于8
+    ('203010021', 'error', 'system', 'ds_business'),
+    ('2030100', 'error', 'system', 'ds_system'),
+    ('12345678', 'error', 'system', 'ds_system'),
+    ('ERROR', 'error', 'system', 'ds_system'),
+]
+
+
+def _baseline_classify_error_code(result_code):
+    """原DatabaseManager._classify_error_code（区分大小写）"""
+    if not result_code or result_code == '0000':
+        return 'success'
+    if len(result_code) != 8:
+        return 'system'
+    if result_code[:4] == 'B2DU':
+        if len(result_code) >= 7 and result_code[6] in ['1', '2']:
+            return 'business'
+        return 'system'
+    if result_code[:4] == '2030':
+        if result_code[4:8] in ['1002', '1003', '1004', '1006', '1007', '1008', '1009']:
+            return 'business'
+        return 'system'
+    return 'system'
+
+
+@pytest.mark.parametrize('code, outcome, error_class, subsystem_class', EXPECTED)
+def test_classify_error_code(code, outcome, error_class, subsystem_class):
+    assert classify_error_code('outcome', code) == outcome
+    assert classify_error_code('error_class', code) == error_class
+    assert classify_error_code('subsystem_class', code) == subsystem_class
+
+
+@pytest.mark.parametrize('code', [c for c in ERROR_CODE_FIXTURES if c is None or c == c.upper()])
+def test_error_class_matches_baseline(code):
+    assert classify_error_code('error_class', code) == _baseline_classify_error_code(code)
+
+
+def test_fixtures_cover_every_label():
+    for dimension, spec in ERROR_CODE_RULES.items():
+        labels = {label for _, label in spec['rules']} | {spec['default']}
+        assert {classify_error_code(dimension, code) for code in ERROR_CODE_FIXTURES} == labels
+
+
+@pytest.fixture(scope='module')
+def execute_query():
+    """连接不到配置的数据库（db_session.DatabaseConfig）时跳过"""
+    try:
+        from sqlalchemy import text
+        from db_session import engine
+        with engine.connect() as connection:
+            connection.execute(text('SELECT 1'))
+    except Exception as e:
+        pytest.skip(f"未配置可用的数据库: {e}")
+    from database import DatabaseManager
+    return DatabaseManager().execute_query
+
+
+def test_sql_matches_python(execute_query):
+    assert check_sql_python_agreement(execute_query) == []
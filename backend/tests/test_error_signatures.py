@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+
+"""错误消息签名：相似消息归为同一签名，不同错误不合并，计数可跨批次累加"""
+
+from datetime import datetime
+import json
+
+import pytest
+
+from error_signatures import (
+    SignatureCounter, extract_message, extract_template, group_by_result_code, signature_of,
+)
+
+
+@pytest.mark.parametrize('message, template', [
+    # 时间先于IP和数字替换
+    ('连接 10.1.2.3:3306 失败 at 2025-01-01 12:00:01', '连接 <IP> 失败 at <TS>'),
+    ('连接 192.168.0.10:3307 失败 at 2025/1/2T08:00:59.123', '连接 <IP> 失败 at <TS>'),
+    ('request 123e4567-e89b-12d3-a456-426614174000 failed at 12:00:01', 'request <UUID> failed at <TS>'),
+    # 引号内容先于表名替换
+    ("Table 'db1.t_user' doesn't exist", "Table <STR> doesn't exist"),
+    ("表't_order_12'不存在，请确认库名，流水号B2DU20250101120000000001", '表<STR>不存在，请确认库名，流水号<ID>'),
+    ('permission denied on table orders_2024', 'permission denied on table <TABLE>'),
+    ('permission denied on 表：orders_2024', 'permission denied on 表：<TABLE>'),
+    # 同时包含字母和数字的长标识，纯数字为<NUM>
+    ('SQL执行超时：查询 t_order_20250101 耗时 30001ms, 超过阈值 30000ms', 'SQL执行超时：查询 <ID> 耗时 <NUM>ms, 超过阈值 <NUM>ms'),
+    ('invalid value 0x1F in column c3', 'invalid value <HEX> in column c<NUM>'),
+    ("Access denied for user 'alice'@'10.0.0.1' (using password: YES)", 'Access denied for user <STR>@<STR> (using password: YES)'),
+    ('  查询结果为空 \n ', '查询结果为空'),
+])
+def test_extract_template(message, template):
+    assert extract_template(message) == template
+
+
+@pytest.mark.parametrize('messages', [
+    ["表't_order_12'不存在，请确认库名，流水号B2DU20250101120000000001",
+     "表't_pay_7'不存在，请确认库名，流水号B2DU20250102093000000999"],
+    ['SQL执行超时：查询 t_order_20250101 耗时 30001ms, 超过阈值 30000ms',
+     'SQL执行超时：查询 t_order_20250102 耗时 31234ms, 超过阈值 30000ms'],
+    ['连接 10.1.2.3:3306 失败 at 2025-01-01 12:00:01',
+     '连接  192.168.0.10:3307  失败 at 2025-01-02 08:00:59'],
+])
+def test_similar_messages_share_signature(messages):
+    assert len({signature_of(extract_template(message)) for message in messages}) == 1
+
+
+def test_distinct_errors_have_distinct_signatures():
+    messages = [
+        "表't_order'不存在",
+        "库'd_order'不存在",
+        'SQL执行超时：查询 t_order_20250101 耗时 30001ms',
+        '连接 10.1.2.3:3306 失败',
+        '连接 10.1.2.3:3306 超时',
+        'permission denied on table orders_2024',
+        '查询结果为空',
+    ]
+    assert len({signature_of(extract_template(message)) for message in messages}) == len(messages)
+
+
+def test_extract_message():
+    assert extract_message(None) == ''
+    assert extract_message(json.dumps({'queryRsp': '表不存在', 'message': 'ignored'}, ensure_ascii=False)) == '表不存在'
+    assert extract_message(json.dumps({'queryRsp': '', 'msg': '超时'}, ensure_ascii=False)) == '超时'
+    assert extract_message('{"other": 1}') == '{"other": 1}'
+    assert extract_message('plain text') == 'plain text'
+
+
+def _rsp(message):
+    return json.dumps({'queryRsp': message}, ensure_ascii=False)
+
+
+def _time(minute):
+    return datetime(2025, 1, 1, 12, minute, 0)
+
+
+def test_counter_collapses_and_keeps_earliest_exemplar():
+    counter = SignatureCounter()
+    counter.add('B2DU0310', 'B2', _time(5), _rsp("表't_b'不存在"))
+    counter.add('B2DU0310', 'B1', _time(1), _rsp("表't_a'不存在"))
+    counter.add('B2DU0310', 'B3', _time(9), _rsp("表't_c'不存在"))
+    counter.add('B2DU0310', 'B4', _time(3), _rsp('查询超时'))
+    # 不属于错误明细子系统的日志忽略
+    counter.add('B2DU0000', 'B5', _time(2), _rsp("表't_d'不存在"))
+    counter.add(None, 'B6', _time(2), _rsp("表't_d'不存在"))
+
+    entries = {entry['template']: entry for entry in counter.values()}
+    assert set(entries) == {'表<STR>不存在', '查询超时'}
+    entry = entries['表<STR>不存在']
+    assert entry['subsystem'] == 'agent' and entry['result_code'] == 'B2DU0310'
+    assert entry['count'] == 3
+    assert (entry['exemplar_biz_seq'], entry['exemplar_message']) == ('B1', "表't_a'不存在")
+    assert (entry['first_seen'], entry['last_seen']) == (_time(1), _time(9))
+
+
+def test_counter_separates_subsystems_and_result_codes():
+    counter = SignatureCounter()
+    counter.add('B2DU0310', 'B1', _time(1), _rsp('查询超时'))
+    counter.add('B2DU0320', 'B2', _time(1), _rsp('查询超时'))
+    # 非8位的B2DU错误码同时属于两个子系统
+    counter.add('B2DU031', 'B3', _time(1), _rsp('查询超时'))
+    keys = sorted((entry['subsystem'], entry['result_code']) for entry in counter.values())
+    assert keys == [('agent', 'B2DU031'), ('agent', 'B2DU0310'), ('agent', 'B2DU0320'), ('ds', 'B2DU031')]
+
+
+def test_counts_merge_across_batches():
+    """按批累计后用merge_entry合并（与label_job累加到t_error_signature一致），结果与一次累计相同"""
+    logs = [('2030' + '0099', f'B{i}', _time(i), _rsp(f"表't_{i}'不存在，流水号{i}")) for i in range(10)]
+    logs += [('20300099', 'BX', _time(30), _rsp('连接 10.0.0.1:3306 失败'))]
+    single = SignatureCounter()
+    for log in logs:
+        single.add(*log)
+
+    merged = SignatureCounter()
+    # 后面的批次先合并，最早的示例仍保留
+    for batch in (logs[6:], logs[3:6], logs[:3]):
+        counter = SignatureCounter()
+        for log in batch:
+            counter.add(*log)
+        for entry in counter.values():
+            merged.merge_entry(entry)
+
+    def by_key(counter):
+        return {(e['subsystem'], e['result_code'], e['signature']): e for e in counter.values()}
+    assert by_key(merged) == by_key(single)
+    table_entry = next(e for e in merged.values() if e['template'] == '表<STR>不存在，流水号<NUM>')
+    assert table_entry['count'] == 10
+    assert table_entry['exemplar_biz_seq'] == 'B0'
+    assert (table_entry['first_seen'], table_entry['last_seen']) == (_time(0), _time(9))
+
+
+def test_merge_entry_does_not_alias_input():
+    counter = SignatureCounter()
+    counter.add('20300099', 'B1', _time(1), _rsp('查询超时'))
+    entry = counter.values()[0]
+    merged = SignatureCounter()
+    merged.merge_entry(entry)
+    merged.merge_entry(entry)
+    assert entry['count'] == 1
+    assert merged.values()[0]['count'] == 2
+
+
+def test_group_by_result_code():
+    counter = SignatureCounter()
+    for i in range(3):
+        counter.add('20300099', f'A{i}', _time(i), _rsp(f"表't_{i}'不存在"))
+    counter.add('20300099', 'B0', _time(5), _rsp('查询超时'))
+    counter.add('20300101', 'C0', None, _rsp('查询超时'))
+    groups = group_by_result_code(counter.values(), limit=1)
+    assert [(g['result_code'], g['count'], g['signature_count']) for g in groups] == [('20300099', 4, 2), ('20300101', 1, 1)]
+    top = groups[0]['signatures']
+    assert len(top) == 1 and top[0]['count'] == 3
+    assert top[0]['exemplar'] == {'biz_seq': 'A0', 'message': "表't_0'不存在", 'create_time': '2025-01-01 12:00:00'}
+    assert groups[1]['signatures'][0]['exemplar']['create_time'] is None
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+"""HyperLogLog：合并等价于并集，估计值在误差范围内，序列化往返不变"""
+
+import numpy as np
+import pytest
+
+from hll_sketch import HyperLogLog, add_user_rows
+from project_members import PROJECT_MEMBERS
+
+
+def _sketch(values, precision=14):
+    sketch = HyperLogLog(precision)
+    sketch.add_many(values)
+    return sketch
+
+
+def test_empty_sketch_counts_zero():
+    assert HyperLogLog().count() == 0
+
+
+def test_small_counts_are_near_exact():
+    users = [f'user{i}' for i in range(100)]
+    assert abs(_sketch(users).count() - 100) <= 1
+
+
+@pytest.mark.parametrize('n', [1000, 20000, 200000])
+def test_count_within_error_bound(n):
+    sketch = _sketch(f'user{i}' for i in range(n))
+    # 3倍标准误差（约99.7%的估计落在该范围内；样例固定，结果确定）
+    assert abs(sketch.count() - n) <= 3 * sketch.standard_error * n
+
+
+def test_duplicates_do_not_change_registers():
+    users = [f'user{i}' for i in range(5000)]
+    once = _sketch(users)
+    twice = _sketch(users + users[::-1])
+    assert np.array_equal(once.registers, twice.registers)
+
+
+def test_merge_equals_union():
+    a_users = [f'user{i}' for i in range(0, 30000)]
+    b_users = [f'user{i}' for i in range(20000, 50000)]
+    merged = _sketch(a_users)
+    merged.merge(_sketch(b_users))
+    union = _sketch(a_users + b_users)
+    assert np.array_equal(merged.registers, union.registers)
+    assert abs(merged.count() - 50000) <= 3 * merged.standard_error * 50000
+
+
+def test_merge_is_idempotent():
+    sketch = _sketch(f'user{i}' for i in range(1000))
+    before = sketch.registers.copy()
+    sketch.merge(_sketch(f'user{i}' for i in range(1000)))
+    assert np.array_equal(sketch.registers, before)
+
+
+def test_merge_requires_same_precision():
+    with pytest.raises(ValueError):
+        HyperLogLog(12).merge(HyperLogLog(14))
+
+
+def test_invalid_precision():
+    with pytest.raises(ValueError):
+        HyperLogLog(3)
+    with pytest.raises(ValueError):
+        HyperLogLog(19)
+
+
+@pytest.mark.parametrize('precision', [4, 10, 14])
+def test_bytes_round_trip(precision):
+    sketch = _sketch((f'user{i}' for i in range(3000)), precision)
+    restored = HyperLogLog.from_bytes(sketch.to_bytes())
+    assert restored.precision == precision
+    assert np.array_equal(restored.registers, sketch.registers)
+    assert restored.count() == sketch.count()
+    # 反序列化得到的寄存器可以继续修改
+    restored.add('new-user')
+
+
+def test_add_user_rows():
+    member = PROJECT_MEMBERS[0]
+    rows = [
+        {'user_id': 'alice', 'channel': 'web'},
+        {'user_id': 'ALICE', 'channel': 'web'},
+        {'user_id': 'bob', 'channel': 'web'},
+        {'user_id': member.upper(), 'channel': 'web'},
+        {'user_id': 'carol', 'channel': None},
+        {'user_id': None, 'channel': 'web'},
+    ]
+    sketches = add_user_rows({}, rows)
+    assert set(sketches) == {('web', False), ('web', True), ('未知渠道', False)}
+    assert sketches[('web', False)].count() == 2
+    assert sketches[('web', True)].count() == 1
+    assert sketches[('未知渠道', False)].count() == 1
+
+    # 已有草图继续累加
+    add_user_rows(sketches, [{'user_id': 'dave', 'channel': 'web'}])
+    assert sketches[('web', False)].count() == 3
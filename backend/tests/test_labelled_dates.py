@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+"""已完成请求标签日期的缓存：过期后重新读取完成状态，重新生成标签期间改为统计原始日志"""
+
+from datetime import date, timedelta
+
+import pytest
+
+import database
+from database import DatabaseManager, LABELLED_CACHE_TTL
+
+
+class _StatusDatabaseManager(DatabaseManager):
+    """t_request_label_status的完成状态由completed决定，记录查询次数，不连接数据库"""
+
+    def __init__(self):
+        super().__init__()
+        self.completed = True
+        self.status_queries = 0
+
+    def execute_query(self, sql, params=()):
+        self.status_queries += 1
+        return [{'flag': 1}] if self.completed else []
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(database.time, 'monotonic', lambda: now[0])
+    monkeypatch.setattr(database, '_labelled_dates', {})
+    return now
+
+
+def test_labelled_cache_expires(clock):
+    queryDate = (date.today() - timedelta(days=3)).strftime('%Y-%m-%d')
+    db_manager = _StatusDatabaseManager()
+    assert db_manager.is_labelled(queryDate)
+    assert db_manager.is_labelled(queryDate)
+    assert db_manager.status_queries == 1
+
+    # backfill --force删除了标签和完成状态：缓存过期前仍视为已完成，过期后读取原始日志
+    db_manager.completed = False
+    clock[0] += LABELLED_CACHE_TTL + 1
+    assert not db_manager.is_labelled(queryDate)
+    assert db_manager.status_queries == 2
+
+    db_manager.completed = True
+    assert db_manager.is_labelled(queryDate)
+
+
+def test_today_is_never_labelled(clock):
+    db_manager = _StatusDatabaseManager()
+    assert not db_manager.is_labelled(date.today().strftime('%Y-%m-%d'))
+    assert db_manager.status_queries == 0
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+"""DDSketch：分位数相对误差不超过relative_accuracy，合并等价于合并原始数据，序列化往返不变"""
+
+import math
+import random
+
+import pytest
+
+from latency_sketch import DDSketch
+
+
+def _costs(seed, n=20000):
+    """对数正态分布的耗时样例（毫秒），带少量0值"""
+    generator = random.Random(seed)
+    return [0.0 if generator.random() < 0.01 else generator.lognormvariate(6, 1.5) for _ in range(n)]
+
+
+def _exact_quantile(values, q):
+    """与DDSketch.quantile相同的排名定义：rank = q * (n - 1)"""
+    ordered = sorted(values)
+    return ordered[int(math.floor(q * (len(ordered) - 1)))]
+
+
+def _assert_quantiles_within_error(sketch, values):
+    for q in (0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99, 0.999):
+        exact = _exact_quantile(values, q)
+        estimate = sketch.quantile(q)
+        assert abs(estimate - exact) <= sketch.relative_accuracy * exact + 1e-9, (q, exact, estimate)
+
+
+def test_empty_sketch():
+    sketch = DDSketch()
+    assert sketch.quantile(0.5) is None
+    assert sketch.avg is None
+    assert sketch.quantiles([50, 90]) == {'p50': None, 'p90': None}
+
+
+@pytest.mark.parametrize('relative_accuracy', [0.01, 0.02])
+def test_quantiles_within_relative_error(relative_accuracy):
+    values = _costs(1)
+    sketch = DDSketch.from_values(values, relative_accuracy)
+    _assert_quantiles_within_error(sketch, values)
+
+
+def test_exact_summary_statistics():
+    values = _costs(2, 5000)
+    sketch = DDSketch.from_values(values + [None])
+    assert sketch.count == len(values)
+    assert sketch.min == min(values)
+    assert sketch.max == max(values)
+    assert sketch.quantile(0) == min(values)
+    assert sketch.quantile(1) == max(values)
+    assert sketch.avg == pytest.approx(sum(values) / len(values))
+
+
+def test_merge_equals_sketch_of_all_values():
+    a_values, b_values = _costs(3), _costs(4, 5000)
+    merged = DDSketch.from_values(a_values)
+    merged.merge(DDSketch.from_values(b_values))
+    combined = DDSketch.from_values(a_values + b_values)
+    assert merged.bins == combined.bins
+    assert merged.zero_count == combined.zero_count
+    assert merged.count == combined.count
+    assert (merged.min, merged.max) == (combined.min, combined.max)
+    assert merged.sum == pytest.approx(combined.sum)
+    _assert_quantiles_within_error(merged, a_values + b_values)
+
+
+def test_merge_with_empty_sketch():
+    values = _costs(5, 1000)
+    sketch = DDSketch.from_values(values)
+    sketch.merge(DDSketch())
+    empty = DDSketch()
+    empty.merge(DDSketch.from_values(values))
+    for merged in (sketch, empty):
+        assert merged.count == len(values)
+        assert (merged.min, merged.max) == (min(values), max(values))
+
+
+def test_merge_requires_same_accuracy():
+    with pytest.raises(ValueError):
+        DDSketch(0.01).merge(DDSketch(0.02))
+
+
+def test_invalid_arguments():
+    with pytest.raises(ValueError):
+        DDSketch(0)
+    with pytest.raises(ValueError):
+        DDSketch().quantile(1.5)
+
+
+def test_quantiles_keys_and_rounding():
+    sketch = DDSketch.from_values([100.0] * 10)
+    assert sketch.quantiles([50, 99.9]) == {'p50': 100.0, 'p99.9': 100.0}
+
+
+def test_weighted_add():
+    weighted = DDSketch()
+    weighted.add(10.0, weight=3)
+    repeated = DDSketch.from_values([10.0, 10.0, 10.0])
+    assert weighted.to_dict() == repeated.to_dict()
+
+
+def test_json_round_trip():
+    sketch = DDSketch.from_values(_costs(6, 2000))
+    restored = DDSketch.from_json(sketch.to_json())
+    assert restored.to_dict() == sketch.to_dict()
+    assert restored.quantiles([50, 90, 99]) == sketch.quantiles([50, 90, 99])
+
+    empty = DDSketch.from_json(DDSketch().to_json())
+    assert empty.count == 0 and empty.quantile(0.5) is None
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+"""MemberDimension：渠道统计和日期范围计数按user_id分组扫描一次后的拆分，与原SQL的 user_id IN (...) / (NOT IN (...) OR user_id IS NULL) 一致"""
+
+from datetime import date
+
+import pytest
+
+from database import DatabaseManager
+from project_members import PROJECT_MEMBERS, MemberDimension, member_dimension
+from range_engine import RangeEngine
+
+
+@pytest.mark.parametrize('user_id', [PROJECT_MEMBERS[0], PROJECT_MEMBERS[0].upper(), PROJECT_MEMBERS[-1].title()])
+def test_members_match_case_insensitively(user_id):
+    assert member_dimension.is_member(user_id) is True
+
+
+@pytest.mark.parametrize('user_id', [None, '', 'alice', PROJECT_MEMBERS[0] + 'x', ' ' + PROJECT_MEMBERS[0]])
+def test_non_members(user_id):
+    assert member_dimension.is_member(user_id) is False
+
+
+def test_custom_members():
+    dimension = MemberDimension(['Alice', 'BOB'])
+    assert dimension.members == ['Alice', 'BOB']
+    assert dimension.is_member('alice') and dimension.is_member('Bob')
+    assert not dimension.is_member('carol')
+    assert not MemberDimension([]).is_member('alice')
+
+
+class _GroupedDatabaseManager(DatabaseManager):
+    """返回固定的按user_id分组结果，不连接数据库"""
+
+    def __init__(self, rows):
+        super().__init__()
+        self.rows = rows
+        self.sql = []
+
+    def execute_query(self, sql, params=()):
+        self.sql.append(sql)
+        return self.rows
+
+
+# 原SQL中 user_id IN (成员列表) 计入成员；(user_id NOT IN (...) OR user_id IS NULL) 计入非成员
+MEMBER = PROJECT_MEMBERS[0]
+CHANNEL_ROWS = [
+    {'user_id': MEMBER, 'channel': 'web', 'count': 3},
+    {'user_id': MEMBER.upper(), 'channel': 'web', 'count': 2},
+    {'user_id': PROJECT_MEMBERS[1], 'channel': None, 'count': 1},
+    {'user_id': 'alice', 'channel': 'web', 'count': 5},
+    {'user_id': None, 'channel': 'web', 'count': 4},
+    {'user_id': None, 'channel': None, 'count': 6},
+]
+
+
+def test_compute_channel_stats_splits_members():
+    db_manager = _GroupedDatabaseManager(CHANNEL_ROWS)
+    result = db_manager.compute_channel_stats('2025-01-01')
+    assert len(db_manager.sql) == 1 and 'GROUP BY user_id, channel' in db_manager.sql[0]
+    members = {item['channel']: item['count'] for item in result['member_stats']}
+    non_members = {item['channel']: item['count'] for item in result['non_member_stats']}
+    assert members == {'web': 5, '未知渠道': 1}
+    assert non_members == {'web': 9, '未知渠道': 6}
+    assert [item['channel'] for item in result['non_member_stats']] == ['web', '未知渠道']
+
+
+def test_range_engine_count_by_day_splits_members():
+    rows = [dict(row, stat_date=date(2025, 1, 1)) for row in CHANNEL_ROWS]
+    rows.append({'stat_date': date(2025, 1, 2), 'user_id': MEMBER.title(), 'channel': 'web', 'count': 7})
+    db_manager = _GroupedDatabaseManager(rows)
+    counts = RangeEngine(db_manager).count_by_day(date(2025, 1, 1), date(2025, 1, 2), ['channel'])
+    assert counts == {
+        ('2025-01-01', 'web'): {'count': 14, 'member_count': 5, 'non_member_count': 9},
+        ('2025-01-01', None): {'count': 7, 'member_count': 1, 'non_member_count': 6},
+        ('2025-01-02', 'web'): {'count': 7, 'member_count': 7, 'non_member_count': 0},
+    }
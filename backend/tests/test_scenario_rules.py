@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+"""场景分类器与原来的十个场景LIKE查询（get_scenario_stats）结果一致"""
+
+import random
+import re
+
+import pytest
+
+from scenario_rules import SCENARIO_RULES, classify_scenarios, build_scenario_stats
+
+# 原来十个场景查询的WHERE条件（create_time条件之外），按原SQL的顺序和参数抄录：
+# ('like' / 'not_like', 列, 模式)，('or', [条件...])，条件之间为AND
+_EXCLUDE = [
+    ('not_like', 'req_info', '%EXPLAIN%'), ('not_like', 'req_info', '%IF(%'), ('not_like', 'req_info', '%COUNT%'),
+    ('not_like', 'req_info', '%SHOW%'),
+    ('or', [('not_like', 'req_info', '%DESC%'), ('like', 'req_info', '%SELECT%')]),
+]
+BASELINE_QUERIES = {
+    'execution_plan': [('like', 'req_info', '%EXPLAIN%')],
+    'yn_query': [('not_like', 'req_info', '%EXPLAIN%'), ('like', 'req_info', '%IF(%')],
+    'count_query': [('not_like', 'req_info', '%EXPLAIN%'), ('not_like', 'req_info', '%IF(%'), ('like', 'req_info', '%COUNT%')],
+    'table_structure': [
+        ('not_like', 'req_info', '%EXPLAIN%'), ('not_like', 'req_info', '%IF(%'), ('not_like', 'req_info', '%COUNT%'),
+        ('or', [('like', 'req_info', '%DESC%'), ('like', 'req_info', '%SHOW%')]),
+        ('not_like', 'req_info', '%SELECT%'),
+    ],
+    'enum_query': _EXCLUDE + [('like', 'req_info', '%DISTINCT%')],
+    'time_query': _EXCLUDE + [('not_like', 'req_info', '%DISTINCT%'), ('like', 'req_info', '%TIME%FROM%')],
+    'config_query': [('like', 'rsp_info', '%SQL_TITLE%配置%')],
+    'field_length': _EXCLUDE + [
+        ('not_like', 'req_info', '%DISTINCT%'), ('not_like', 'req_info', '%TIME%FROM%'), ('like', 'req_info', '%LENGTH%'),
+    ],
+    'ticket_related': _EXCLUDE + [
+        ('not_like', 'req_info', '%DISTINCT%'), ('not_like', 'req_info', '%TIME%FROM%'),
+        ('or', [('like', 'req_info', '%提单%'), ('like', 'req_info', '%确认%'), ('like', 'req_info', '%同意%'),
+                ('like', 'rsp_info', '%很荣幸能够%'), ('like', 'rsp_info', '%用户协议%')]),
+    ],
+    'other': _EXCLUDE + [
+        ('not_like', 'req_info', '%DISTINCT%'), ('not_like', 'req_info', '%TIME%FROM%'),
+        ('not_like', 'req_info', '%提单%'), ('not_like', 'req_info', '%确认%'), ('not_like', 'req_info', '%同意%'),
+        ('not_like', 'rsp_info', '%很荣幸能够%'), ('not_like', 'rsp_info', '%用户协议%'),
+    ],
+}
+
+
+def _sql_like(text, pattern):
+    """MySQL LIKE（默认排序规则不区分大小写），列为NULL时结果为NULL（None）"""
+    if text is None:
+        return None
+    regex = ''.join('.*' if c == '%' else '.' if c == '_' else re.escape(c) for c in pattern)
+    return re.fullmatch(regex, text, re.IGNORECASE | re.DOTALL) is not None
+
+
+def _sql_eval(condition, row):
+    """按SQL三值逻辑求值（None表示UNKNOWN）"""
+    kind = condition[0]
+    if kind == 'or':
+        values = [_sql_eval(c, row) for c in condition[1]]
+        if any(v is True for v in values):
+            return True
+        return None if any(v is None for v in values) else False
+    value = _sql_like(row[condition[1]], condition[2])
+    if kind == 'not_like' and value is not None:
+        value = not value
+    return value
+
+
+def baseline_scenarios(req_info, rsp_info):
+    """原SQL中WHERE条件为TRUE（AND且没有FALSE/UNKNOWN）的场景"""
+    row = {'req_info': req_info, 'rsp_info': rsp_info}
+    return [
+        scenario for scenario, conditions in BASELINE_QUERIES.items()
+        if all(_sql_eval(c, row) is True for c in conditions)
+    ]
+
+
+CASES = [
+    # (req_info, rsp_info, 期望命中的场景)
+    ('EXPLAIN SELECT * FROM t_order', 'ok', ['execution_plan']),
+    ('explain select 1', 'ok', ['execution_plan']),
+    ("SELECT IF(COUNT(1) > 0, 'Y', 'N') FROM t_user", 'Y', ['yn_query']),
+    ('select count(1) from t_order', '128', ['count_query']),
+    # 表结构：DESC/SHOW 且没有SELECT
+    ('DESC t_order', 'id bigint', ['table_structure']),
+    ('show create table t_order', 'CREATE TABLE', ['table_structure']),
+    # (NOT LIKE DESC OR LIKE SELECT)：带DESC的SELECT不被排除，没有SELECT的DESC被排除
+    ('SELECT DISTINCT status FROM t_order ORDER BY status DESC', 'ok', ['enum_query']),
+    ('DESC t_order DISTINCT', 'ok', ['table_structure']),
+    ('SELECT create_time FROM t_order ORDER BY id DESC LIMIT 1', 'ok', ['time_query']),
+    # 字段长度不是互斥场景，原“其他”查询没有排除LENGTH
+    ('SELECT LENGTH(name) FROM t_user ORDER BY 1 DESC', '32', ['field_length', 'other']),
+    ('DESCRIBE t_user LENGTH', '32', ['table_structure']),
+    # SHOW一律排除，即使带SELECT
+    ('SHOW TABLES; SELECT LENGTH(name) FROM t_user', 'ok', []),
+    # 配置查询只看rsp_info，可与其它场景同时命中
+    ('EXPLAIN SELECT 1', '{"SQL_TITLE": "系统配置查询"}', ['execution_plan', 'config_query']),
+    ('查询系统参数', '{"sql_title": "配置"}', ['config_query', 'other']),
+    # 提单关键字：req_info或rsp_info任一命中
+    ('帮我提单', 'ok', ['ticket_related']),
+    ('请确认', 'ok', ['ticket_related']),
+    ('我同意', 'ok', ['ticket_related']),
+    ('查询订单', '很荣幸能够为您服务', ['ticket_related']),
+    ('查询订单', '请阅读用户协议', ['ticket_related']),
+    # 被前面的场景排除后不再计入提单相关
+    ('SELECT COUNT(1) FROM t_ticket WHERE 提单 = 1', 'ok', ['count_query']),
+    ('SELECT * FROM t_order', 'ok', ['other']),
+    # NULL：LIKE和NOT LIKE都不成立
+    (None, '请阅读用户协议', []),
+    (None, '{"SQL_TITLE": "配置"}', ['config_query']),
+    ('SELECT * FROM t_order', None, []),
+    ('帮我提单', None, ['ticket_related']),
+    ('SELECT LENGTH(name) FROM t_user', None, ['field_length']),
+]
+
+
+@pytest.mark.parametrize('req_info, rsp_info, expected', CASES)
+def test_classify_scenarios_cases(req_info, rsp_info, expected):
+    assert classify_scenarios(req_info, rsp_info) == expected
+    assert baseline_scenarios(req_info, rsp_info) == expected
+
+
+_REQ_FRAGMENTS = [
+    'EXPLAIN', 'explain', 'IF(', 'if (', 'COUNT', 'count', 'DESC', 'desc', 'SHOW', 'SELECT', 'select',
+    'DISTINCT', 'TIME', 'time', 'FROM', 'from', 'LENGTH', '提单', '确认', '同意', 't_order', '%', '_', '\n',
+]
+_RSP_CHOICES = [
+    None, '', 'ok', '很荣幸能够为您服务', '用户协议', 'SQL_TITLE: 系统配置', 'sql_title 配置', '配置 SQL_TITLE',
+]
+
+
+def test_classify_scenarios_matches_baseline_queries():
+    generator = random.Random(20250101)
+    for _ in range(5000):
+        if generator.random() < 0.05:
+            req_info = None
+        else:
+            req_info = ' '.join(generator.choice(_REQ_FRAGMENTS) for _ in range(generator.randint(0, 6)))
+        rsp_info = generator.choice(_RSP_CHOICES)
+        assert classify_scenarios(req_info, rsp_info) == baseline_scenarios(req_info, rsp_info), (req_info, rsp_info)
+
+
+def test_rules_cover_baseline_scenarios():
+    assert [rule['scenario'] for rule in SCENARIO_RULES] == list(BASELINE_QUERIES)
+
+
+def test_build_scenario_stats():
+    stats = build_scenario_stats({('other', True): 2, ('other', False): 3, ('count_query', False): 1})
+    assert len(stats) == len(SCENARIO_RULES)
+    assert stats[0] == {'scenario': 'other', 'scenario_name': '其他', 'count': 5, 'member_count': 2, 'non_member_count': 3}
+    assert stats[1]['scenario'] == 'count_query' and stats[1]['count'] == 1
+    assert all(item['count'] == 0 for item in stats[2:])
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+
+"""响应序列化：输出与原来的DecimalEncoder/convert_decimals路径一致，orjson与标准库回退一致，压缩按Accept-Encoding协商"""
+
+from datetime import datetime, date
+from decimal import Decimal
+import gzip
+import json
+
+import numpy as np
+import pytest
+
+import serializer
+from serializer import dumps, compress, serializer_config
+
+
+def convert_decimals(obj):
+    """原api_handlers.convert_decimals：递归转换所有Decimal类型为float"""
+    if isinstance(obj, Decimal):
+        return float(obj)
+    elif isinstance(obj, dict):
+        return {key: convert_decimals(value) for key, value in obj.items()}
+    elif isinstance(obj, list):
+        return [convert_decimals(item) for item in obj]
+    else:
+        return obj
+
+
+class DecimalEncoder(json.JSONEncoder):
+    """原api_handlers.DecimalEncoder"""
+    def default(self, obj):
+        if isinstance(obj, Decimal):
+            return float(obj)
+        return super(DecimalEncoder, self).default(obj)
+
+
+def legacy_dumps(obj):
+    return json.dumps(convert_decimals(obj), cls=DecimalEncoder)
+
+
+PAYLOAD = {
+    'data': {
+        'queryDate': '2025-01-01',
+        'total_count': 12345,
+        'success_rate': Decimal('98.7654'),
+        'avg_cost': Decimal('1234.5600'),
+        'max_cost': Decimal('0'),
+        'min_cost': Decimal('-0.5'),
+        'p90_cost': 1500.25,
+        'percentiles': {'p50': Decimal('10.01'), 'p99.9': 2000.0},
+        'channels': [
+            {'channel': 'web', 'channel_name': '网页', 'count': 3, 'avg_cost': Decimal('1.1'), 'member_count': None},
+            {'channel': None, 'channel_name': '未知渠道', 'count': 0, 'avg_cost': None, 'tags': []},
+        ],
+        'details': [[Decimal('1.5'), '流水号\n"引号"\\', True, False]],
+    },
+    'code': 200,
+}
+
+
+@pytest.fixture(params=['orjson', 'json'])
+def backend(request, monkeypatch):
+    """分别使用orjson和标准库json回退"""
+    if request.param == 'orjson':
+        if serializer.orjson is None:
+            pytest.skip('未安装orjson')
+        monkeypatch.setattr(serializer_config, 'use_orjson', True)
+    else:
+        monkeypatch.setattr(serializer_config, 'use_orjson', False)
+    return request.param
+
+
+def test_dumps_matches_legacy_path(backend):
+    assert json.loads(dumps(PAYLOAD)) == json.loads(legacy_dumps(PAYLOAD))
+
+
+def test_dumps_outputs_utf8(backend):
+    body = dumps({'name': '渠道'})
+    assert isinstance(body, bytes)
+    assert '渠道'.encode('utf-8') in body
+
+
+def test_dumps_formats_dates(backend):
+    """datetime/date按原来数据层strftime的格式输出"""
+    created = datetime(2025, 1, 2, 3, 4, 5, 678901)
+    payload = {'create_time': created, 'stat_date': date(2025, 1, 2), 'dates': [date(2024, 12, 31)]}
+    legacy = {
+        'create_time': created.strftime('%Y-%m-%d %H:%M:%S'),
+        'stat_date': date(2025, 1, 2).strftime('%Y-%m-%d'),
+        'dates': [date(2024, 12, 31).strftime('%Y-%m-%d')],
+    }
+    assert json.loads(dumps(payload)) == json.loads(legacy_dumps(legacy))
+    assert json.loads(dumps(payload)) == {'create_time': '2025-01-02 03:04:05', 'stat_date': '2025-01-02', 'dates': ['2024-12-31']}
+
+
+def test_dumps_numpy_and_sets(backend):
+    payload = {'count': np.int64(3), 'avg': np.float64(1.5), 'costs': np.array([1.0, 2.5]), 'ids': {7}}
+    assert json.loads(dumps(payload)) == {'count': 3, 'avg': 1.5, 'costs': [1.0, 2.5], 'ids': [7]}
+
+
+def test_dumps_non_str_keys(backend):
+    assert json.loads(dumps({1: 'a', 2: 'b'})) == {'1': 'a', '2': 'b'}
+
+
+def test_dumps_rejects_unknown_types(backend):
+    with pytest.raises(TypeError):
+        dumps({'value': object()})
+
+
+def test_orjson_and_json_fallback_agree(monkeypatch):
+    if serializer.orjson is None:
+        pytest.skip('未安装orjson')
+    payload = dict(PAYLOAD, created=datetime(2025, 1, 1, 8, 0, 0), day=date(2025, 1, 1))
+    monkeypatch.setattr(serializer_config, 'use_orjson', True)
+    fast = dumps(payload)
+    monkeypatch.setattr(serializer_config, 'use_orjson', False)
+    assert json.loads(fast) == json.loads(dumps(payload))
+
+
+def test_compress_skips_small_bodies():
+    body = b'{"code":200}'
+    assert compress(body, 'gzip, br') == (body, None)
+
+
+def test_compress_gzip():
+    body = dumps({'data': ['渠道' * 100] * 50, 'code': 200})
+    compressed, encoding = compress(body, 'gzip, deflate')
+    assert encoding == 'gzip'
+    assert gzip.decompress(compressed) == body
+    assert len(compressed) < len(body)
+
+
+def test_compress_respects_accept_encoding():
+    body = b'x' * (serializer_config.compress_min_bytes * 2)
+    assert compress(body, '') == (body, None)
+    assert compress(body, 'identity') == (body, None)
+    assert compress(body, 'gzip;q=0') == (body, None)
+    assert compress(body, 'GZIP; q=0.5')[1] == 'gzip'
+
+
+def test_compress_brotli():
+    if serializer.brotli is None:
+        pytest.skip('未安装brotli')
+    body = b'x' * (serializer_config.compress_min_bytes * 2)
+    compressed, encoding = compress(body, 'gzip, br')
+    assert encoding == 'br'
+    assert serializer.brotli.decompress(compressed) == body
+
+
+def test_compress_disabled(monkeypatch):
+    monkeypatch.setattr(serializer_config, 'compression_enabled', False)
+    body = b'x' * (serializer_config.compress_min_bytes * 2)
+    assert compress(body, 'gzip') == (body, None)
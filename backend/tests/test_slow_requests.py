@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+
+"""TopK：保留耗时最长的k个请求，按耗时降序返回，耗时相同时按加入顺序；按日期范围读取最慢请求时只实时计算当天"""
+
+from datetime import date, timedelta
+import random
+
+import pytest
+
+from database import DatabaseManager, MAX_SLOW_REQUEST_DAYS
+from slow_requests import TopK, slow_request_config
+
+
+def _expected(pairs, k):
+    """按耗时稳定排序后取前k个"""
+    return sorted(pairs, key=lambda pair: -pair[0])[:k]
+
+
+def test_keeps_largest_in_descending_order():
+    top = TopK(3)
+    top.push_many([(5.0, 'a'), (1.0, 'b'), (9.0, 'c'), (7.0, 'd'), (3.0, 'e')])
+    assert top.items() == [(9.0, 'c'), (7.0, 'd'), (5.0, 'a')]
+    assert len(top) == 3
+
+
+def test_fewer_items_than_k():
+    top = TopK(10)
+    top.push_many([(2.0, 'a'), (4.0, 'b')])
+    assert top.items() == [(4.0, 'b'), (2.0, 'a')]
+
+
+@pytest.mark.parametrize('k', [0, -1])
+def test_non_positive_k_keeps_nothing(k):
+    top = TopK(k)
+    top.push(1.0, 'a')
+    assert top.items() == [] and len(top) == 0
+
+
+def test_ties_keep_earliest_pushed():
+    top = TopK(2)
+    top.push_many([(5.0, 'a'), (5.0, 'b'), (6.0, 'c'), (5.0, 'd')])
+    assert top.items() == [(6.0, 'c'), (5.0, 'a')]
+
+    top = TopK(3)
+    top.push_many([(5.0, 'a'), (5.0, 'b'), (5.0, 'c'), (5.0, 'd')])
+    assert top.items() == [(5.0, 'a'), (5.0, 'b'), (5.0, 'c')]
+
+
+def test_items_are_not_compared():
+    """附带信息不可比较时也不影响（耗时相同时只比较加入顺序）"""
+    top = TopK(2)
+    top.push_many([(1.0, {'biz_seq': 'a'}), (1.0, {'biz_seq': 'b'}), (1.0, {'biz_seq': 'c'})])
+    assert [item['biz_seq'] for _, item in top.items()] == ['a', 'b']
+
+
+@pytest.mark.parametrize('k', [1, 5, 100])
+def test_matches_sorted_prefix(k):
+    generator = random.Random(k)
+    # 耗时取整数，制造大量相同耗时
+    pairs = [(float(generator.randint(0, 50)), f'B{i}') for i in range(2000)]
+    top = TopK(k)
+    top.push_many(pairs)
+    assert top.items() == _expected(pairs, k)
+
+
+def test_merging_daily_indexes():
+    """日期范围查询把每天的最慢请求合并到同一个TopK中"""
+    days = [[(float(cost), f'D{day}-{cost}') for cost in range(day, 100, 7)] for day in range(5)]
+    merged = TopK(10)
+    for day in days:
+        daily = TopK(20)
+        daily.push_many(day)
+        merged.push_many(daily.items())
+    assert merged.items() == _expected([pair for day in days for pair in day], 10)
+
+
+class _SlowRequestDatabaseManager(DatabaseManager):
+    """最慢请求索引和汇总状态为固定结果，记录实时计算的日期，不连接数据库"""
+
+    def __init__(self, rolled_up_dates, index_rows=()):
+        super().__init__()
+        self.rolled_up_dates = rolled_up_dates
+        self.index_rows = list(index_rows)
+        self.computed = []
+
+    def execute_query(self, sql, params=()):
+        if 't_daily_rollup_status' in sql:
+            return [{'stat_date': day} for day in self.rolled_up_dates]
+        return self.index_rows
+
+    def compute_step_performance(self, queryDate, cost_sink=None, percentiles=None, slow_sink=None):
+        self.computed.append(queryDate)
+        slowest = TopK(slow_request_config.top_k)
+        slowest.push(99.0, 'TODAY')
+        slow_sink['QUERY_SCHEMA'] = slowest
+        return []
+
+
+def _day(offset):
+    return (date.today() + timedelta(days=offset)).strftime('%Y-%m-%d')
+
+
+def test_get_slow_requests_computes_only_today():
+    db_manager = _SlowRequestDatabaseManager(
+        [_day(-5), _day(-4)],
+        [{'stat_date': _day(-5), 'name': 'QUERY_SCHEMA', 'biz_seq': 'OLD', 'cost': 10.0}]
+    )
+    result = db_manager.get_slow_requests(_day(-5), _day(0), kind='step')
+    assert db_manager.computed == [_day(0)]
+    assert result['computed_dates'] == [_day(0)]
+    assert result['missing_dates'] == [_day(-3), _day(-2), _day(-1)]
+    assert [item['biz_seq'] for item in result['items'][0]['slowest']] == ['TODAY', 'OLD']
+
+
+def test_get_slow_requests_without_today():
+    db_manager = _SlowRequestDatabaseManager([])
+    result = db_manager.get_slow_requests(_day(-3), _day(-2), kind='step')
+    assert db_manager.computed == []
+    assert result['computed_dates'] == [] and result['missing_dates'] == [_day(-3), _day(-2)]
+
+
+@pytest.mark.parametrize('start, end', [(-MAX_SLOW_REQUEST_DAYS, 0), (0, -1)])
+def test_get_slow_requests_rejects_invalid_ranges(start, end):
+    with pytest.raises(ValueError):
+        _SlowRequestDatabaseManager([]).get_slow_requests(_day(start), _day(end), kind='step')
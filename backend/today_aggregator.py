@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+当天数据的增量聚合
+
+当天的看板会被频繁刷新，每次都从零点开始扫描原始日志代价随时间增长。
+TodayAggregator按表记录已处理到的位置（create_time + id），每次刷新只读取更新的日志，
+累加到综合统计、渠道、场景的计数和各环节的耗时草图（latency_sketch.DDSketch）中，
+结果也只重新生成有新增数据的部分，刷新代价与新增流量成正比，内存不随当天数据量增长
+
+- 只读取到 now - lag_seconds 为止，给尚未提交的写入留出时间
+- 需要排除HIVE查询的环节，耗时先暂存hive_window_seconds，等待同一请求的请求日志后再计入草图
+- 后台任务（run_today_aggregator_loop）完成首次聚合，并每隔full_resync_seconds从零点完整聚合一次替换当前结果，
+  修正延迟写入的记录造成的偏差；请求中只读取增量
+- 刷新过程中（或首次聚合未完成时）其它请求不会等待：已有结果时返回上一次的结果，否则由调用方扫描原始日志
+"""
+
+from datetime import datetime, date, timedelta
+from typing import Dict, Any, Optional
+from collections import Counter, deque
+import asyncio
+import logging
+import threading
+import time
+from error_rules import classify_error_code
+from scenario_rules import classify_scenarios, build_scenario_stats
+from cost_summary import DEFAULT_PERCENTILES
+from latency_sketch import DDSketch
+from project_members import member_dimension
+
+logger = logging.getLogger(__name__)
+
+class TodayAggregatorConfig:
+    """当天增量聚合配置类"""
+    def __init__(self):
+        # 是否对当天的统计使用增量聚合
+        self.enabled = True
+        # 只读取create_time早于 now - lag_seconds 的日志
+        self.lag_seconds = 5
+        # 两次增量读取的最小间隔（秒），多个卡片同时刷新时只读取一次
+        self.min_refresh_seconds = 2
+        # 完整重新聚合的间隔（秒）
+        self.full_resync_seconds = 600
+        # 后台任务检查是否需要完整聚合的间隔（秒）
+        self.resync_check_seconds = 10
+        # 需要排除HIVE查询的环节耗时等待请求日志的时间（秒，按create_time）
+        self.hive_window_seconds = 60
+        # 每批读取的行数
+        self.batch_size = 2000
+
+# 获取配置
+today_aggregator_config = TodayAggregatorConfig()
+
+# 需要排除HIVE查询的环节，及其额外的最小耗时条件（与compute_step_performance一致）
+HIVE_EXCLUDED_STEPS = {'QUERY_SCHEMA': 1000, 'SUB_QUERY': None}
+
+class _TodayState:
+    """某一天的累计计数、各表的读取位置和当前结果"""
+
+    def __init__(self, day: date):
+        self.day = day
+        self.started = time.time()
+        # t_handler_logs / t_step_time_record读取位置：(create_time, id)
+        self.handler_watermark = None
+        self.step_watermark = None
+        self.class_counts = Counter()
+        self.channel_counts = Counter()
+        self.scenario_counts = Counter()
+        self.hive_biz_seqs = set()
+        self.step_sketches: Dict[str, DDSketch] = {}
+        # 等待请求日志的HIVE排除环节耗时：(create_time, biz_seq, step_name, cost)，按create_time排列
+        self.pending_hive_costs = deque()
+        # 各环节的耗时结果（step_name -> 结果），只重新计算有新增耗时的环节
+        self.step_results: Dict[str, Optional[Dict[str, Any]]] = {}
+        self.snapshot: Optional[Dict[str, Any]] = None
+
+class TodayAggregator:
+    """当天统计的增量聚合器（进程内共享一个实例）"""
+
+    def __init__(self, config: TodayAggregatorConfig = today_aggregator_config):
+        self.config = config
+        # 请求中的刷新只使用非阻塞加锁：已有刷新在进行时直接使用当前结果，不占用查询线程池等待
+        self._lock = threading.Lock()
+        self._state: Optional[_TodayState] = None
+        self._last_refresh = 0.0
+
+    def get(self, db_manager, name: str) -> Optional[Any]:
+        """
+        获取当天的某项统计（error_class_counts / channel_stats / scenario_stats / step_performance）
+        结果不可用时返回None，由调用方扫描原始日志
+        """
+        try:
+            self.refresh(db_manager)
+        except Exception as e:
+            logger.warning(f"当天增量聚合失败，使用原始日志统计: {e}")
+        state = self._state
+        if state is None or state.snapshot is None or state.day != date.today():
+            return None
+        return state.snapshot[name]
+
+    def needs_resync(self) -> bool:
+        """是否需要完整聚合：尚未聚合、日期已切换或距上次完整聚合超过full_resync_seconds"""
+        state = self._state
+        return (state is None or state.day != date.today()
+                or time.time() - state.started >= self.config.full_resync_seconds)
+
+    def refresh(self, db_manager):
+        """读取上次位置之后的新日志并更新结果（完整聚合由后台任务执行）"""
+        if time.time() - self._last_refresh < self.config.min_refresh_seconds:
+            return
+        state = self._state
+        if state is None or state.day != date.today():
+            return
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            state = self._state
+            handler_rows, step_rows = self._advance(db_manager, state, datetime.now())
+            if handler_rows or step_rows:
+                logger.debug(f"当天增量聚合读取{handler_rows}条请求日志、{step_rows}条环节耗时")
+            self._last_refresh = time.time()
+        finally:
+            self._lock.release()
+
+    def resync(self, db_manager):
+        """从零点完整聚合当天数据，完成后替换当前结果（在后台任务中执行，请求继续使用原来的结果）"""
+        now = datetime.now()
+        state = _TodayState(now.date())
+        started = time.time()
+        handler_rows, step_rows = self._advance(db_manager, state, now)
+        # 后台线程中可以阻塞等待正在进行的增量刷新结束
+        with self._lock:
+            self._state = state
+            self._last_refresh = time.time()
+        logger.info(f"当天完整聚合完成，读取{handler_rows}条请求日志、{step_rows}条环节耗时，"
+                    f"耗时{time.time() - started:.2f}秒")
+
+    def _advance(self, db_manager, state: _TodayState, now: datetime):
+        """读取state位置之后的日志并只更新受影响的结果，返回 (请求日志数, 环节耗时数)"""
+        day_start = datetime.combine(state.day, datetime.min.time())
+        upper = min(now - timedelta(seconds=self.config.lag_seconds), day_start + timedelta(days=1))
+        new_hive_biz_seqs = set()
+        handler_rows = self._fold_handler_logs(db_manager, state, day_start, upper, new_hive_biz_seqs)
+        dirty_steps = set()
+        step_rows = self._fold_step_records(db_manager, state, day_start, upper, dirty_steps)
+        # 过了等待时间的耗时移入草图，结果不变（结果中已包含暂存的耗时）
+        self._flush_hive_costs(state, upper - timedelta(seconds=self.config.hive_window_seconds))
+        if new_hive_biz_seqs:
+            dirty_steps.update(HIVE_EXCLUDED_STEPS)
+
+        if state.snapshot is None or handler_rows or dirty_steps:
+            state.snapshot = self._update_snapshot(db_manager, state, state.snapshot is None or handler_rows > 0, dirty_steps)
+        return handler_rows, step_rows
+
+    def _fold_handler_logs(self, db_manager, state: _TodayState, day_start: datetime, upper: datetime,
+                           new_hive_biz_seqs: set) -> int:
+        """读取新的请求日志，累加错误分类、渠道和场景计数"""
+        sql = """
+            SELECT id, create_time, biz_seq, result_code, channel, user_id, req_info, rsp_info
+            FROM t_handler_logs
+            WHERE create_time >= %s AND create_time < %s
+        """
+        params = [day_start, upper]
+        if state.handler_watermark is not None:
+            sql += " AND (create_time > %s OR (create_time = %s AND id > %s)) "
+            watermark_time, watermark_id = state.handler_watermark
+            params += [watermark_time, watermark_time, watermark_id]
+        sql += " ORDER BY create_time, id"
+
+        total = 0
+        for rows in db_manager.execute_query_stream(sql, tuple(params), self.config.batch_size):
+            for row in rows:
+                result_code = row['result_code']
+                state.class_counts[(
+                    classify_error_code('outcome', result_code),
+                    classify_error_code('error_class', result_code),
+                    classify_error_code('subsystem_class', result_code)
+                )] += 1
+
+                is_member = member_dimension.is_member(row['user_id'])
+                state.channel_counts[(row['channel'] or '未知渠道', is_member)] += 1
+                for scenario in classify_scenarios(row['req_info'], row['rsp_info']):
+                    state.scenario_counts[(scenario, is_member)] += 1
+
+                req_info = row['req_info']
+                if req_info is not None and 'HIVE' in req_info.upper() and row['biz_seq'] not in state.hive_biz_seqs:
+                    state.hive_biz_seqs.add(row['biz_seq'])
+                    new_hive_biz_seqs.add(row['biz_seq'])
+            # 每批处理完再推进位置，读取中途失败时计数与位置保持一致
+            last = rows[-1]
+            state.handler_watermark = (last['create_time'], last['id'])
+            total += len(rows)
+        return total
+
+    def _fold_step_records(self, db_manager, state: _TodayState, day_start: datetime, upper: datetime,
+                           dirty_steps: set) -> int:
+        """读取新的环节耗时记录，加入各环节的耗时草图（HIVE排除环节先暂存）"""
+        step_names = list(db_manager.step_name_mapping)
+        sql = """
+            SELECT id, create_time, biz_seq, step_name, cost
+            FROM t_step_time_record
+            WHERE create_time >= %s AND create_time < %s
+            AND step_name IN ({})
+        """.format(','.join(['%s'] * len(step_names)))
+        params = [day_start, upper] + step_names
+        if state.step_watermark is not None:
+            sql += " AND (create_time > %s OR (create_time = %s AND id > %s)) "
+            watermark_time, watermark_id = state.step_watermark
+            params += [watermark_time, watermark_time, watermark_id]
+        sql += " ORDER BY create_time, id"
+
+        total = 0
+        for rows in db_manager.execute_query_stream(sql, tuple(params), self.config.batch_size):
+            for row in rows:
+                cost = row['cost']
+                if cost is None:
+                    continue
+                step_name = row['step_name']
+                cost = float(cost)
+                if step_name in HIVE_EXCLUDED_STEPS:
+                    min_cost = HIVE_EXCLUDED_STEPS[step_name]
+                    if row['biz_seq'] is None or (min_cost is not None and cost <= min_cost):
+                        continue
+                    # HIVE查询的请求日志可能晚于环节耗时写入，等待hive_window_seconds后再计入草图
+                    state.pending_hive_costs.append((row['create_time'], row['biz_seq'], step_name, cost))
+                    dirty_steps.add(step_name)
+                else:
+                    state.step_sketches.setdefault(step_name, DDSketch()).add(cost)
+                    dirty_steps.add(step_name)
+            last = rows[-1]
+            state.step_watermark = (last['create_time'], last['id'])
+            total += len(rows)
+        return total
+
+    @staticmethod
+    def _flush_hive_costs(state: _TodayState, before: datetime):
+        """把create_time早于before的暂存耗时计入草图（已确认为HIVE查询的请求除外）"""
+        pending = state.pending_hive_costs
+        while pending and pending[0][0] < before:
+            _, biz_seq, step_name, cost = pending.popleft()
+            if biz_seq not in state.hive_biz_seqs:
+                state.step_sketches.setdefault(step_name, DDSketch()).add(cost)
+
+    @staticmethod
+    def _step_result(step_name: str, step_name_cn: str, sketch: DDSketch) -> Optional[Dict[str, Any]]:
+        """根据耗时草图生成环节耗时结果（平均值、最大值精确，分位数为草图估计值）"""
+        if sketch.count == 0:
+            return None
+        return {
+            'step_name': step_name,
+            'step_name_cn': step_name_cn,
+            'avg_cost': round(sketch.avg, 2),
+            'p90_cost': round(sketch.quantile(0.9), 2),
+            'max_cost': round(sketch.max, 2),
+            'percentiles': sketch.quantiles(DEFAULT_PERCENTILES)
+        }
+
+    def _update_snapshot(self, db_manager, state: _TodayState, handler_changed: bool,
+                         dirty_steps: set) -> Dict[str, Any]:
+        """生成与DatabaseManager各统计方法格式一致的结果，只重新计算有新增数据的部分"""
+        snapshot = dict(state.snapshot or {'day': state.day})
+
+        if handler_changed:
+            snapshot['error_class_counts'] = [
+                {'outcome': outcome, 'error_class': error_class, 'subsystem_class': subsystem_class, 'count': count}
+                for (outcome, error_class, subsystem_class), count in state.class_counts.items()
+            ]
+
+            member_stats = []
+            non_member_stats = []
+            for (channel, is_member), count in state.channel_counts.items():
+                stats = member_stats if is_member else non_member_stats
+                stats.append({
+                    'channel': channel,
+                    'channel_name': db_manager.channel_name_mapping.get(channel, channel),
+                    'count': count
+                })
+            snapshot['channel_stats'] = {
+                'member_stats': sorted(member_stats, key=lambda x: x['count'], reverse=True),
+                'non_member_stats': sorted(non_member_stats, key=lambda x: x['count'], reverse=True)
+            }
+
+            snapshot['scenario_stats'] = build_scenario_stats(state.scenario_counts)
+
+        if dirty_steps or 'step_performance' not in snapshot:
+            for step_name in dirty_steps:
+                sketch = state.step_sketches.get(step_name)
+                if step_name in HIVE_EXCLUDED_STEPS:
+                    # 草图只包含已过等待时间的耗时，合并仍在等待的耗时（草图大小与桶数有关，与耗时条数无关）
+                    merged = DDSketch()
+                    if sketch is not None:
+                        merged.merge(sketch)
+                    for _, biz_seq, pending_step, cost in state.pending_hive_costs:
+                        if pending_step == step_name and biz_seq not in state.hive_biz_seqs:
+                            merged.add(cost)
+                    sketch = merged
+                state.step_results[step_name] = self._step_result(
+                    step_name, db_manager.step_name_mapping.get(step_name, step_name), sketch
+                ) if sketch is not None else None
+            snapshot['step_performance'] = [
+                state.step_results[step_name]
+                for step_name in db_manager.step_name_mapping
+                if state.step_results.get(step_name) is not None
+            ]
+
+        return snapshot
+
+# 进程内共享的聚合器
+today_aggregator = TodayAggregator()
+
+async def run_today_aggregator_loop(config: TodayAggregatorConfig = today_aggregator_config):
+    """后台完成当天的首次聚合和定期完整聚合（在线程池中执行，不阻塞事件循环）"""
+    # database导入了本模块，在函数内导入避免循环导入
+    from database import DatabaseManager
+    loop = asyncio.get_running_loop()
+    db_manager = DatabaseManager()
+    while True:
+        try:
+            if today_aggregator.needs_resync():
+                await loop.run_in_executor(None, today_aggregator.resync, db_manager)
+        except Exception as e:
+            logger.error(f"当天完整聚合失败: {e}")
+        await asyncio.sleep(config.resync_check_seconds)
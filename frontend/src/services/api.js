@@ -36,14 +36,16 @@ api.interceptors.response.use(
   }
 )
 
-// 统一API调用函数
+// 统一API调用函数（其它参数由中间层原样转发给backend）
 const callApi = async (path, params = {}) => {
+  const { queryDate, startDate, endDate, bizSeq, ...extraParams } = params
   const requestData = {
+    ...extraParams,
     path,
-    queryDate: params.queryDate || null,
-    startDate: params.startDate || null,
-    endDate: params.endDate || null,
-    bizSeq: params.bizSeq || null
+    queryDate: queryDate || null,
+    startDate: startDate || null,
+    endDate: endDate || null,
+    bizSeq: bizSeq || null
   }
   
   // 移除null值
@@ -117,6 +119,18 @@ export const dashboardApi = {
   getDsErrorDetails: (queryDate) => 
     callApi('/api/ds-error-details', { queryDate }),
   
+  // 分页获取错误码分组的请求明细（params: queryDate, subsystem, code, errorType, cursor）
+  getErrorDetailPage: (params) => 
+    callApi('/api/error-details/page', params),
+  
+  // 获取错误消息签名（params: queryDate, subsystem, code, errorType）
+  getErrorSignatures: (params) => 
+    callApi('/api/error-signatures', params),
+  
+  // 获取错误请求的完整内容（params: { id } 或 { bizSeq, subsystem }）
+  getErrorDetailFull: (params) => 
+    callApi('/api/error-details/full', params),
+  
   // 获取用户留存率统计
   getUserRetentionStats: (queryDate) => 
     callApi('/api/user-retention-stats', { queryDate }),
@@ -1,7 +1,12 @@
 package com.dqadeagent.middle.dto;
 
+import com.fasterxml.jackson.annotation.JsonAnyGetter;
+import com.fasterxml.jackson.annotation.JsonAnySetter;
 import com.fasterxml.jackson.annotation.JsonProperty;
 
+import java.util.HashMap;
+import java.util.Map;
+
 /**
  * 前端统一请求参数
  */
@@ -36,6 +41,11 @@ public class ApiRequest {
     @JsonProperty("bizSeq")
     private String bizSeq;
 
+    /**
+     * 其它接口参数（如kind、percentiles），原样转发给backend
+     */
+    private Map<String, Object> extraParams = new HashMap<>();
+
     // 默认构造函数
     public ApiRequest() {}
 
@@ -89,6 +99,16 @@ public class ApiRequest {
         this.bizSeq = bizSeq;
     }
 
+    @JsonAnyGetter
+    public Map<String, Object> getExtraParams() {
+        return extraParams;
+    }
+
+    @JsonAnySetter
+    public void setExtraParam(String name, Object value) {
+        this.extraParams.put(name, value);
+    }
+
     @Override
     public String toString() {
         return "ApiRequest{" +
@@ -97,6 +117,7 @@ public class ApiRequest {
                 ", startDate='" + startDate + '\'' +
                 ", endDate='" + endDate + '\'' +
                 ", bizSeq='" + bizSeq + '\'' +
+                ", extraParams=" + extraParams +
                 '}';
     }
 }
\ No newline at end of file
@@ -152,6 +152,15 @@ public class ProxyService {
             body.put("bizSeq", request.getBizSeq());        // biz_seq → bizSeq
         }
 
+        // 其它参数原样转发
+        if (request.getExtraParams() != null) {
+            for (Map.Entry<String, Object> entry : request.getExtraParams().entrySet()) {
+                if (entry.getValue() != null) {
+                    body.put(entry.getKey(), entry.getValue());
+                }
+            }
+        }
+
         return body;
     }
 